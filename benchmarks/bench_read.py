@@ -0,0 +1,191 @@
+""" Benchmarks of opening files, reading coordinates and interpolation """
+from types import SimpleNamespace
+
+import numpy as np
+import pyproj
+
+from geodataset.utils import fill_nan_gaps
+
+from benchmarks.synthetic import LAYOUTS, get_file, get_xy, open_file
+
+ALL_LAYOUTS = list(LAYOUTS)
+# layouts with 2D lon/lat (from variables, dimensions or computed from x, y)
+LONLAT_LAYOUTS = [k for k in LAYOUTS if LAYOUTS[k]['lonlat'] != '3d']
+# layouts with 2D lon/lat (or computed from x, y) on a projected grid
+PROJECTED_LAYOUTS = [k for k in LONLAT_LAYOUTS if LAYOUTS[k]['grid'] == 'stere']
+NEXTSIM_PROJECTION = pyproj.Proj(
+    '+proj=stere +lat_0=90 +lat_ts=60 +lon_0=-45 +x_0=0 +y_0=0 +a=6378273 +b=6356889.448910593')
+
+
+def get_random_points(layout, n, seed=0):
+    """ Get random lon, lat within the grid of a layout """
+    rng = np.random.default_rng(seed)
+    x, y = get_xy(layout)
+    xp = rng.uniform(x.min(), x.max(), n)
+    yp = rng.uniform(y.min(), y.max(), n)
+    if LAYOUTS[layout]['grid'] == 'lonlat':
+        return xp, yp
+    return pyproj.Proj(LAYOUTS[layout].get('proj', 3411))(xp, yp, inverse=True)
+
+
+class OpenNetcdf:
+    params = [ALL_LAYOUTS]
+    param_names = ['layout']
+
+    def setup(self, layout):
+        get_file(layout)
+
+    def time_open_netcdf(self, layout):
+        with open_file(layout) as ds:
+            ds.projection
+
+    def time_datetimes(self, layout):
+        with open_file(layout) as ds:
+            ds.datetimes
+
+
+class ConvertTimeData:
+    params = [[1, 1000, 100000]]
+    param_names = ['n']
+
+    def setup(self, n):
+        self.ds = open_file('osisaf')
+        self.tdata = 1325419200. + 3600. * np.arange(n)
+
+    def teardown(self, n):
+        self.ds.close()
+
+    def time_convert_time_data(self, n):
+        self.ds.convert_time_data(self.tdata)
+
+
+class LonLatArrays:
+    params = [LONLAT_LAYOUTS]
+    param_names = ['layout']
+
+    def setup(self, layout):
+        self.ds = open_file(layout)
+
+    def teardown(self, layout):
+        self.ds.close()
+
+    def time_get_lonlat_arrays(self, layout):
+        self.ds.get_lonlat_arrays()
+
+    def peakmem_get_lonlat_arrays(self, layout):
+        self.ds.get_lonlat_arrays()
+
+
+class Bbox:
+    params = [PROJECTED_LAYOUTS, [False, True]]
+    param_names = ['layout', 'perimeter']
+
+    def setup(self, layout, perimeter):
+        self.ds = open_file(layout)
+        self.mapping = pyproj.Proj(3413)
+
+    def teardown(self, layout, perimeter):
+        self.ds.close()
+
+    def time_get_bbox(self, layout, perimeter):
+        # measure computation, not the memoized result
+        self.ds.__dict__.pop('bbox_cache', None)
+        self.ds.get_bbox(self.mapping, perimeter=perimeter)
+
+    def time_get_bbox_grid_crs(self, layout, perimeter):
+        self.ds.__dict__.pop('bbox_cache', None)
+        self.ds.__dict__.pop('grid_geometry', None)
+        self.ds.get_bbox(self.ds.projection, perimeter=perimeter)
+
+    def peakmem_get_bbox(self, layout, perimeter):
+        self.ds.__dict__.pop('bbox_cache', None)
+        self.ds.get_bbox(self.mapping, perimeter=perimeter)
+
+
+class FillNanGaps:
+    params = [['osisaf', 'jaxa_amsr2'], [1, 5]]
+    param_names = ['layout', 'distance']
+
+    def setup(self, layout, distance):
+        with open_file(layout) as ds:
+            var_name = LAYOUTS[layout]['var_name']
+            self.data = ds.get_variable_array(var_name).astype(float).filled(np.nan)
+
+    def time_fill_nan_gaps(self, layout, distance):
+        fill_nan_gaps(self.data, distance)
+
+    def peakmem_fill_nan_gaps(self, layout, distance):
+        fill_nan_gaps(self.data, distance)
+
+
+class IterTimeSteps:
+    """ Per-step processing of a compressed file with and without reading ahead """
+    params = [[0, 2]]
+    param_names = ['prefetch']
+
+    def setup(self, prefetch):
+        self.ds = open_file('osisaf', nt=8)
+        self.var_name = LAYOUTS['osisaf']['var_name']
+
+    def teardown(self, prefetch):
+        self.ds.close()
+
+    def time_iter_time_steps(self, prefetch):
+        for _, arrays in self.ds.iter_time_steps(self.var_name, prefetch=prefetch):
+            fill_nan_gaps(arrays[self.var_name].astype(float).filled(np.nan), 5)
+
+
+class InterpToPoints:
+    params = [['osisaf', 'jaxa_amsr2', 'nersc_deformation', 'dist2coast'], [10000, 1000000]]
+    param_names = ['layout', 'n_points']
+    timeout = 300
+
+    def setup(self, layout, n_points):
+        self.ds = open_file(layout)
+        self.var_name = LAYOUTS[layout]['var_name']
+        self.lon, self.lat = get_random_points(layout, n_points)
+        # warm up cached grid geometry, as in repeated calls on the same dataset
+        self.ds.get_grid_geometry()
+
+    def teardown(self, layout, n_points):
+        self.ds.close()
+
+    def time_interp_to_points(self, layout, n_points):
+        self.ds.interp_to_points(self.var_name, self.lon, self.lat)
+
+    def peakmem_interp_to_points(self, layout, n_points):
+        self.ds.interp_to_points(self.var_name, self.lon, self.lat)
+
+    def time_interp_to_points_blocks(self, layout, n_points):
+        self.ds.interp_to_points(self.var_name, self.lon, self.lat, block_size=2**16)
+
+    def peakmem_interp_to_points_blocks(self, layout, n_points):
+        self.ds.interp_to_points(self.var_name, self.lon, self.lat, block_size=2**16)
+
+
+class GetVarForNextsim:
+    params = [['osisaf', 'jaxa_amsr2'], [True, False]]
+    param_names = ['layout', 'on_elements']
+    timeout = 300
+
+    def setup(self, layout, on_elements):
+        self.ds = open_file(layout)
+        self.var_name = LAYOUTS[layout]['var_name']
+        # mesh of about 200 000 nodes and 400 000 elements, similar to neXtSIM Arctic mesh
+        rng = np.random.default_rng(0)
+        lon, lat = get_random_points(layout, 200000)
+        nodes_x, nodes_y = NEXTSIM_PROJECTION(lon, lat)
+        indices = rng.integers(0, nodes_x.size, size=(400000, 3))
+        self.nbo = SimpleNamespace(mesh_info=SimpleNamespace(
+            nodes_x=nodes_x, nodes_y=nodes_y, indices=indices,
+            projection=SimpleNamespace(pyproj=NEXTSIM_PROJECTION)))
+        self.ds.get_grid_geometry()
+
+    def teardown(self, layout, on_elements):
+        self.ds.close()
+
+    def time_get_var_for_nextsim(self, layout, on_elements):
+        self.ds.get_var_for_nextsim(self.var_name, self.nbo, on_elements=on_elements)
+
+    def peakmem_get_var_for_nextsim(self, layout, on_elements):
+        self.ds.get_var_for_nextsim(self.var_name, self.nbo, on_elements=on_elements)
@@ -0,0 +1,107 @@
+""" Benchmarks of GeoDatasetWrite setters and write profiles """
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pyproj
+
+from geodataset.geodataset import GeoDatasetWrite, WRITE_PROFILES
+
+from benchmarks.synthetic import get_field, get_xy
+
+TIME_ATTS = dict(units='days since 2020-01-01')
+
+
+class WriteBase:
+    """ Write files to a temporary directory """
+    layout = 'osisaf'
+    nt = 10
+
+    def setup(self, *args):
+        self.tmpdir = tempfile.mkdtemp()
+        self.x, self.y = get_xy(self.layout)
+        self.lon, self.lat = pyproj.Proj(3411)(*np.meshgrid(self.x, self.y), inverse=True)
+        self.data = get_field(self.x, self.y, self.nt)
+        self.count = 0
+
+    def teardown(self, *args):
+        shutil.rmtree(self.tmpdir)
+
+    def open(self):
+        self.count += 1
+        nc = GeoDatasetWrite(os.path.join(self.tmpdir, 'out%d.nc' % self.count), 'w')
+        nc.grid_mapping_variable = 'crs'
+        return nc
+
+
+class Setters(WriteBase):
+    def time_set_time_variable(self):
+        with self.open() as nc:
+            nc.set_time_variable(np.arange(10000), TIME_ATTS)
+
+    def time_set_xy_dims(self):
+        with self.open() as nc:
+            nc.set_xy_dims(self.x, self.y)
+
+    def time_set_lonlat(self):
+        with self.open() as nc:
+            nc.set_xy_dims(self.x, self.y)
+            nc.set_lonlat(self.lon, self.lat)
+
+    def time_set_variable(self):
+        with self.open() as nc:
+            nc.set_time_variable(np.arange(self.nt), TIME_ATTS)
+            nc.set_xy_dims(self.x, self.y)
+            nc.set_projection_variable()
+            nc.set_variable('sic', self.data, ('time', 'y', 'x'), dict(units='1'))
+
+    def time_set_variable_packed(self):
+        with self.open() as nc:
+            nc.set_time_variable(np.arange(self.nt), TIME_ATTS)
+            nc.set_xy_dims(self.x, self.y)
+            nc.set_variable('sic', self.data, ('time', 'y', 'x'), dict(units='1'),
+                pack=dict(valid_range=(-2, 3)))
+
+
+class SetFromSpec(WriteBase):
+    """ Many small variables, typical for model output """
+    nt = 2
+    params = [[10, 50]]
+    param_names = ['n_variables']
+
+    def get_spec(self, n_variables):
+        return dict(
+            time=dict(data=np.arange(self.nt), atts=TIME_ATTS),
+            xy=dict(x=self.x, y=self.y),
+            variables={'var%d' % i: dict(data=self.data, dims=('time', 'y', 'x'), atts={})
+                for i in range(n_variables)})
+
+    def time_set_from_spec(self, n_variables):
+        with self.open() as nc:
+            nc.set_from_spec(self.get_spec(n_variables))
+
+    def time_set_variables(self, n_variables):
+        with self.open() as nc:
+            nc.set_time_variable(np.arange(self.nt), TIME_ATTS)
+            nc.set_xy_dims(self.x, self.y)
+            nc.set_projection_variable()
+            for i in range(n_variables):
+                nc.set_variable('var%d' % i, self.data, ('time', 'y', 'x'), {})
+
+
+class WriteProfiles(WriteBase):
+    params = [[None] + list(WRITE_PROFILES)]
+    param_names = ['profile']
+
+    def time_write(self, profile):
+        with self.open() as nc:
+            nc.write_profile = profile
+            nc.set_time_variable(np.arange(self.nt), TIME_ATTS)
+            nc.set_xy_dims(self.x, self.y)
+            nc.set_variable('sic', self.data, ('time', 'y', 'x'), {})
+
+    def track_size(self, profile):
+        self.time_write(profile)
+        return os.path.getsize(os.path.join(self.tmpdir, 'out%d.nc' % self.count))
+    track_size.unit = 'bytes'
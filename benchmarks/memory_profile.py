@@ -0,0 +1,535 @@
+""" Peak memory of public methods on synthetic files of increasing size
+
+Each case is run in a fresh subprocess, so that memory held by other cases and by
+the allocators does not hide allocations. For each case and size the report shows:
+    reference : size of the output (or of the input, where the output is tiny), MiB
+    peak : peak of memory allocated by Python and numpy during the call (tracemalloc), MiB
+    transient : peak minus memory still allocated after the call (temporary copies), MiB
+    rss : peak increase of resident memory during the call, including allocations in
+        netCDF/HDF5/PROJ (high water mark reset before the call), MiB
+    ratio : rss / reference
+
+A case fails if the ratio exceeds its budget. Budgets are the ratios measured for the
+current implementation plus a margin (about 30 %, RSS varies between runs), so the
+report is a regression gate. Targets are the memory a method should need (e.g. one copy
+of the output plus its mask); cases above their target are reported as 'over target'
+without failing, and their budget should be lowered when they are improved.
+Cases with reference below MIN_REFERENCE are reported but not checked (fixed
+overheads dominate there).
+
+Usage:
+    python -m benchmarks.memory_profile [-k regex] [-f factor [factor ...]]
+
+Exit code is 1 if any case exceeds its budget.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import gc
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+import pyproj
+
+from geodataset.export import export_files
+from geodataset.geodataset import GeoDatasetWrite
+from geodataset.tools import open_mfnetcdf
+from geodataset.utils import fill_nan_gaps
+
+from benchmarks.bench_read import NEXTSIM_PROJECTION, get_random_points
+from benchmarks.synthetic import LAYOUTS, get_field, get_file, get_xy, open_file
+
+# factors to divide realistic shapes by
+FACTORS = [4, 2, 1]
+# RSS includes one-off initialisation of the C libraries (a few MiB)
+MIN_REFERENCE = 4 * 2**20
+
+
+def get_nbytes(obj):
+    """ Total size of arrays in obj (array or list/tuple of arrays) """
+    if isinstance(obj, (list, tuple)):
+        return sum(get_nbytes(o) for o in obj)
+    if isinstance(obj, np.ma.MaskedArray):
+        return obj.data.nbytes + np.ma.getmaskarray(obj).nbytes
+    return getattr(obj, 'nbytes', 0)
+
+
+class RSSSampler:
+    """ Measure peak resident memory of the process during a block of code.
+    Uses the high water mark of the kernel (VmHWM, reset through /proc/self/clear_refs)
+    or, where it cannot be reset, samples RSS in a background thread.
+    """
+    interval = 1e-3
+
+    def __init__(self):
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self.available = os.path.exists('/proc/self/statm')
+
+    def get_rss(self):
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * self.page_size
+
+    @staticmethod
+    def get_hwm():
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+
+    @staticmethod
+    def reset_hwm():
+        """ Reset the high water mark of RSS to the current RSS (Linux >= 4.0) """
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+            return True
+        except OSError:
+            return False
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.get_rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = self.start = self.get_rss() if self.available else 0
+        self.use_hwm = self.available and self.reset_hwm()
+        self._stop = threading.Event()
+        if self.available and not self.use_hwm:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        if self.use_hwm:
+            self.peak = self.get_hwm()
+        elif self.available:
+            self._thread.join()
+            self.peak = max(self.peak, self.get_rss())
+
+    @property
+    def increase(self):
+        """ Peak increase of RSS (None if RSS cannot be measured) """
+        return self.peak - self.start if self.available else None
+
+
+def profile_call(func):
+    """ Measure memory of one call
+
+    Returns
+    -------
+    result : object
+        output of func
+    peak : int
+        peak of traced memory (bytes)
+    transient : int
+        peak minus memory retained after the call (bytes)
+    rss : int or None
+        peak increase of resident memory (bytes)
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        with RSSSampler() as rss:
+            result = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak - start, peak - current, rss.increase
+
+
+class Case:
+    """ Profiled call of a public method
+
+    Attributes
+    ----------
+    name : str
+    target : float
+        ratio of peak memory to reference size the method should reach
+    budget : float
+        maximum ratio of peak memory to reference size (measured ratio plus a margin)
+    """
+    target = 1.
+    budget = 1.
+    reference = 'output'
+
+    def setup(self, factor):
+        """ Prepare inputs for a given size factor """
+
+    def run(self):
+        """ Call the method and return its output """
+
+    def teardown(self):
+        pass
+
+    def get_inputs(self):
+        """ Input arrays (for reference='input') """
+        return []
+
+
+class DatasetCase(Case):
+    layout = 'osisaf'
+
+    def setup(self, factor):
+        self.factor = factor
+        self.ds = open_file(self.layout, factor)
+        self.var_name = LAYOUTS[self.layout]['var_name']
+
+    def teardown(self):
+        self.ds.close()
+
+
+class GetVariableArray(DatasetCase):
+    name = 'get_variable_array'
+    # target: output and its mask, plus decompression buffers
+    target = 1.5
+    budget = 4.
+
+    def run(self):
+        return self.ds.get_variable_array(self.var_name)
+
+
+class GetLonLatArrays2D(DatasetCase):
+    name = 'get_lonlat_arrays (2D variables)'
+    # target: two output arrays, plus decompression buffers
+    target = 1.5
+    budget = 3.2
+
+    def run(self):
+        return self.ds.get_lonlat_arrays()
+
+
+class GetLonLatArraysXY(DatasetCase):
+    name = 'get_lonlat_arrays (from x, y)'
+    layout = 'nersc_deformation'
+    # target: two output arrays and the 2D x, y grids they are projected from
+    target = 2.
+    budget = 2.4
+
+    def run(self):
+        return self.ds.get_lonlat_arrays()
+
+
+class GetBbox(DatasetCase):
+    name = 'get_bbox'
+    reference = 'input'
+    # target: projected x, y of the input longitude and latitude
+    target = 1.
+    budget = 3.6
+
+    def setup(self, factor):
+        super().setup(factor)
+        self.lonlat = self.ds.get_lonlat_arrays()
+
+    def get_inputs(self):
+        return self.lonlat
+
+    def run(self):
+        return self.ds.get_bbox(pyproj.Proj(3413))
+
+
+class FillNanGaps(DatasetCase):
+    name = 'fill_nan_gaps'
+    # target: output, distance to valid pixels and indices of the nearest valid pixels
+    target = 3.
+    budget = 6.5
+
+    def setup(self, factor):
+        super().setup(factor)
+        self.data = self.ds.get_variable_array(self.var_name).astype(float).filled(np.nan)
+
+    def run(self):
+        return fill_nan_gaps(self.data, 5)
+
+
+class InterpToPoints(DatasetCase):
+    """ Interpolation to as many points as there are grid cells """
+    name = 'interp_to_points'
+    # target: projected x, y of the points, gap-filled field and interpolation temporaries
+    target = 6.
+    budget = 21.
+
+    def setup(self, factor):
+        super().setup(factor)
+        x, y = get_xy(self.layout, factor)
+        self.lon, self.lat = get_random_points(self.layout, x.size * y.size)
+        self.ds.get_grid_geometry()
+
+    def run(self):
+        return self.ds.interp_to_points(self.var_name, self.lon, self.lat)
+
+
+class InterpToPointsBlocks(InterpToPoints):
+    """ Interpolation to points in blocks ordered along a Hilbert curve """
+    name = 'interp_to_points (blocks)'
+    # target: as interp_to_points, with temporaries bounded by the block size
+    target = 3.
+    budget = 10.
+
+    def run(self):
+        return self.ds.interp_to_points(self.var_name, self.lon, self.lat,
+            block_size=2**16, order='hilbert')
+
+
+class InterpToSamples(DatasetCase):
+    """ Interpolation to as many samples as there are grid cells, spread over 4 time steps """
+    name = 'interp_to_samples'
+    # target: as interp_to_points, with two time steps of the field
+    target = 12.
+    budget = 27.
+
+    def setup(self, factor):
+        self.factor = factor
+        self.ds = open_file(self.layout, factor, nt=4)
+        self.var_name = LAYOUTS[self.layout]['var_name']
+        x, y = get_xy(self.layout, factor)
+        n = x.size * y.size
+        self.lon, self.lat = get_random_points(self.layout, n)
+        rng = np.random.default_rng(0)
+        t0 = self.ds.datetimes[0]
+        seconds = rng.uniform(0, (self.ds.datetimes[-1] - t0).total_seconds(), n)
+        self.times = np.datetime64(t0) + seconds.astype('timedelta64[s]')
+        self.ds.get_grid_geometry()
+
+    def run(self):
+        return self.ds.interp_to_samples(self.var_name, self.lon, self.lat, self.times)
+
+
+class ToXarray(DatasetCase):
+    name = 'to_xarray (computed)'
+    # target: output arrays, plus one chunk of decompression buffers
+    target = 1.5
+    budget = 9.
+
+    def run(self):
+        return [v.values for v in self.ds.to_xarray().compute().variables.values()]
+
+
+class GetVariableArrayTiled(DatasetCase):
+    name = 'get_variable_array_tiled'
+    # target: output and its mask, plus tiles received from the workers
+    target = 2.
+    budget = 4.5
+
+    def run(self):
+        return self.ds.get_variable_array_tiled(self.var_name, max_workers=2)
+
+
+class MFGetVariableArray(DatasetCase):
+    """ Reading from the second member of a multi-file dataset """
+    name = 'MFGeoDatasetRead.get_variable_array'
+    # target: as GeoDatasetRead.get_variable_array
+    target = 1.5
+    budget = 4.
+
+    def setup(self, factor):
+        self.factor = factor
+        filename = get_file(self.layout, factor)
+        self.ds = open_mfnetcdf([filename, filename])
+        self.var_name = LAYOUTS[self.layout]['var_name']
+
+    def run(self):
+        return self.ds.get_variable_array(self.var_name, time_index=-1)
+
+
+class MFInterpToPoints(MFGetVariableArray):
+    name = 'MFGeoDatasetRead.interp_to_points'
+    # target: as GeoDatasetRead.interp_to_points
+    target = 6.
+    budget = 22.
+
+    def setup(self, factor):
+        super().setup(factor)
+        x, y = get_xy(self.layout, factor)
+        self.lon, self.lat = get_random_points(self.layout, x.size * y.size)
+        self.ds.get_grid_geometry()
+
+    def run(self):
+        return self.ds.interp_to_points(self.var_name, self.lon, self.lat, time_index=-1)
+
+
+class GetVarForNextsim(DatasetCase):
+    """ Interpolation to mesh elements (as many elements as there are grid cells) """
+    name = 'get_var_for_nextsim'
+    # target: element centers, their x, y, gap-filled field and interpolation temporaries
+    target = 6.
+    budget = 23.
+
+    def setup(self, factor):
+        super().setup(factor)
+        x, y = get_xy(self.layout, factor)
+        n_elements = x.size * y.size
+        rng = np.random.default_rng(0)
+        lon, lat = get_random_points(self.layout, n_elements // 2)
+        nodes_x, nodes_y = NEXTSIM_PROJECTION(lon, lat)
+        self.nbo = SimpleNamespace(mesh_info=SimpleNamespace(
+            nodes_x=nodes_x, nodes_y=nodes_y,
+            indices=rng.integers(0, nodes_x.size, size=(n_elements, 3)),
+            projection=SimpleNamespace(pyproj=NEXTSIM_PROJECTION)))
+        self.ds.get_grid_geometry()
+
+    def run(self):
+        return self.ds.get_var_for_nextsim(self.var_name, self.nbo)
+
+
+class SetVariable(Case):
+    name = 'GeoDatasetWrite.set_variable'
+    reference = 'input'
+    # target: chunk buffers of the netCDF library
+    target = 1.2
+    budget = 1.3
+
+    def setup(self, factor):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        x, y = get_xy('osisaf', factor)
+        self.data = get_field(x, y, nt=4)
+        self.nc = GeoDatasetWrite(os.path.join(self.tmpdir.name, 'out.nc'), 'w')
+        self.nc.grid_mapping_variable = 'crs'
+        self.nc.set_time_variable(np.arange(4), dict(units='days since 2020-01-01'))
+        self.nc.set_xy_dims(x, y)
+
+    def get_inputs(self):
+        return self.data
+
+    def run(self):
+        self.nc.set_variable('sic', self.data, ('time', 'y', 'x'), {})
+
+    def teardown(self):
+        self.nc.close()
+        self.tmpdir.cleanup()
+
+
+class SetVariablePacked(SetVariable):
+    name = 'GeoDatasetWrite.set_variable (packed)'
+    # target: packed copy and chunk buffers
+    target = 1.5
+    budget = 2.1
+
+    def run(self):
+        self.nc.set_variable('sic', self.data, ('time', 'y', 'x'), {},
+            pack=dict(valid_range=(-2, 3)))
+
+
+class ExportFiles(Case):
+    """ Writing two files in a thread (so that memory is measured in this process) """
+    name = 'export_files'
+    reference = 'input'
+    # target: chunk buffers of the netCDF library
+    target = 1.2
+    budget = 2.1
+
+    def setup(self, factor):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        x, y = get_xy('osisaf', factor)
+        self.specs = [dict(
+            grid_mapping_variable='crs',
+            time=dict(data=np.arange(4), atts=dict(units='days since 2020-01-01')),
+            xy=dict(x=x, y=y),
+            variables=dict(sic=dict(data=get_field(x, y, nt=4) + i, dims=('time', 'y', 'x'),
+                atts={})),
+        ) for i in range(2)]
+
+    def get_inputs(self):
+        return [spec['variables']['sic']['data'] for spec in self.specs]
+
+    def run(self):
+        jobs = [(os.path.join(self.tmpdir.name, 'out%d.nc' % i), spec, None)
+            for i, spec in enumerate(self.specs)]
+        report = export_files(jobs, executor='thread', max_workers=1)
+        assert not report['failed'], report['failed']
+
+    def teardown(self):
+        self.tmpdir.cleanup()
+
+
+CASES = [GetVariableArray, GetLonLatArrays2D, GetLonLatArraysXY, GetBbox, FillNanGaps,
+    InterpToPoints, InterpToPointsBlocks, InterpToSamples, ToXarray, GetVariableArrayTiled,
+    MFGetVariableArray, MFInterpToPoints, GetVarForNextsim, SetVariable, SetVariablePacked,
+    ExportFiles]
+
+
+def _profile_case(case_name, factor):
+    """ Profile one case for one size factor in the current process
+
+    Returns
+    -------
+    row : dict
+        pixels, reference, peak, transient, rss (bytes), ratio, target, budget, passed
+        (None if reference is below MIN_REFERENCE) and over_target
+    """
+    case = {c.name: c for c in CASES}[case_name]()
+    case.setup(factor)
+    try:
+        result, peak, transient, rss = profile_call(case.run)
+        if case.reference == 'output':
+            reference = get_nbytes(result)
+        else:
+            reference = get_nbytes(case.get_inputs())
+    finally:
+        case.teardown()
+    measured = peak if rss is None else max(peak, rss)
+    ratio = measured / reference if reference else np.inf
+    x, y = get_xy(getattr(case, 'layout', 'osisaf'), factor)
+    passed = None
+    if reference >= MIN_REFERENCE:
+        passed = bool(ratio <= case.budget)
+    return dict(pixels=x.size * y.size, reference=reference, peak=peak, transient=transient,
+        rss=rss, ratio=ratio, target=case.target, budget=case.budget, passed=passed,
+        over_target=bool(passed is not None and ratio > case.target))
+
+
+def profile_case(case_class, factor):
+    """ Profile one case for one size factor in a fresh subprocess
+    (see _profile_case)
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(_profile_case, case_class.name, factor).result()
+
+
+def format_row(name, row):
+    """ Format row of the report """
+    mib = lambda v: '%9.1f' % (v / 2**20) if v is not None else '%9s' % '-'
+    status = {True: 'ok', False: 'FAIL', None: '-'}[row['passed']]
+    if row['passed'] and row['over_target']:
+        status = 'ok (over target)'
+    return '%-40s %10d %s %s %s %s %7.2f %7.1f %7.1f  %s' % (
+        name, row['pixels'], mib(row['reference']), mib(row['peak']), mib(row['transient']),
+        mib(row['rss']), row['ratio'], row['target'], row['budget'], status)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', '--pattern', help='profile cases with names matching the regex')
+    parser.add_argument('-f', '--factors', type=float, nargs='+', default=FACTORS,
+        help='factors to divide realistic shapes by (default: %s)' % FACTORS)
+    args = parser.parse_args(args)
+    print('%-40s %10s %9s %9s %9s %9s %7s %7s %7s' % (
+        'case', 'pixels', 'ref, MiB', 'peak', 'transient', 'rss', 'ratio', 'target', 'budget'))
+    failed = []
+    for case_class in CASES:
+        if args.pattern and not re.search(args.pattern, case_class.name):
+            continue
+        for factor in args.factors:
+            row = profile_case(case_class, factor)
+            print(format_row(case_class.name, row), flush=True)
+            if row['passed'] is False:
+                failed.append(case_class.name)
+    if failed:
+        print('%d case(s) exceed their budget' % len(failed))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
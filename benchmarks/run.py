@@ -0,0 +1,152 @@
+""" Run asv-style benchmarks without asv and compare results with a baseline
+
+time_* methods are timed (best of several repeats), peakmem_* methods report the peak of
+memory allocated by Python and numpy during the call (tracemalloc), track_* methods
+report their return value.
+
+Usage:
+    python -m benchmarks.run [-s small] [-k regex] [-o results.json] [-c baseline.json]
+
+Exit code is 1 if a result is slower (or larger) than the baseline by more than
+the threshold.
+"""
+import argparse
+import importlib
+import inspect
+import itertools
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+BENCHMARK_MODULES = ['benchmarks.bench_read', 'benchmarks.bench_write']
+PREFIXES = ('time_', 'peakmem_', 'track_')
+
+
+def get_param_combinations(cls):
+    """ Get list of parameter tuples of an asv benchmark class """
+    params = getattr(cls, 'params', None)
+    if params is None:
+        return [()]
+    if not getattr(cls, 'param_names', None) or len(cls.param_names) == 1:
+        if not isinstance(params[0], (list, tuple)):
+            params = [params]
+    return list(itertools.product(*params))
+
+
+def iter_benchmarks(pattern=None):
+    """ Iterate over benchmark classes, method names and parameters
+
+    Yields
+    ------
+    name : str
+        'module.Class.method(params)'
+    cls : type
+    method_name : str
+    params : tuple
+    """
+    for module_name in BENCHMARK_MODULES:
+        module = importlib.import_module(module_name)
+        for cls_name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module_name:
+                continue
+            methods = sorted(m for m in dir(cls) if m.startswith(PREFIXES))
+            for method_name, params in itertools.product(methods, get_param_combinations(cls)):
+                name = '%s.%s.%s(%s)' % (module_name.split('.')[-1], cls_name, method_name,
+                    ', '.join(repr(p) for p in params))
+                if pattern is None or re.search(pattern, name):
+                    yield name, cls, method_name, params
+
+
+def run_benchmark(cls, method_name, params, repeat=3):
+    """ Run one benchmark
+
+    Returns
+    -------
+    result : float
+        time (s), peak memory (bytes) or tracked value
+    """
+    obj = cls()
+    if hasattr(obj, 'setup'):
+        obj.setup(*params)
+    try:
+        method = getattr(obj, method_name)
+        if method_name.startswith('time_'):
+            times = []
+            for _ in range(getattr(obj, 'repeat', repeat)):
+                t0 = time.perf_counter()
+                method(*params)
+                times.append(time.perf_counter() - t0)
+            return min(times)
+        if method_name.startswith('peakmem_'):
+            tracemalloc.start()
+            try:
+                method(*params)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        return method(*params)
+    finally:
+        if hasattr(obj, 'teardown'):
+            obj.teardown(*params)
+
+
+def format_result(name, value):
+    """ Format result for printing """
+    if '.time_' in name:
+        return '%10.4f s' % value
+    if '.peakmem_' in name:
+        return '%8.1f MiB' % (value / 2**20)
+    return '%12s' % value
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--size', choices=['realistic', 'small'],
+        help='size of synthetic files (default: GEODATASET_BENCH_SIZE or realistic)')
+    parser.add_argument('-k', '--pattern', help='run benchmarks matching the regex')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='repeats of time_ benchmarks')
+    parser.add_argument('-o', '--output', help='save results to JSON file')
+    parser.add_argument('-c', '--compare', help='compare with results in JSON file')
+    parser.add_argument('-t', '--threshold', type=float, default=0.2,
+        help='relative increase reported as regression')
+    args = parser.parse_args(args)
+    if args.size:
+        os.environ['GEODATASET_BENCH_SIZE'] = args.size
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        size = os.getenv('GEODATASET_BENCH_SIZE', 'realistic')
+        if baseline['size'] != size:
+            parser.error('baseline was run with size %s, not %s' % (baseline['size'], size))
+        baseline = baseline['results']
+
+    results = {}
+    regressions = []
+    for name, cls, method_name, params in iter_benchmarks(args.pattern):
+        results[name] = run_benchmark(cls, method_name, params, args.repeat)
+        line = '%-80s %s' % (name, format_result(name, results[name]))
+        if isinstance(baseline.get(name), (int, float)) and baseline[name] > 0:
+            ratio = results[name] / baseline[name]
+            line += '  x%.2f' % ratio
+            if ratio > 1 + args.threshold:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line, flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(size=os.getenv('GEODATASET_BENCH_SIZE', 'realistic'),
+                results=results), f, indent=1)
+    if regressions:
+        print('%d regression(s) above %d%%' % (len(regressions), args.threshold * 100))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
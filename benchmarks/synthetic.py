@@ -0,0 +1,240 @@
+""" Synthetic netCDF files mimicking the layout of the custom_geodataset classes
+
+Files are generated once per layout and size and kept in GEODATASET_BENCH_DIR
+(by default a directory in the system temporary directory).
+Size is selected with GEODATASET_BENCH_SIZE ('realistic' (default) or 'small').
+"""
+import os
+import tempfile
+
+from netCDF4 import Dataset
+import numpy as np
+import pyproj
+
+from geodataset import custom_geodataset
+from geodataset.tools import open_netcdf
+from geodataset.utils import get_length_factor
+
+# Sea ice products are mostly on the NSIDC polar stereographic grid
+NSIDC_EXTENT = (-3.85e6, 3.75e6, -5.35e6, 5.85e6)
+
+# filename : matches pattern of the custom class
+# shape : (ny, nx) of the realistic file (small files are 8 times smaller along each axis)
+# fixed_shape : the grid is defined by the class, so the shape does not depend on size
+# grid : 'stere' for x, y on the NSIDC grid or 'lonlat' for regular lon, lat
+# xy_units : units of x, y variables or None if they are not in the file
+# proj : projection of the grid (EPSG:3411 by default)
+# lonlat : '2d' for 2D lon/lat variables, '3d' for lon/lat depending on time,
+#     '1d' for lon/lat dimensions or None
+# lonlat_names : names of lon/lat variables
+# crs : write CF grid mapping variable
+# compressed : compress the data variable (memory mapped products are uncompressed)
+# cls : name of the class in geodataset.custom_geodataset, for classes which are
+#     not detected by open_netcdf
+LAYOUTS = {
+    'osisaf': dict(filename='ice_conc_nh_polstere-100_multi_202001011200.nc',
+        shape=(1120, 760), grid='stere', lonlat='2d', lonlat_names=('lon', 'lat'),
+        crs=True, compressed=True, var_name='ice_conc'),
+    'cmems_ice_chart': dict(filename='ice_conc_svalbard_202001011500.nc',
+        shape=(1500, 1500), grid='stere', lonlat='2d', lonlat_names=('lon', 'lat'),
+        crs=True, compressed=True, var_name='ice_concentration'),
+    'jaxa_amsr2': dict(filename='Arc_20200101_res3.125_pyres.nc',
+        shape=(3584, 2432), grid='stere', lonlat='2d',
+        lonlat_names=('longitude', 'latitude'), crs=False, compressed=True, var_name='sic'),
+    'smos': dict(filename='SMOS_Icethickness_v3.2_north_20200101.nc',
+        shape=(896, 608), grid='stere', lonlat='2d', lonlat_names=('longitude', 'latitude'),
+        crs=False, compressed=True, var_name='sea_ice_thickness'),
+    'nersc_deformation': dict(filename='arctic_2km_deformation_20200101T000000.nc',
+        shape=(2800, 2400), grid='stere', lonlat=None, lonlat_names=None,
+        crs=True, compressed=True, var_name='Divergence'),
+    'nersc_icetype': dict(filename='arctic_2km_icetype_20200101T000000.nc',
+        shape=(2800, 2400), grid='stere', lonlat=None, lonlat_names=None,
+        crs=True, compressed=True, var_name='Ice_Type'),
+    'nersc_sea_ice_age': dict(filename='arctic25km_sea_ice_age_v2p1_20200101.nc',
+        shape=(448, 304), grid='stere', lonlat=None, lonlat_names=None,
+        crs=True, compressed=True, var_name='sea_ice_age'),
+    'osisaf_drifters_nextsim': dict(filename='OSISAF_Drifters_20200101.nc',
+        shape=(177, 119), grid='stere', lonlat='3d', lonlat_names=('longitude', 'latitude'),
+        crs=False, compressed=True, var_name='sic'),
+    'unibremen_albedo': dict(filename='mpd1_20200101.nc',
+        shape=(896, 608), fixed_shape=True, grid='stere', xy_units=None, lonlat=None,
+        lonlat_names=None, crs=False, compressed=True, var_name='mpf'),
+    'arcmfc': dict(filename='TOPAZ4_arctic_20200101.nc',
+        shape=(880, 800), grid='stere', xy_units='100 km',
+        proj='+proj=stere +lat_0=90 +lat_ts=90 +lon_0=-45 +x_0=0 +y_0=0'
+            ' +R=6378273 +ellps=sphere +units=m +no_defs',
+        lonlat='2d', lonlat_names=('longitude', 'latitude'), crs=False, compressed=True,
+        var_name='fice', cls='ArcMFCModelFile'),
+    'dist2coast': dict(filename='dist2coast_4deg.nc',
+        shape=(2250, 4500), grid='lonlat', lonlat='1d', lonlat_names=('lon', 'lat'),
+        crs=False, compressed=False, var_name='dist'),
+    'etopo': dict(filename='ETOPO_Arctic_5arcmin.nc',
+        shape=(360, 4320), grid='lonlat', lonlat='1d', lonlat_names=('lon', 'lat'),
+        crs=False, compressed=False, var_name='z'),
+}
+
+SIZE_FACTORS = dict(realistic=1, small=8)
+
+
+def get_size():
+    """ Get size of benchmark files from GEODATASET_BENCH_SIZE """
+    size = os.getenv('GEODATASET_BENCH_SIZE', 'realistic')
+    if size not in SIZE_FACTORS:
+        raise ValueError('GEODATASET_BENCH_SIZE must be one of %s' % list(SIZE_FACTORS))
+    return size
+
+
+def get_shape(layout, size=None):
+    """ Get (ny, nx) of a layout for a given size
+    ('realistic', 'small' or a number to divide the realistic shape by)
+    """
+    if LAYOUTS[layout].get('fixed_shape'):
+        return LAYOUTS[layout]['shape']
+    size = size or get_size()
+    factor = SIZE_FACTORS.get(size, size)
+    return tuple(max(4, int(n / factor)) for n in LAYOUTS[layout]['shape'])
+
+
+def get_xy(layout, size=None):
+    """ Get vectors of x and y coordinates (m or degrees) of a layout
+
+    Returns
+    -------
+    x : numpy.ndarray
+    y : numpy.ndarray
+        decreasing along rows, like in most products
+    """
+    ny, nx = get_shape(layout, size)
+    if LAYOUTS[layout]['grid'] == 'lonlat':
+        dlon = 360. / nx
+        lat_min = 0. if layout == 'dist2coast' else 60.
+        dlat = (90. - lat_min) / ny
+        x = -180 + dlon * (np.arange(nx) + .5)
+        y = 90 - dlat * (np.arange(ny) + .5)
+        return x, y
+    x0, x1, y0, y1 = NSIDC_EXTENT
+    dx, dy = (x1 - x0) / nx, (y1 - y0) / ny
+    return x0 + dx * (np.arange(nx) + .5), y1 - dy * (np.arange(ny) + .5)
+
+
+def get_field(x, y, nt=1):
+    """ Smooth field with NaN over 'land', similar to geophysical products
+
+    Returns
+    -------
+    data : numpy.ndarray(float32)
+        3D array with shape (nt, len(y), len(x))
+    """
+    x_grd, y_grd = np.meshgrid(x / np.ptp(x), y / np.ptp(y))
+    field = np.sin(6 * x_grd) * np.cos(5 * y_grd)
+    land = np.sin(23 * x_grd + 3) * np.sin(17 * y_grd) > .6
+    field[land] = np.nan
+    data = field[None] + .1 * np.arange(nt)[:, None, None]
+    return data.astype(np.float32)
+
+
+def write_file(filename, layout, size=None, nt=1):
+    """ Write a synthetic file of a given layout
+
+    Parameters
+    ----------
+    filename : str
+        name of output file
+    layout : str
+        key in LAYOUTS
+    size : str or float
+        'realistic', 'small' or a number to divide the realistic shape by
+    nt : int
+        number of time steps
+    """
+    spec = LAYOUTS[layout]
+    x, y = get_xy(layout, size)
+    proj = pyproj.Proj(spec.get('proj', 3411))
+    xy_units = spec.get('xy_units', 'm')
+    with Dataset(filename, 'w') as ds:
+        # contiguous variables cannot have an unlimited dimension
+        ds.createDimension('time', None if spec['compressed'] else nt)
+        tvar = ds.createVariable('time', 'f8', ('time',))
+        tvar.setncatts(dict(units='seconds since 1978-01-01', calendar='standard',
+            standard_name='time'))
+        tvar[:] = 1325419200 + 86400 * np.arange(nt)
+        if spec['grid'] == 'lonlat':
+            dims = spec['lonlat_names'][::-1]
+            for name, vec, units in [(dims[1], x, 'degrees_east'), (dims[0], y, 'degrees_north')]:
+                ds.createDimension(name, vec.size)
+                var = ds.createVariable(name, 'f8', (name,))
+                var.setncatts(dict(standard_name={'lon': 'longitude', 'lat': 'latitude'}[name],
+                    units=units))
+                var[:] = vec
+        else:
+            dims = ('y', 'x')
+            for name, vec in [('x', x), ('y', y)]:
+                ds.createDimension(name, vec.size)
+                if xy_units is None:
+                    continue
+                var = ds.createVariable(name, 'f8', (name,))
+                var.setncatts(dict(standard_name='projection_%s_coordinate' % name,
+                    units=xy_units))
+                var[:] = vec / get_length_factor(xy_units)
+        if spec['crs']:
+            gm_var = ds.createVariable('crs', 'i1')
+            gm_var.setncatts(proj.crs.to_cf())
+        if spec['lonlat'] in ('2d', '3d'):
+            lon, lat = proj(*np.meshgrid(x, y), inverse=True)
+            lonlat_dims = dims if spec['lonlat'] == '2d' else ('time',) + dims
+            for name, data, standard_name in zip(spec['lonlat_names'], [lon, lat],
+                    ['longitude', 'latitude']):
+                var = ds.createVariable(name, 'f8', lonlat_dims, zlib=True)
+                var.setncatts(dict(standard_name=standard_name))
+                var[:] = data if spec['lonlat'] == '2d' else np.repeat(data[None], nt, axis=0)
+        var = ds.createVariable(spec['var_name'], 'f4', ('time',) + dims,
+            zlib=spec['compressed'], fill_value=np.float32(-999),
+            contiguous=not spec['compressed'])
+        if spec['crs']:
+            var.setncattr('grid_mapping', 'crs')
+        var[:] = np.ma.masked_invalid(get_field(x, y, nt))
+
+
+def get_file(layout, size=None, nt=1):
+    """ Get name of a synthetic file of a given layout, generating it if needed
+
+    Parameters
+    ----------
+    layout : str
+        key in LAYOUTS
+    size : str or float
+        'realistic', 'small' or a number to divide the realistic shape by
+        (default is from GEODATASET_BENCH_SIZE)
+    nt : int
+        number of time steps
+
+    Returns
+    -------
+    filename : str
+    """
+    size = size or get_size()
+    data_dir = os.path.join(os.getenv('GEODATASET_BENCH_DIR',
+        os.path.join(tempfile.gettempdir(), 'geodataset_bench')), str(size), layout)
+    if nt > 1:
+        data_dir = os.path.join(data_dir, 'nt%d' % nt)
+    filename = os.path.join(data_dir, LAYOUTS[layout]['filename'])
+    if not os.path.exists(filename):
+        os.makedirs(data_dir, exist_ok=True)
+        tmp_filename = filename + '.tmp'
+        write_file(tmp_filename, layout, size, nt)
+        os.replace(tmp_filename, filename)
+    return filename
+
+
+def open_file(layout, size=None, nt=1):
+    """ Open a synthetic file of a given layout (see get_file) with open_netcdf or with
+    the class of the layout
+
+    Returns
+    -------
+    ds : GeoDatasetRead or custom children
+    """
+    filename = get_file(layout, size, nt)
+    if 'cls' in LAYOUTS[layout]:
+        return getattr(custom_geodataset, LAYOUTS[layout]['cls'])(filename)
+    return open_netcdf(filename)
@@ -0,0 +1,61 @@
+""" Compare write speed, file size and read-back speed of GeoDatasetWrite profiles
+
+Usage:
+    python benchmarks/write_profiles.py [nt ny nx]
+
+The same comparison is included in the benchmark suite (bench_write.WriteProfiles).
+"""
+import os
+import sys
+import tempfile
+import time
+
+from netCDF4 import Dataset
+import numpy as np
+
+from geodataset.geodataset import GeoDatasetWrite, WRITE_PROFILES
+
+
+def write_file(filename, data, profile):
+    nt, ny, nx = data.shape
+    with GeoDatasetWrite(filename, 'w') as nc:
+        nc.grid_mapping_variable = 'polar_stereographic'
+        nc.write_profile = profile
+        nc.set_time_variable(np.arange(nt), dict(units='days since 2020-01-01'))
+        nc.set_xy_dims(np.arange(nx) * 1e4, np.arange(ny) * 1e4)
+        nc.set_projection_variable()
+        nc.set_variable('sic', data, ('time', 'y', 'x'), dict(units='1'))
+
+
+def main(nt=30, ny=1000, nx=1000):
+    rng = np.random.default_rng(0)
+    # smooth field with noise, similar to geophysical products
+    y, x = np.meshgrid(np.linspace(0, 6, ny), np.linspace(0, 6, nx), indexing='ij')
+    data = (np.sin(x) * np.cos(y))[None] + .01 * rng.standard_normal((nt, ny, nx))
+    data = data.astype(np.float32)
+    profiles = [None] + list(WRITE_PROFILES) + [
+        dict(WRITE_PROFILES['small-file'], least_significant_digit=3)]
+    print('%-32s %10s %10s %10s %12s' % (
+        'profile', 'write, s', 'size, MB', 'map, ms', 'series, ms'))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for i, profile in enumerate(profiles):
+            filename = os.path.join(tmpdir, 'bench%d.nc' % i)
+            t0 = time.perf_counter()
+            write_file(filename, data, profile)
+            t_write = time.perf_counter() - t0
+            size = os.path.getsize(filename) / 2**20
+            with Dataset(filename) as ds:
+                t0 = time.perf_counter()
+                ds['sic'][nt // 2]
+                t_map = time.perf_counter() - t0
+            with Dataset(filename) as ds:
+                t0 = time.perf_counter()
+                ds['sic'][:, ny // 2, nx // 2]
+                t_series = time.perf_counter() - t0
+            name = profile if not isinstance(profile, dict) else 'small-file, lsd=3'
+            print('%-32s %10.2f %10.1f %10.1f %12.1f' % (
+                name, t_write, size, t_map * 1e3, t_series * 1e3))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:4]])
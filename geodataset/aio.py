@@ -0,0 +1,245 @@
+""" asyncio-friendly reading of netCDF files
+
+netCDF calls run in a dedicated executor, so that they do not block the event loop.
+Each worker keeps its own handles to the files (see geodataset.parallel.get_worker_dataset).
+The default executor is a process pool, where requests to different files overlap their
+I/O. In a thread pool netCDF calls are serialised with NETCDF_LOCK (netCDF4 and HDF5 are
+not thread-safe), but the event loop still runs freely.
+
+Cancelling a request which has not started in the executor removes it from the queue.
+A request that is already running completes in its worker and its result is discarded.
+
+Example:
+    ds = await open_netcdf_async('ice_conc.nc')
+    sic = await ds.read_async('ice_conc', time_index=0)
+    values = await ds.interp_to_points_async('ice_conc', lon, lat)
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+import functools
+import os
+
+from geodataset.cache import get_cache
+from geodataset.parallel import get_worker_dataset
+from geodataset.tools import open_netcdf
+from geodataset.utils import NETCDF_LOCK
+
+_default_executor = None
+# classes of files detected by open_netcdf_async
+_detected_classes = get_cache('detected_classes')
+
+
+def get_default_executor():
+    """ Get (create on first call) the default executor for netCDF calls
+
+    Returns
+    -------
+    executor : concurrent.futures.ProcessPoolExecutor
+        pool with os.cpu_count() workers
+    """
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _default_executor
+
+
+def shutdown_default_executor(wait=True):
+    """ Shut down the default executor (a new one is created when needed)
+
+    Parameters
+    ----------
+    wait : bool
+        wait for running calls to complete
+    """
+    global _default_executor
+    if _default_executor is not None:
+        _default_executor.shutdown(wait=wait, cancel_futures=True)
+        _default_executor = None
+
+
+def _detect_class(filename, lock):
+    """ Get class of a file in a worker (see geodataset.tools.open_netcdf) """
+    with (NETCDF_LOCK if lock else nullcontext()):
+        with open_netcdf(filename) as ds:
+            return type(ds)
+
+
+def _call_method(cls, filename, method_name, args, kwargs, lock):
+    """ Call a method of the dataset opened in a worker """
+    with (NETCDF_LOCK if lock else nullcontext()):
+        ds = get_worker_dataset(cls, filename, shared=lock)
+        return getattr(ds, method_name)(*args, **kwargs)
+
+
+async def _run(executor, func, *args):
+    """ Run func in executor without blocking the event loop """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args))
+
+
+class AsyncGeoDataset:
+    """ Handle to a netCDF file with coroutine methods running in an executor
+
+    Attributes
+    ----------
+    filename : str
+        name of the file
+    cls : type
+        GeoDatasetRead or child class detected by open_netcdf_async
+    executor : concurrent.futures.Executor
+        executor running netCDF calls
+    """
+
+    def __init__(self, filename, cls, executor=None):
+        """
+        Parameters
+        ----------
+        filename : str
+            name of the file
+        cls : type
+            GeoDatasetRead or a child class to open the file with
+        executor : concurrent.futures.Executor
+            executor for netCDF calls (default is get_default_executor())
+        """
+        self.filename = filename
+        self.cls = cls
+        self.executor = executor or get_default_executor()
+        self.lock = isinstance(self.executor, ThreadPoolExecutor)
+
+    def __repr__(self):
+        return '%s(%s, %s)' % (type(self).__name__, self.filename, self.cls.__name__)
+
+    async def call_async(self, method_name, *args, **kwargs):
+        """ Call any method of the dataset in the executor
+
+        Parameters
+        ----------
+        method_name : str
+            name of GeoDatasetRead method (e.g. 'get_lonlat_arrays')
+        args : list
+            arguments of the method
+        kwargs : dict
+            keyword arguments of the method
+
+        Returns
+        -------
+        result : object
+            output of the method
+        """
+        return await _run(self.executor, _call_method,
+            self.cls, self.filename, method_name, args, kwargs, self.lock)
+
+    async def read_async(self, var_name, time_index=0, ij_range=(None, None, None, None)):
+        """ Read a variable (see GeoDatasetRead.get_variable_array)
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        time_index: int
+            from which time layer to read data
+        ij_range : tuple with 4 ints
+            start/stop along i and j (y and x) axis
+
+        Returns
+        -------
+        array : 2D numpy.array
+        """
+        return await self.call_async('get_variable_array', var_name,
+            time_index=time_index, ij_range=ij_range)
+
+    async def interp_to_points_async(self, var_name, lon, lat, **kwargs):
+        """ Interpolate a variable to points (see GeoDatasetRead.interp_to_points)
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        lon : numpy.ndarray
+            longitudes of points
+        lat : numpy.ndarray
+            latitudes of points
+        kwargs : dict
+            for GeoDatasetRead.interp_to_points
+
+        Returns
+        -------
+        values : numpy.ndarray
+        """
+        return await self.call_async('interp_to_points', var_name, lon, lat, **kwargs)
+
+
+async def open_netcdf_async(filename, executor=None):
+    """ Detect the class of a netCDF file in the executor (see geodataset.tools.open_netcdf).
+    The class is detected once per file name.
+
+    Parameters
+    ----------
+    filename : str
+        name of the file
+    executor : concurrent.futures.Executor
+        executor for netCDF calls (default is get_default_executor())
+
+    Returns
+    -------
+    ds : AsyncGeoDataset
+    """
+    executor = executor or get_default_executor()
+    cls = _detected_classes.get(filename)
+    if cls is None:
+        cls = _detected_classes[filename] = await _run(executor, _detect_class, filename,
+            isinstance(executor, ThreadPoolExecutor))
+    return AsyncGeoDataset(filename, cls, executor)
+
+
+async def read_async(filename, var_name, time_index=0, ij_range=(None, None, None, None),
+        executor=None):
+    """ Open a file and read a variable (see AsyncGeoDataset.read_async)
+
+    Parameters
+    ----------
+    filename : str
+        name of the file
+    var_name : str
+        name of variable
+    time_index: int
+        from which time layer to read data
+    ij_range : tuple with 4 ints
+        start/stop along i and j (y and x) axis
+    executor : concurrent.futures.Executor
+        executor for netCDF calls (default is get_default_executor())
+
+    Returns
+    -------
+    array : 2D numpy.array
+    """
+    ds = await open_netcdf_async(filename, executor)
+    return await ds.read_async(var_name, time_index=time_index, ij_range=ij_range)
+
+
+async def interp_to_points_async(filename, var_name, lon, lat, executor=None, **kwargs):
+    """ Open a file and interpolate a variable to points
+    (see AsyncGeoDataset.interp_to_points_async)
+
+    Parameters
+    ----------
+    filename : str
+        name of the file
+    var_name : str
+        name of variable
+    lon : numpy.ndarray
+        longitudes of points
+    lat : numpy.ndarray
+        latitudes of points
+    executor : concurrent.futures.Executor
+        executor for netCDF calls (default is get_default_executor())
+    kwargs : dict
+        for GeoDatasetRead.interp_to_points
+
+    Returns
+    -------
+    values : numpy.ndarray
+    """
+    ds = await open_netcdf_async(filename, executor)
+    return await ds.interp_to_points_async(var_name, lon, lat, **kwargs)
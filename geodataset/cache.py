@@ -0,0 +1,445 @@
+""" Process-wide registry of caches sharing one memory budget
+
+Caches of the library (interpolation weights, gap-filled fields, open datasets, ...) are
+named views of one registry. Sizes of entries are estimated from NumPy buffers and the
+least recently used entries of all caches are evicted when the total size exceeds the
+budget, or when the memory available to the process (including cgroup limits) falls
+below a minimum. The available memory is read at most once per AVAILABLE_MEMORY_TTL
+seconds. Caches of single objects (e.g. memoized bboxes of a dataset) are CacheViews of
+a shared cache, so that they are covered by the same budget.
+
+The budget is set with the environment variable GEODATASET_CACHE_BUDGET (e.g. '512M',
+'2G' or a number of bytes, default 1G) or with set_cache_budget. Usage is reported by
+cache_usage and caches are emptied with clear_caches (open datasets, which may be in
+use by other threads, only when their cache is named).
+"""
+from collections import OrderedDict
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_CACHE_BUDGET = '1G'
+# caches stop growing when less memory than this is available, see get_available_memory
+DEFAULT_MIN_FREE_MEMORY = '256M'
+# seconds for which the available memory is reused, see CacheRegistry.get_available_memory
+AVAILABLE_MEMORY_TTL = 1.
+_SIZE_UNITS = dict(K=2**10, M=2**20, G=2**30, T=2**40)
+_missing = object()
+
+
+def parse_size(size):
+    """ Convert size with optional unit (K, M, G, T) to bytes
+
+    Parameters
+    ----------
+    size : int or str
+        e.g. 1024, '512M' or '2G'
+
+    Returns
+    -------
+    nbytes : int
+    """
+    if isinstance(size, str):
+        size = size.strip().upper().rstrip('B')
+        if size[-1:] in _SIZE_UNITS:
+            return int(float(size[:-1]) * _SIZE_UNITS[size[-1]])
+    return int(float(size))
+
+
+def get_object_size(obj):
+    """ Estimate memory used by a cached object: NumPy buffers (and objects with nbytes
+    attribute) are counted fully, containers recursively.
+
+    Parameters
+    ----------
+    obj : object
+
+    Returns
+    -------
+    nbytes : int
+    """
+    if isinstance(obj, np.ndarray) or hasattr(obj, 'nbytes'):
+        return int(obj.nbytes)
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(get_object_size(i) for i in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(get_object_size(i) for i in obj.values())
+    return sys.getsizeof(obj)
+
+
+def _read_int(filename):
+    try:
+        with open(filename) as f:
+            return int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def get_available_memory():
+    """ Get memory available to the process: MemAvailable of the system, reduced by
+    the limit of the cgroup (e.g. of a batch job) if it is set
+
+    Returns
+    -------
+    nbytes : int or None
+        None if it cannot be determined
+    """
+    available = []
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    available.append(int(line.split()[1]) * 1024)
+                    break
+    except (OSError, ValueError):
+        pass
+    limit = _read_int('/sys/fs/cgroup/memory.max')
+    current = _read_int('/sys/fs/cgroup/memory.current')
+    if limit is not None and current is not None:
+        available.append(limit - current)
+    return min(available) if available else None
+
+
+class Cache:
+    """ Named cache in a CacheRegistry, with a dict-like interface
+
+    Attributes
+    ----------
+    name : str
+        name of the cache
+    max_entries : int or None
+        maximum number of entries (in addition to the memory budget)
+    on_evict : function or None
+        called with evicted values (e.g. to close datasets)
+    evictable : bool
+        entries can be evicted to keep within the memory budget.
+        Caches of objects that may be in use (e.g. open datasets) are limited only by
+        max_entries.
+    hits : int
+        number of successful lookups
+    misses : int
+        number of failed lookups
+    """
+
+    def __init__(self, registry, name, max_entries=None, on_evict=None, evictable=True):
+        self.registry = registry
+        self.name = name
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self.evictable = evictable
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return '%s(%s, %d entries, %d bytes)' % (
+            type(self).__name__, self.name, len(self), self.nbytes)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __getitem__(self, key):
+        value = self.get(key, _missing)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.registry.put(self, key, value)
+
+    def keys(self):
+        return list(self.entries)
+
+    def get(self, key, default=None):
+        """ Get value and mark it as recently used
+
+        Parameters
+        ----------
+        key : hashable
+        default : object
+            returned if key is not in the cache
+
+        Returns
+        -------
+        value : object
+        """
+        with self.registry.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(key)
+            self.registry.order.move_to_end((self.name, key))
+            return self.entries[key][0]
+
+    def pop(self, key, default=None):
+        """ Remove value without calling on_evict """
+        with self.registry.lock:
+            if key not in self.entries:
+                return default
+            return self.registry.remove(self, key)
+
+    def clear(self):
+        """ Remove all values (on_evict is called for each) """
+        with self.registry.lock:
+            while self.entries:
+                self.registry.evict(self, next(iter(self.entries)))
+
+
+class CacheView:
+    """ Dict-like view of the entries of one object (e.g. a dataset) in a shared Cache.
+    Keys are prefixed with a scope unique to the view, so the entries of many objects
+    share the eviction and the memory budget of the cache.
+
+    Example:
+        bboxes = CacheView(get_cache('bboxes'))
+        bboxes[key] = bbox
+    """
+
+    def __init__(self, cache, scope=None):
+        """
+        Parameters
+        ----------
+        cache : Cache
+            shared cache
+        scope : hashable
+            prefix of keys (a new unique object by default)
+        """
+        self.cache = cache
+        self.scope = object() if scope is None else scope
+
+    def __repr__(self):
+        return '%s(%s, %d entries)' % (type(self).__name__, self.cache.name, len(self))
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, key):
+        return (self.scope, key) in self.cache
+
+    def __getitem__(self, key):
+        return self.cache[(self.scope, key)]
+
+    def __setitem__(self, key, value):
+        self.cache[(self.scope, key)] = value
+
+    def keys(self):
+        return [key for scope, key in self.cache.keys() if scope is self.scope]
+
+    def get(self, key, default=None):
+        """ Get value and mark it as recently used (see Cache.get) """
+        return self.cache.get((self.scope, key), default)
+
+    def pop(self, key, default=None):
+        """ Remove value without calling on_evict (see Cache.pop) """
+        return self.cache.pop((self.scope, key), default)
+
+    def clear(self):
+        """ Remove all values of the view (without calling on_evict) """
+        for key in self.keys():
+            self.pop(key)
+
+
+class CacheRegistry:
+    """ Caches sharing a memory budget with least recently used eviction across caches
+
+    Attributes
+    ----------
+    caches : dict
+        caches by name
+    order : OrderedDict
+        (cache name, key) of all entries from the least to the most recently used
+    available_memory_ttl : float
+        seconds for which the available memory is reused (see get_available_memory)
+    """
+
+    def __init__(self, budget=None, min_free_memory=None):
+        """
+        Parameters
+        ----------
+        budget : int or str
+            maximum memory of all cached values (see parse_size).
+            Default is from GEODATASET_CACHE_BUDGET or DEFAULT_CACHE_BUDGET.
+        min_free_memory : int or str
+            caches are shrunk when less memory is available to the process.
+            Default is from GEODATASET_CACHE_MIN_FREE or DEFAULT_MIN_FREE_MEMORY.
+        """
+        if budget is None:
+            budget = os.environ.get('GEODATASET_CACHE_BUDGET', DEFAULT_CACHE_BUDGET)
+        if min_free_memory is None:
+            min_free_memory = os.environ.get('GEODATASET_CACHE_MIN_FREE',
+                DEFAULT_MIN_FREE_MEMORY)
+        self.budget = parse_size(budget)
+        self.min_free_memory = parse_size(min_free_memory)
+        self.caches = {}
+        self.order = OrderedDict()
+        self.lock = threading.RLock()
+        self.available_memory_ttl = AVAILABLE_MEMORY_TTL
+        # (time.monotonic(), available memory) of the last reading
+        self._available_memory = None
+
+    @property
+    def nbytes(self):
+        """ Memory used by all cached values """
+        return sum(cache.nbytes for cache in self.caches.values())
+
+    def get_cache(self, name, max_entries=None, on_evict=None, evictable=True):
+        """ Get cache by name (create it on first call, see Cache)
+
+        Returns
+        -------
+        cache : Cache
+        """
+        with self.lock:
+            if name not in self.caches:
+                self.caches[name] = Cache(self, name, max_entries, on_evict, evictable)
+            return self.caches[name]
+
+    def put(self, cache, key, value):
+        """ Add value to cache and evict least recently used values when the cache is
+        full, the budget is exceeded or the available memory is low. Values which do not
+        fit in the budget (or when memory is low) are not cached.
+        """
+        nbytes = get_object_size(value)
+        with self.lock:
+            if key in cache.entries:
+                self.remove(cache, key)
+            if cache.evictable:
+                if nbytes > self.budget or self.shrink_if_memory_is_low():
+                    return
+            cache.entries[key] = (value, nbytes)
+            cache.nbytes += nbytes
+            self.order[(cache.name, key)] = None
+            while cache.max_entries is not None and len(cache.entries) > cache.max_entries:
+                self.evict(cache, next(iter(cache.entries)))
+            self.evict_to_fit(self.budget)
+
+    def remove(self, cache, key):
+        """ Remove value from cache (without calling on_evict) and return it """
+        value, nbytes = cache.entries.pop(key)
+        cache.nbytes -= nbytes
+        del self.order[(cache.name, key)]
+        return value
+
+    def evict(self, cache, key):
+        """ Remove value from cache and call on_evict """
+        value = self.remove(cache, key)
+        if cache.on_evict is not None:
+            cache.on_evict(value)
+
+    def evict_to_fit(self, nbytes):
+        """ Evict least recently used values of evictable caches until they use at most
+        nbytes """
+        with self.lock:
+            used = sum(c.nbytes for c in self.caches.values() if c.evictable)
+            for name, key in list(self.order):
+                if used <= nbytes:
+                    break
+                cache = self.caches[name]
+                if cache.evictable:
+                    used -= cache.entries[key][1]
+                    self.evict(cache, key)
+
+    def get_available_memory(self):
+        """ Get memory available to the process (see get_available_memory), read at most
+        once per available_memory_ttl seconds
+
+        Returns
+        -------
+        nbytes : int or None
+            None if it cannot be determined
+        """
+        now = time.monotonic()
+        if (self._available_memory is None
+                or now - self._available_memory[0] >= self.available_memory_ttl):
+            self._available_memory = (now, get_available_memory())
+        return self._available_memory[1]
+
+    def shrink_if_memory_is_low(self):
+        """ Evict half of the cached memory if the available memory is below
+        min_free_memory
+
+        Returns
+        -------
+        is_low : bool
+            True if memory was low
+        """
+        if self.min_free_memory <= 0:
+            return False
+        available = self.get_available_memory()
+        if available is None or available >= self.min_free_memory:
+            return False
+        self.evict_to_fit(self.nbytes // 2)
+        # measure the memory freed by eviction at the next insertion
+        self._available_memory = None
+        return True
+
+    def usage(self):
+        """ Get usage of all caches
+
+        Returns
+        -------
+        usage : dict
+            for each cache name: dict with entries, nbytes, hits and misses
+        """
+        with self.lock:
+            return {name: dict(entries=len(c), nbytes=c.nbytes, hits=c.hits, misses=c.misses)
+                for name, c in self.caches.items()}
+
+    def clear(self, name=None):
+        """ Clear one cache or all evictable caches
+
+        Parameters
+        ----------
+        name : str
+            name of cache. If None, all evictable caches are cleared; caches of objects
+            that may be in use (e.g. open datasets) are only cleared by name.
+        """
+        with self.lock:
+            for cache in list(self.caches.values()):
+                if cache.name == name or (name is None and cache.evictable):
+                    cache.clear()
+
+
+# registry of the current process
+registry = CacheRegistry()
+
+
+def get_cache(name, max_entries=None, on_evict=None, evictable=True):
+    """ Get cache from the registry of the current process (see CacheRegistry.get_cache) """
+    return registry.get_cache(name, max_entries, on_evict, evictable)
+
+
+def get_cache_budget():
+    """ Get memory budget of all caches (in bytes) """
+    return registry.budget
+
+
+def set_cache_budget(budget):
+    """ Set memory budget of all caches and evict values exceeding it
+
+    Parameters
+    ----------
+    budget : int or str
+        maximum memory in bytes or with unit (e.g. '512M', see parse_size)
+    """
+    with registry.lock:
+        registry.budget = parse_size(budget)
+        registry.evict_to_fit(registry.budget)
+
+
+def cache_usage():
+    """ Get usage of all caches (see CacheRegistry.usage) """
+    return registry.usage()
+
+
+def clear_caches(name=None):
+    """ Clear one cache or all evictable caches (see CacheRegistry.clear) """
+    registry.clear(name)
@@ -38,10 +38,12 @@ class CmemsMetIceChart(CustomDatasetRead):
 class Dist2Coast(CustomDatasetRead):
     pattern = re.compile(r'dist2coast_4deg.nc')
     lonlat_names = 'lon', 'lat'
+    use_memmap = True
 
 
 class Etopo(CustomDatasetRead):
     pattern = re.compile(r'ETOPO_Arctic_\d{1,2}arcmin.nc')
+    use_memmap = True
 
 
 class JaxaAmsr2IceConc(CustomDatasetRead):
@@ -52,6 +54,7 @@ class JaxaAmsr2IceConc(CustomDatasetRead):
 
 class NERSCProductBase(CustomDatasetRead):
     lonlat_names = 'absent', 'absent'
+    lonlat_in_file = False
 
     def get_lonlat_arrays(self, ij_range=(None,None,None,None), **kwargs):
         """
@@ -109,6 +112,8 @@ class UniBremenAlbedoMPF(CustomDatasetRead):
             '+proj=stere +lat_0=90 +lat_ts=70 +lon_0=-45 +x_0=0 +y_0=0 '
             '+ellps=WGS84 +units=m +no_defs'), 'absent')
     pattern = re.compile(r'mpd1_\d{8}.nc')
+    lonlat_names = 'absent', 'absent'
+    lonlat_in_file = False
 
     @staticmethod
     def get_xy_arrays(ij_range=(None,None,None,None), **kwargs):
@@ -0,0 +1,138 @@
+from concurrent.futures import (
+    FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait)
+from contextlib import nullcontext
+from itertools import islice
+import os
+import threading
+import traceback
+
+from geodataset.geodataset import GeoDatasetWrite
+from geodataset.utils import NETCDF_LOCK
+
+
+def get_temporary_filename(filename):
+    """ Get name of a hidden temporary file in the same directory as filename
+    (so that it can be renamed to filename atomically)
+
+    Parameters
+    ----------
+    filename : str
+        name of output file
+
+    Returns
+    -------
+    tmp_filename : str
+    """
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    return os.path.join(dirname, '.%s.%d.%d.tmp' % (
+        basename, os.getpid(), threading.get_ident()))
+
+
+def export_file(filename, spec, producer=None, cls=GeoDatasetWrite, lock=False, **kwargs):
+    """ Write one file from a spec into a temporary file and rename it to filename
+    when it is complete
+
+    Parameters
+    ----------
+    filename : str
+        name of output file
+    spec : dict
+        description of the file (see GeoDatasetWrite.define_from_spec)
+    producer : function
+        function that takes spec and returns the spec with data
+        (it runs in the worker, so the data is not sent between processes)
+    cls : type
+        GeoDatasetWrite or a child class to write the file with
+    lock : bool
+        serialise netCDF calls (required in a thread pool)
+    kwargs : dict
+        keyword arguments for cls (e.g. format)
+
+    Returns
+    -------
+    filename : str
+    """
+    if producer is not None:
+        spec = producer(spec)
+    tmp_filename = get_temporary_filename(filename)
+    try:
+        with (NETCDF_LOCK if lock else nullcontext()):
+            with cls(tmp_filename, 'w', **kwargs) as ds:
+                ds.set_from_spec(spec)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+    return filename
+
+
+def export_files(jobs, executor='process', max_workers=None, max_in_flight=None,
+        cls=GeoDatasetWrite, lock=True, **kwargs):
+    """ Write several files in parallel
+
+    Jobs are taken from the iterable only when there is room for them, so at most
+    max_in_flight specs (with their data) are held in memory at once.
+    Each file is written to a temporary file and renamed when it is complete,
+    so a failed or interrupted job never leaves a partial output file.
+
+    Parameters
+    ----------
+    jobs : iterable
+        tuples (filename, spec, producer) (see export_file). producer can be None.
+    executor : str or concurrent.futures.Executor
+        'process', 'thread' or an existing executor
+    max_workers : int
+        number of workers for a new executor (default is number of CPUs)
+    max_in_flight : int
+        maximum number of submitted and not completed jobs (default is 2 * max_workers)
+    cls : type
+        GeoDatasetWrite or a child class to write the files with
+    lock : bool
+        serialise netCDF calls in a thread pool (producers still run in parallel).
+        Ignored for a process pool.
+    kwargs : dict
+        keyword arguments for cls (e.g. format)
+
+    Returns
+    -------
+    report : dict
+        written : list(str)
+            names of written files (in order of completion)
+        failed : list(tuple)
+            pairs (filename, traceback) for failed jobs
+    """
+    max_workers = max_workers or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * max_workers
+    own_executor = not isinstance(executor, Executor)
+    if executor == 'process':
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    elif executor == 'thread':
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    lock = lock and isinstance(executor, ThreadPoolExecutor)
+
+    report = dict(written=[], failed=[])
+    in_flight = {}
+    jobs = iter(jobs)
+    try:
+        while True:
+            for filename, spec, producer in islice(jobs, max_in_flight - len(in_flight)):
+                future = executor.submit(
+                    export_file, filename, spec, producer, cls, lock, **kwargs)
+                in_flight[future] = filename
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename = in_flight.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    report['failed'].append((filename, ''.join(
+                        traceback.format_exception(type(e), e, e.__traceback__))))
+                else:
+                    report['written'].append(filename)
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+    return report
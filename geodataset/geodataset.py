@@ -1,15 +1,56 @@
 import datetime as dt
+from contextlib import nullcontext
 from functools import cached_property
+import time
 
 from netCDF4 import Dataset
 from netcdftime import num2date
 import numpy as np
 import pyproj
 from pyproj.exceptions import CRSError
-from scipy.interpolate import RegularGridInterpolator
+import xarray as xr
 from xarray.core.variable import MissingDimensionsError
 
-from geodataset.utils import InvalidDatasetError, fill_nan_gaps
+from geodataset import instrumentation
+from geodataset.cache import CacheView, get_cache
+from geodataset.grid_geometry import GridGeometry
+from geodataset.interpolation import BilinearWeights, interp_field
+from geodataset.memmap import get_memmap_variable
+from geodataset.parallel import iter_prefetched, read_variable_tiled
+from geodataset.utils import (
+    NETCDF_LOCK,
+    InvalidDatasetError,
+    densify_lonlat,
+    fill_nan_gaps,
+    get_edge_ij_ranges,
+    get_length_factor,
+    get_packing_parameters,
+    get_time_offsets,
+    get_transformer,
+    get_valid_range,
+    pack_array,
+)
+
+
+# Compression and chunking profiles for GeoDatasetWrite:
+# complevel and shuffle are passed to netCDF4.Dataset.createVariable,
+# time_chunk is the chunk size along time (or unlimited) dimensions,
+# space_chunk is the maximum chunk size along other dimensions
+# (chunk sizes are set for multidimensional variables only),
+# least_significant_digit (optional) quantizes floating point data variables
+WRITE_PROFILES = {
+    'fast-write': dict(complevel=1, shuffle=True),
+    'small-file': dict(complevel=9, shuffle=True),
+    'map-access': dict(complevel=4, shuffle=True, time_chunk=1, space_chunk=1024),
+    'timeseries-access': dict(complevel=4, shuffle=True, time_chunk=256, space_chunk=32),
+}
+
+# memoized bboxes and memory mapped variables of all datasets share the cache budget
+# (see GeoDatasetRead.bbox_cache and GeoDatasetRead.memmap_variables)
+MAX_CACHED_BBOXES = 1024
+MAX_MEMMAP_VARIABLES = 256
+_bbox_cache = get_cache('bboxes', max_entries=MAX_CACHED_BBOXES)
+_memmap_cache = get_cache('memmap_variables', max_entries=MAX_MEMMAP_VARIABLES)
 
 
 class GeoDatasetBase(Dataset):
@@ -28,9 +69,15 @@ class GeoDatasetBase(Dataset):
         filename : str
             name of input file
         """
-        super().__init__(*args, **kwargs)
-        self.filename = args[0]
-        self._check_input_file()
+        with instrumentation.timed(self, 'open'):
+            super().__init__(*args, **kwargs)
+            self.filename = args[0]
+            try:
+                self._check_input_file()
+            except InvalidDatasetError:
+                # close now, not when garbage collected (possibly in another thread)
+                self.close()
+                raise
 
     def __setattr__(self, att, val):
         """ set object attributes (not netcdf attributes)
@@ -41,24 +88,38 @@ class GeoDatasetBase(Dataset):
         """ Check if input file is valid for the current class or raise InvalidDatasetError """
         pass
 
+    @cached_property
+    def stats(self):
+        """ Counters and timers of this dataset (collected if instrumentation is enabled,
+        see geodataset.instrumentation)
+
+        Returns
+        -------
+        stats : geodataset.instrumentation.Stats
+        """
+        return instrumentation.Stats()
+
     def convert_time_data(self, tdata):
         """
         Convert numeric time values to datetime.datetime objects.
-        Uses time units of variable with name self.time_name
+        Uses time units and calendar of variable with name self.time_name.
+        All values are converted in one call to num2date.
 
         Parameters:
         -----------
-        time_num : numpy.ndarray(float)
+        tdata : numpy.ndarray(float)
 
         Returns:
         --------
         time : numpy.ndarray(datetime.datetime)
+            same shape as tdata (cftime objects for non-standard calendars)
         """
         atts = vars(self.variables[self.time_name])
         cal = atts.get('calendar', 'standard')
         units = atts['units']
-        datetimes = [num2date(t, units, calendar=cal)
-                for t in tdata.flatten()]
+        if tdata.size == 0:
+            return np.array([], dtype=object).reshape(tdata.shape)
+        datetimes = num2date(np.ma.getdata(tdata).flatten(), units, calendar=cal)
         return np.array(datetimes).reshape(tdata.shape)
 
     @cached_property
@@ -113,8 +174,55 @@ class GeoDatasetWrite(GeoDatasetBase):
     projection = pyproj.Proj(
             "+proj=stere +lat_0=90 +lat_ts=90 +lon_0=-45 "
             " +x_0=0 +y_0=0 +R=6378273 +ellps=sphere +units=m")
+    # name of a profile in WRITE_PROFILES (or a dict) for all variables
+    write_profile = None
+
+    def get_variable_kwargs(self, dims, profile=None, is_data=False):
+        """
+        Get keyword arguments for netCDF4.Dataset.createVariable from a write profile
 
-    def set_projection_variable(self):
+        Parameters:
+        -----------
+        dims : tuple(str)
+            names of dimensions of the new variable
+        profile : str or dict
+            name of a profile in WRITE_PROFILES or a dict with the same keys.
+            If None, self.write_profile is used.
+            If both are None, only zlib compression with default settings is used.
+        is_data : bool
+            True for data variables (least_significant_digit is only applied to them)
+
+        Returns:
+        --------
+        kw : dict
+            keyword arguments for netCDF4.Dataset.createVariable
+        """
+        kw = dict(zlib=True)# use compression
+        profile = profile or self.write_profile
+        if profile is None:
+            return kw
+        if isinstance(profile, str):
+            profile = WRITE_PROFILES[profile]
+        for key in ['complevel', 'shuffle']:
+            if key in profile:
+                kw[key] = profile[key]
+        if is_data and profile.get('least_significant_digit') is not None:
+            kw['least_significant_digit'] = profile['least_significant_digit']
+        if len(dims) > 1 and ('time_chunk' in profile or 'space_chunk' in profile):
+            chunksizes = []
+            for dim_name in dims:
+                dim = self.dimensions[dim_name]
+                if dim_name == self.time_name or dim.isunlimited():
+                    time_chunk = profile.get('time_chunk', 1)
+                    if not dim.isunlimited():
+                        time_chunk = max(1, min(time_chunk, len(dim)))
+                    chunksizes.append(time_chunk)
+                else:
+                    chunksizes.append(max(1, min(profile.get('space_chunk', len(dim)), len(dim))))
+            kw['chunksizes'] = chunksizes
+        return kw
+
+    def set_projection_variable(self, ncatts=None):
         """
         set projection variable.
 
@@ -123,9 +231,17 @@ class GeoDatasetWrite(GeoDatasetBase):
 
         Check netcdf files at:
         http://cfconventions.org/compliance-checker.html
+
+        Parameters:
+        -----------
+        ncatts : dict
+            netcdf attributes of the projection variable.
+            By default they are generated from self.projection
         """
         pvar = self.createVariable(self.grid_mapping_variable, 'i1')
-        pvar.setncatts(self.get_grid_mapping_ncattrs())
+        if ncatts is None:
+            ncatts = self.get_grid_mapping_ncattrs()
+        pvar.setncatts(ncatts)
 
     def set_time_variable(self, time_data, time_atts):
         """
@@ -135,7 +251,8 @@ class GeoDatasetWrite(GeoDatasetBase):
         Parameters:
         -----------
         time_data : np.array
-            data for time variable
+            data for time variable.
+            If None, the variable is only defined (see GeoDatasetWrite.append_time_steps)
         time_atts : dict
             netcdf attributes for time variable
         """
@@ -145,9 +262,11 @@ class GeoDatasetWrite(GeoDatasetBase):
         ncatts = dict(**time_atts)
         ncatts['calendar'] = time_atts.get('calendar', 'standard')
         # time var
-        tvar = self.createVariable('time', 'f8', ('time',), zlib=True)
+        tvar = self.createVariable('time', 'f8', ('time',),
+            **self.get_variable_kwargs(('time',)))
         tvar.setncatts(ncatts)
-        tvar[:] = time_data
+        if time_data is not None:
+            tvar[:] = time_data
 
     def set_time_bnds_variable(self, time_atts, time_bnds_data):
         """
@@ -159,14 +278,16 @@ class GeoDatasetWrite(GeoDatasetBase):
         time_atts : dict
             netcdf attributes for time variable
         time_bnds_data : np.array
-            data for time_bnds variable
+            data for time_bnds variable. If None, the variable is only defined
         """
         self.createDimension('nv', 2)
-        tbvar = self.createVariable('time_bnds', 'f8', ('time', 'nv'), zlib=True)
+        tbvar = self.createVariable('time_bnds', 'f8', ('time', 'nv'),
+            **self.get_variable_kwargs(('time', 'nv')))
         tbvar.setncattr('units', time_atts['units'])
-        tbvar[:] = time_bnds_data
+        if time_bnds_data is not None:
+            tbvar[:] = time_bnds_data
 
-    def set_xy_dims(self, x, y):
+    def set_xy_dims(self, x, y, write_data=True, atts=None, dtype='f8'):
         """
         set the x,y dimensions and variables
 
@@ -176,25 +297,49 @@ class GeoDatasetWrite(GeoDatasetBase):
             vector of x coordinate (units = m)
         y : np.ndarray
             vector of y coordinate (units = m)
+        write_data : bool
+            write x and y to the variables. If False, only dimensions and variables are defined.
+        atts : dict(x=dict, y=dict)
+            attributes of x and y variables (e.g. copied from another file).
+            By default standard_name, units and axis are set.
+        dtype : str or numpy.dtype
+            netcdf data type of x and y variables
         """
         for dim_name, dim_vec in zip(['y', 'x'], [y, x]):
             dst_dim = self.createDimension(dim_name, len(dim_vec))
-            dst_var = self.createVariable(dim_name, 'f8', (dim_name,), zlib=True)
-            dst_var.setncattr('standard_name', 'projection_%s_coordinate' %dim_name)
-            dst_var.setncattr('units', 'm')
-            dst_var.setncattr('axis', dim_name.upper())
-            dst_var[:] = dim_vec
-
-    def set_lonlat(self, lon, lat):
+            kwargs = self.get_variable_kwargs((dim_name,))
+            if atts is not None:
+                var_atts = dict(atts[dim_name])
+                if '_FillValue' in var_atts:
+                    kwargs['fill_value'] = var_atts.pop('_FillValue')
+            dst_var = self.createVariable(dim_name, dtype, (dim_name,), **kwargs)
+            if atts is not None:
+                dst_var.setncatts(var_atts)
+            else:
+                if self.projection.crs.is_geographic:
+                    vname, units = dict(x=('longitude', 'degrees_east'),
+                        y=('latitude', 'degrees_north'))[dim_name]
+                    dst_var.setncattr('standard_name', vname)
+                    dst_var.setncattr('units', units)
+                else:
+                    dst_var.setncattr('standard_name', 'projection_%s_coordinate' %dim_name)
+                    dst_var.setncattr('units', 'm')
+                dst_var.setncattr('axis', dim_name.upper())
+            if write_data:
+                dst_var[:] = dim_vec
+
+    def set_lonlat(self, lon, lat, dtype='f8'):
         """
         set the lon, lat variables
 
         Parameters:
         -----------
         lon : np.ndarray
-            array of longitudes (units = degrees_east)
+            array of longitudes (units = degrees_east). If None, the variable is only defined
         lat : np.ndarray
-            array of latitudes (units = degrees_north)
+            array of latitudes (units = degrees_north). If None, the variable is only defined
+        dtype : str
+            netcdf data type of lon, lat variables (e.g. 'f4' to halve their size)
         """
         data_units = [
                 ('longitude', lon, 'degrees_east'),
@@ -202,13 +347,16 @@ class GeoDatasetWrite(GeoDatasetBase):
                 ]
         dims = tuple(self.spatial_dim_names[::-1])
         for vname, data, units in data_units:
-            dst_var = self.createVariable(vname, 'f8', dims, zlib=True)
+            dst_var = self.createVariable(vname, dtype, dims,
+                **self.get_variable_kwargs(dims))
             dst_var.setncattr('standard_name', vname)
             dst_var.setncattr('long_name', vname)
             dst_var.setncattr('units', units)
-            dst_var[:] = data
+            if data is not None:
+                dst_var[:] = data
 
-    def set_variable(self, vname, data, dims, atts, dtype=np.float32):
+    def set_variable(self, vname, data, dims, atts, dtype=np.float32,
+            profile=None, least_significant_digit=None, pack=None):
         """
         set variable data and attributes
 
@@ -217,16 +365,33 @@ class GeoDatasetWrite(GeoDatasetBase):
         vname : str
             name of new variable
         data : numpy.ndarray
-            data to set in variable
+            data to set in variable.
+            If None, the variable is only defined (see GeoDatasetWrite.append_time_steps)
         dims : list(str)
             list of dimension names for the variable
         atts : dict
             netcdf attributes to set
         dtype : type
             netcdf data type for new variable (eg np.float32 or np.double)
+            or type of unpacked data if pack is used
+        profile : str or dict
+            write profile for this variable (see GeoDatasetWrite.get_variable_kwargs)
+        least_significant_digit : int
+            quantize data to this decimal digit (overrides the profile)
+        pack : bool or dict
+            pack data into int16 with scale_factor and add_offset.
+            If dict, it can contain valid_range (min, max) and precision
+            (see geodataset.utils.get_packing_parameters).
+            By default the range is computed from data.
         """
+        if pack:
+            self.set_packed_variable(vname, data, dims, atts, dtype,
+                profile=profile, **(pack if isinstance(pack, dict) else {}))
+            return
         ncatts = {k:v for k,v in atts.items() if k != '_FillValue'}
-        kw = dict(zlib=True)# use compression
+        kw = self.get_variable_kwargs(dims, profile=profile, is_data=True)
+        if least_significant_digit is not None:
+            kw['least_significant_digit'] = least_significant_digit
         if '_FillValue' in atts:
             # needs to be a keyword for createVariable and of right data type
             kw['fill_value'] = dtype(atts['_FillValue'])
@@ -236,7 +401,353 @@ class GeoDatasetWrite(GeoDatasetBase):
         dst_var = self.createVariable(vname, dtype, dims, **kw)
         ncatts['grid_mapping'] = self.grid_mapping_variable
         dst_var.setncatts(ncatts)
-        dst_var[:] = data
+        if data is not None:
+            dst_var[:] = data
+
+    def set_packed_variable(self, vname, data, dims, atts, dtype=np.float32,
+            profile=None, valid_range=None, precision=None, packed_dtype=np.int16):
+        """
+        set variable packed into integers with scale_factor and add_offset
+
+        Parameters:
+        -----------
+        vname : str
+            name of new variable
+        data : numpy.ndarray
+            data to set in variable. NaN and masked values are set to _FillValue.
+            If None, the variable is only defined and valid_range is required
+        dims : list(str)
+            list of dimension names for the variable
+        atts : dict
+            netcdf attributes to set (_FillValue and missing_value are replaced,
+            valid_min, valid_max and valid_range are converted to packed values)
+        dtype : type
+            type of unpacked data (and of scale_factor and add_offset)
+        profile : str or dict
+            write profile for this variable (see GeoDatasetWrite.get_variable_kwargs)
+        valid_range : tuple(float)
+            minimum and maximum of unpacked data. By default computed from data
+        precision : float
+            required precision of unpacked data
+        packed_dtype : type
+            integer type of packed data
+        """
+        if data is None and valid_range is None:
+            raise ValueError('valid_range is required to define a packed variable without data')
+        scale_factor, add_offset, fill_value = get_packing_parameters(
+            data, valid_range, precision, packed_dtype)
+        ncatts = {k:v for k,v in atts.items() if k not in ['_FillValue', 'missing_value']}
+        ncatts['scale_factor'] = dtype(scale_factor)
+        ncatts['add_offset'] = dtype(add_offset)
+        for att_name in ['valid_min', 'valid_max', 'valid_range']:
+            if att_name in ncatts:
+                # limits are compared with packed values when reading
+                info = np.iinfo(packed_dtype)
+                packed = np.round((np.asarray(ncatts[att_name], dtype=float)
+                    - ncatts['add_offset']) / ncatts['scale_factor'])
+                ncatts[att_name] = np.clip(packed, info.min + 1, info.max).astype(packed_dtype)
+        if 'missing_value' in atts:
+            ncatts['missing_value'] = packed_dtype(fill_value)
+        ncatts['grid_mapping'] = self.grid_mapping_variable
+        kw = self.get_variable_kwargs(dims, profile=profile)
+        kw['fill_value'] = packed_dtype(fill_value)
+        dst_var = self.createVariable(vname, packed_dtype, dims, **kw)
+        dst_var.setncatts(ncatts)
+        if data is not None:
+            self.write_packed_data(dst_var, data)
+
+    @classmethod
+    def write_data(cls, dst_var, data, key=slice(None)):
+        """
+        write data to a variable, packing it if the variable is packed into integers
+
+        Parameters:
+        -----------
+        dst_var : netCDF4.Variable
+            output variable
+        data : numpy.ndarray
+            unpacked data
+        key : slice or tuple
+            where to write data
+        """
+        if 'scale_factor' in dst_var.ncattrs() and dst_var.dtype.kind in 'iu':
+            cls.write_packed_data(dst_var, data, key)
+        else:
+            dst_var[key] = data
+
+    @staticmethod
+    def write_packed_data(dst_var, data, key=slice(None)):
+        """
+        pack data using scale_factor, add_offset and _FillValue of a variable and write it
+
+        Parameters:
+        -----------
+        dst_var : netCDF4.Variable
+            packed variable
+        data : numpy.ndarray
+            unpacked data
+        key : slice or tuple
+            where to write data
+        """
+        packed = pack_array(data, dst_var.scale_factor, dst_var.add_offset,
+            dst_var._FillValue, dst_var.dtype)
+        dst_var.set_auto_maskandscale(False)
+        dst_var[key] = packed
+        dst_var.set_auto_maskandscale(True)
+
+    @property
+    def n_time_steps(self):
+        """
+        Number of complete time steps in the file.
+        The time variable is written last by GeoDatasetWrite.append_time_steps, so steps
+        with missing time values (e.g. from an interrupted append) are not counted.
+
+        Returns:
+        --------
+        n_time_steps : int
+        """
+        time_data = self.variables[self.time_name][:]
+        invalid = np.ma.getmaskarray(time_data)
+        if invalid.any():
+            return int(np.argmax(invalid))
+        return len(time_data)
+
+    def append_time_steps(self, time_data, data, time_bnds_data=None, sync=False):
+        """
+        append one or several time steps to variables with unlimited time dimension.
+        Variables are first defined with data=None (e.g. set_time_variable(None, time_atts),
+        set_variable(vname, None, dims, atts)). A file can be reopened with mode 'a'
+        to resume appending after GeoDatasetWrite.n_time_steps.
+
+        Parameters:
+        -----------
+        time_data : float or np.ndarray
+            time value(s) of the new steps
+        data : dict
+            keys are variable names, values are arrays for one time step
+            (without time dimension) or for a block of steps (with time dimension)
+        time_bnds_data : np.ndarray
+            time bounds of the new steps with shape (2,) or (n, 2)
+        sync : bool
+            flush data to disk after writing
+
+        Returns:
+        --------
+        time_index : int
+            index of the first appended time step
+        """
+        time_data = np.atleast_1d(time_data)
+        i0 = self.n_time_steps
+        i1 = i0 + len(time_data)
+        for vname, vdata in data.items():
+            dst_var = self.variables[vname]
+            t_axis = dst_var.dimensions.index(self.time_name)
+            if np.ndim(vdata) == dst_var.ndim - 1:
+                vdata = np.expand_dims(vdata, t_axis)
+            key = [slice(None)] * dst_var.ndim
+            key[t_axis] = slice(i0, i1)
+            key = tuple(key)
+            self.write_data(dst_var, vdata, key)
+        if time_bnds_data is not None:
+            self.variables['time_bnds'][i0:i1] = np.reshape(time_bnds_data, (-1, 2))
+        # time is written last to mark the steps as complete
+        self.variables[self.time_name][i0:i1] = time_data
+        if sync:
+            self.sync()
+        return i0
+
+    def define_from_spec(self, spec):
+        """
+        Create all dimensions and variables from a spec without writing data.
+        For NETCDF3 files, creating all definitions before writing any data avoids
+        rewriting the file each time a definition is added after data was written.
+        NETCDF4 files do not benefit noticeably.
+
+        Parameters:
+        -----------
+        spec : dict
+            description of the file with optional keys:
+                grid_mapping_variable : str
+                    name of the projection variable (overrides self.grid_mapping_variable)
+                grid_mapping_ncattrs : dict
+                    attributes of the projection variable (see set_projection_variable)
+                projection : pyproj.Proj
+                    projection of the grid (overrides self.projection)
+                time : dict(data=np.ndarray, atts=dict)
+                    time variable (see GeoDatasetWrite.set_time_variable)
+                time_bnds : np.ndarray
+                    data for time_bnds variable (uses time attributes)
+                xy : dict(x=np.ndarray, y=np.ndarray, atts=dict, dtype=str)
+                    coordinates of the grid and, optionally, attributes and data type
+                    of their variables (see GeoDatasetWrite.set_xy_dims)
+                dims : dict
+                    other dimensions (keys are names, values are sizes, e.g. for mesh nodes)
+                lonlat : dict(lon=np.ndarray, lat=np.ndarray, dtype=str)
+                    geographic coordinates (see GeoDatasetWrite.set_lonlat)
+                variables : dict
+                    keys are variable names, values are dicts with keys data, dims, atts and,
+                    optionally, other arguments of GeoDatasetWrite.set_variable
+                    (dtype, profile, least_significant_digit, pack).
+                    data can be an array or a function returning an array, which is called
+                    only when the data is written. Packed variables with a function as data
+                    need valid_range in pack, as the range cannot be computed from data
+                    when the variable is defined.
+
+        Returns:
+        --------
+        writes : list(tuple)
+            pairs (variable name, data) to write with GeoDatasetWrite.write_from_spec
+
+        Raises:
+        -------
+        ValueError
+            if a packed variable has a function as data and no valid_range
+        """
+        for vname, var_spec in spec.get('variables', {}).items():
+            pack = var_spec.get('pack')
+            if (pack and callable(var_spec.get('data'))
+                    and (not isinstance(pack, dict) or pack.get('valid_range') is None)):
+                raise ValueError('valid_range is required in pack of %s (data is a function)'
+                    % vname)
+        writes = []
+        if 'grid_mapping_variable' in spec:
+            self.grid_mapping_variable = spec['grid_mapping_variable']
+        if 'projection' in spec:
+            self.projection = spec['projection']
+        if 'time' in spec:
+            self.set_time_variable(None, spec['time']['atts'])
+            writes.append((self.time_name, spec['time'].get('data')))
+            if 'time_bnds' in spec:
+                self.set_time_bnds_variable(spec['time']['atts'], None)
+                writes.append(('time_bnds', spec['time_bnds']))
+        if 'xy' in spec:
+            self.set_xy_dims(spec['xy']['x'], spec['xy']['y'], write_data=False,
+                atts=spec['xy'].get('atts'), dtype=spec['xy'].get('dtype', 'f8'))
+            writes.extend(zip(['x', 'y'], [spec['xy']['x'], spec['xy']['y']]))
+        for dim_name, size in spec.get('dims', {}).items():
+            self.createDimension(dim_name, size)
+        if self.grid_mapping_variable is not None:
+            self.set_projection_variable(spec.get('grid_mapping_ncattrs'))
+        if 'lonlat' in spec:
+            self.set_lonlat(None, None, spec['lonlat'].get('dtype', 'f8'))
+            writes.extend(zip(self.lonlat_names, [spec['lonlat']['lon'], spec['lonlat']['lat']]))
+        for vname, var_spec in spec.get('variables', {}).items():
+            kwargs = {k: v for k, v in var_spec.items() if k not in ['data', 'dims', 'atts']}
+            data = var_spec.get('data')
+            pack = kwargs.get('pack')
+            if pack and not callable(data) and data is not None:
+                pack = dict(pack) if isinstance(pack, dict) else {}
+                if pack.get('valid_range') is None:
+                    pack['valid_range'] = get_valid_range(data)
+                kwargs['pack'] = pack
+            self.set_variable(vname, None, var_spec['dims'], var_spec.get('atts', {}), **kwargs)
+            writes.append((vname, data))
+        return writes
+
+    def write_from_spec(self, writes):
+        """
+        Write data to variables created by GeoDatasetWrite.define_from_spec
+
+        Parameters:
+        -----------
+        writes : list(tuple)
+            pairs (variable name, data). data can be an array, a function returning an array
+            or None (nothing is written).
+        """
+        for vname, data in writes:
+            if callable(data):
+                data = data()
+            if data is None:
+                continue
+            self.write_data(self.variables[vname], data)
+
+    @staticmethod
+    def get_grid_spec(source, lonlat=None, ij_range=(None, None, None, None)):
+        """
+        Get spec of the grid of a source (see GeoDatasetWrite.define_from_spec).
+        Coordinate variables (data, attributes and data type) and grid mapping attributes
+        are copied from the source file, so nothing is reprojected. Coordinate vectors are
+        taken from the grid geometry only if the source has no coordinate variables
+        (see GeoDatasetRead.xy_coordinate_names).
+
+        Parameters:
+        -----------
+        source : GeoDatasetRead or GridGeometry
+            source of the grid
+        lonlat : str
+            None to omit 2D longitude and latitude (they are redundant with x, y and
+            the grid mapping) or netcdf data type to store them with ('f4' or 'f8')
+        ij_range : tuple with 4 ints
+            start/stop along i and j (y and x) axis of a subset of the grid
+
+        Returns:
+        --------
+        spec : dict
+            with keys projection, grid_mapping_variable, grid_mapping_ncattrs, xy
+            and, optionally, lonlat
+        """
+        if isinstance(source, GridGeometry):
+            geometry = source.subset(ij_range)
+            gmv, ncatts = 'crs', None
+        else:
+            geometry = source.get_grid_geometry(ij_range)
+            gmv, ncatts = source.grid_mapping_variable, None
+            if gmv in source.variables:
+                gm_var = source.variables[gmv]
+                ncatts = {att: gm_var.getncattr(att) for att in gm_var.ncattrs()}
+            else:
+                gmv = 'crs'
+        spec = dict(
+            projection=pyproj.Proj(geometry.crs),
+            grid_mapping_variable=gmv,
+            grid_mapping_ncattrs=ncatts,
+            xy=dict(x=geometry.x, y=geometry.y),
+        )
+        if not isinstance(source, GridGeometry) and source.xy_coordinate_names is not None:
+            i0, i1, j0, j1 = ij_range
+            x_var, y_var = [source.variables[name] for name in source.xy_coordinate_names]
+            spec['xy'] = dict(x=x_var[j0:j1], y=y_var[i0:i1],
+                dtype=np.result_type(x_var.dtype, y_var.dtype),
+                atts={name: {att: var.getncattr(att) for att in var.ncattrs()}
+                    for name, var in [('x', x_var), ('y', y_var)]})
+        if lonlat is not None:
+            if isinstance(source, GridGeometry):
+                x, y = geometry.get_xy_arrays()
+                lon, lat = spec['projection'](x, y, inverse=True)
+            else:
+                lon, lat = source.get_lonlat_arrays(ij_range=ij_range)
+                if lon.ndim == 1:
+                    lon, lat = np.meshgrid(lon, lat)
+            spec['lonlat'] = dict(lon=lon, lat=lat, dtype=lonlat)
+        return spec
+
+    def set_grid_from(self, source, lonlat=None, ij_range=(None, None, None, None)):
+        """
+        Set dimensions, coordinates and projection variable from the grid of a source
+        (see GeoDatasetWrite.get_grid_spec)
+
+        Parameters:
+        -----------
+        source : GeoDatasetRead or GridGeometry
+            source of the grid
+        lonlat : str
+            None to omit 2D longitude and latitude or netcdf data type to store them with
+        ij_range : tuple with 4 ints
+            start/stop along i and j (y and x) axis of a subset of the grid
+        """
+        self.set_from_spec(self.get_grid_spec(source, lonlat=lonlat, ij_range=ij_range))
+
+    def set_from_spec(self, spec):
+        """
+        Create all dimensions and variables from a spec and then write data.
+        See GeoDatasetWrite.define_from_spec for the format of spec.
+
+        Parameters:
+        -----------
+        spec : dict
+            description of the file
+        """
+        self.write_from_spec(self.define_from_spec(spec))
 
     def get_grid_mapping_ncattrs(self):
         '''
@@ -251,6 +762,13 @@ class GeoDatasetWrite(GeoDatasetBase):
 
 class GeoDatasetRead(GeoDatasetBase):
     """ Wrapper for netCDF4.Dataset for common input tasks """
+    xy_accuracy = 1e3
+    # longitude and latitude are variables of the file with names lonlat_names
+    # (False for classes which compute them in get_lonlat_arrays)
+    lonlat_in_file = True
+    # read uncompressed contiguous variables through memory maps
+    # (see GeoDatasetRead.get_memmap_variable, returned arrays are writable copies)
+    use_memmap = False
 
     @cached_property
     def lonlat_names(self):
@@ -303,7 +821,7 @@ class GeoDatasetRead(GeoDatasetBase):
         projection : pyproj.Proj
 
         """
-        return pyproj.Proj(self.grid_mapping[0])
+        return instrumentation.instrument_projection(self, pyproj.Proj(self.grid_mapping[0]))
 
     @cached_property
     def grid_mapping_variable(self):
@@ -403,12 +921,131 @@ class GeoDatasetRead(GeoDatasetBase):
             data from variable from time_index
 
         """
-        if 'time' in self[var_name].dimensions:
-            return self[var_name][
-                time_index, ij_range[0]:ij_range[1], ij_range[2]:ij_range[3]]
-        else:
-            return self[var_name][
-                ij_range[0]:ij_range[1], ij_range[2]:ij_range[3]]
+        nc_var = var = self[var_name]
+        if self.use_memmap:
+            var = self.get_memmap_variable(var_name) or var
+        key = (slice(ij_range[0], ij_range[1]), slice(ij_range[2], ij_range[3]))
+        if 'time' in var.dimensions:
+            key = (time_index,) + key
+        if not instrumentation.ENABLED:
+            return var[key]
+        t0 = time.perf_counter()
+        array = var[key]
+        instrumentation.add_read(self, var_name, np.ma.getdata(array).nbytes,
+            instrumentation.count_chunks(nc_var.shape, nc_var.chunking(), key),
+            time.perf_counter() - t0)
+        return array
+
+    def close(self):
+        """ Close the file and remove its entries from the shared caches """
+        for name in ['bbox_cache', 'memmap_variables']:
+            if name in self.__dict__:
+                self.__dict__[name].clear()
+        super().close()
+
+    @cached_property
+    def memmap_variables(self):
+        """ Variables mapped into memory by GeoDatasetRead.get_memmap_variable
+        (entries of this dataset in the shared cache 'memmap_variables')
+
+        Returns
+        -------
+        memmap_variables : geodataset.cache.CacheView
+            keys are variable names, values are MemoryMappedVariable or None
+        """
+        return CacheView(_memmap_cache)
+
+    def get_memmap_variable(self, var_name):
+        """ Get variable mapped into memory if it is stored uncompressed and contiguous
+        (e.g. in netCDF3 classic files). Slices are read from the page cache without the
+        netCDF library and returned as writable copies.
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+
+        Returns
+        -------
+        var : geodataset.memmap.MemoryMappedVariable or None
+            None if the variable cannot be mapped
+        """
+        # False as default, because None is cached for variables which cannot be mapped
+        var = self.memmap_variables.get(var_name, False)
+        if var is False:
+            var = self.memmap_variables[var_name] = get_memmap_variable(self, var_name)
+        return var
+
+    def get_variable_array_tiled(
+        self, var_name, time_index=0, ij_range=(None, None, None, None), **kwargs):
+        """ Get array with values from a given variable, read in parallel by tiles.
+        Same as GeoDatasetRead.get_variable_array but decompression runs in several worker
+        processes, each with its own file handle.
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        time_index: int
+            from which time layer to read data
+        ij_range : tuple with 4 ints
+            start/stop along i and j (y and x) axis
+        kwargs : dict
+            for geodataset.parallel.read_variable_tiled
+            (tile_shape, executor, max_workers)
+
+        Returns
+        -------
+        array : 2D numpy.ma.MaskedArray
+            data from variable from time_index
+
+        """
+        return read_variable_tiled(type(self), self.filepath(), var_name,
+            time_index=time_index, ij_range=ij_range, **kwargs)
+
+    def iter_time_steps(self, var_names, time_indices=None,
+            ij_range=(None, None, None, None), prefetch=1, lock=True):
+        """ Iterate over time steps of variables. The next time steps are read in a
+        background thread while the caller processes the current one.
+
+        Netcdf/HDF5 are not thread-safe: while iterating with prefetch > 0, netCDF calls in
+        the calling thread (including other methods of this dataset) should be made with
+        geodataset.utils.NETCDF_LOCK held.
+
+        Parameters
+        ----------
+        var_names : str or list(str)
+            names of variables
+        time_indices : iterable(int)
+            indices of time steps (all time steps by default)
+        ij_range : tuple with 4 ints
+            start/stop along i and j (y and x) axis
+        prefetch : int
+            number of time steps read ahead (memory for prefetch + 1 time steps is used
+            in addition to the yielded one). If 0, time steps are read when needed.
+        lock : bool
+            hold geodataset.utils.NETCDF_LOCK while reading. Set to False only if netCDF
+            and HDF5 are built thread-safe.
+
+        Yields
+        ------
+        time_index : int
+            index of time step
+        arrays : dict
+            keys are variable names, values are 2D arrays
+            (see GeoDatasetRead.get_variable_array)
+        """
+        if isinstance(var_names, str):
+            var_names = [var_names]
+        if time_indices is None:
+            time_indices = range(len(self.datetimes))
+        lock = NETCDF_LOCK if lock and prefetch > 0 else nullcontext()
+        def read(time_index):
+            with lock:
+                return {var_name: self.get_variable_array(
+                    var_name, time_index=time_index, ij_range=ij_range)
+                    for var_name in var_names}
+        yield from iter_prefetched(read, time_indices, prefetch)
 
     def get_lonlat_arrays(self, ij_range=(None, None, None, None), **kwargs):
         """ Get array with longitude latidtude arrays 
@@ -433,9 +1070,169 @@ class GeoDatasetRead(GeoDatasetBase):
         i0, i1, j0, j1 = ij_range
         slat = slice(i0, i1)
         slon = slice(j0, j1)
-        if lon.ndim == 2:
-            return [a[slat, slon] for a in (lon, lat)]
-        return np.meshgrid(lon[slon], lat[slat])
+        with instrumentation.timed(self, 'get_lonlat_arrays'):
+            if lon.ndim == 2:
+                return [a[slat, slon] for a in (lon, lat)]
+            return np.meshgrid(lon[slon], lat[slat])
+
+    @cached_property
+    def xy_coordinate_names(self):
+        """ Get names of projected coordinate variables along the spatial dimensions
+        (with standard_name projection_x_coordinate and projection_y_coordinate
+        and units of length, see geodataset.utils.get_length_factor)
+
+        Returns
+        -------
+        xy_names : tuple(str) or None
+            names of x and y variables, None if the file has no such variables
+        """
+        if self.is_lonlat_dim:
+            return None
+        try:
+            y_dim, x_dim = self.get_spatial_dims()
+        except ValueError:
+            return None
+        names = {}
+        for var_name, var in self.variables.items():
+            if var.ndim != 1 or 'standard_name' not in var.ncattrs():
+                continue
+            if get_length_factor(getattr(var, 'units', 'm')) is None:
+                continue
+            for axis, dim in [('x', x_dim), ('y', y_dim)]:
+                if (var.standard_name == 'projection_%s_coordinate' % axis
+                        and var.dimensions == (dim,)):
+                    names[axis] = var_name
+        if len(names) < 2:
+            return None
+        return names['x'], names['y']
+
+    @cached_property
+    def grid_geometry(self):
+        """ Geometry of the dataset grid in the dataset projection.
+        Taken from the projected coordinate variables if they are in the file
+        (see xy_coordinate_names). Otherwise computed from the first row and the first
+        column of longitude and latitude and rounded to self.xy_accuracy
+        (see get_xy_dims_from_lonlat).
+
+        Returns
+        -------
+        geometry : GridGeometry
+        """
+        if self.xy_coordinate_names is not None:
+            x, y = [self.variables[name] for name in self.xy_coordinate_names]
+            x, y = [np.ma.getdata(v[:]) * get_length_factor(getattr(v, 'units', 'm'))
+                for v in [x, y]]
+            return GridGeometry(self.projection.crs, x, y)
+        row_lon, row_lat = self.get_lonlat_arrays(ij_range=(None, 1, None, None))
+        col_lon, col_lat = self.get_lonlat_arrays(ij_range=(None, None, None, 1))
+        if self.is_lonlat_dim:
+            x, y = np.ravel(row_lon), np.ravel(col_lat)
+            return GridGeometry(self.projection.crs, x, y)
+        x = self.projection(np.ravel(row_lon), np.ravel(row_lat))[0]
+        y = self.projection(np.ravel(col_lon), np.ravel(col_lat))[1]
+        x, y = [np.round(v/self.xy_accuracy)*self.xy_accuracy for v in [x, y]]
+        return GridGeometry(self.projection.crs, x, y, tolerance=self.xy_accuracy)
+
+    def get_grid_geometry(self, ij_range=(None, None, None, None), **kwargs):
+        """ Get geometry of the dataset grid or of its subset
+
+        Parameters
+        ----------
+        ij_range : tuple with 4 ints
+            start/stop along i and j (y and x) axis
+        kwargs : dict
+            dummy
+
+        Returns
+        -------
+        geometry : GridGeometry
+        """
+        return self.grid_geometry.subset(ij_range)
+
+    def is_grid_mapping(self, mapping):
+        """ Check if mapping is the (projected) CRS of the dataset grid and the file has
+        projected coordinate variables, so that exact grid coordinates can be taken from
+        GeoDatasetRead.grid_geometry
+
+        Parameters
+        ----------
+        mapping : pyproj.Proj
+
+        Returns
+        -------
+        is_grid_mapping : bool
+        """
+        return ((not self.is_lonlat_dim) and mapping.crs == self.projection.crs
+            and self.xy_coordinate_names is not None)
+
+    def to_xarray(self, chunks='auto'):
+        """ Get lazily evaluated dask-backed view of the dataset.
+        No data is read until the returned dataset is computed.
+
+        Parameters
+        ----------
+        chunks : int, str, tuple, dict or None
+            chunks for xarray.open_dataset (dask is required).
+            Chunks along the spatial dimensions are also used for longitude and latitude.
+            If None, variables are not chunked (lazily loaded by xarray) and longitude and
+            latitude computed by the class are one dask chunk.
+
+        Returns
+        -------
+        ds : xarray.Dataset
+            CF-decoded dataset with longitude and latitude coordinates
+            (variables of the file if lonlat_in_file is True, otherwise computed with
+            GeoDatasetRead.get_lonlat_arrays) and with a CRS variable
+            (from GeoDatasetRead.grid_mapping), referenced by the variables on the grid
+        """
+        import dask.array as da
+        ds = xr.open_dataset(self.filepath(), engine='netcdf4', chunks=chunks)
+        if self.lonlat_in_file and all(name in ds.variables for name in self.lonlat_names):
+            ds = ds.set_coords(list(self.lonlat_names))
+        else:
+            dims = self.get_spatial_dims()
+            shape = tuple(self.dimensions[d].size for d in dims)
+            if chunks is None:
+                chunks = -1
+            elif isinstance(chunks, dict):
+                chunks = tuple(chunks.get(d, -1) for d in dims)
+            spatial_chunks = da.core.normalize_chunks(chunks, shape, dtype=np.float64)
+            lonlat = da.map_blocks(_get_lonlat_block, type(self), self.filepath(),
+                chunks=((2,),) + spatial_chunks, dtype=np.float64)
+            for i, name in enumerate(['longitude', 'latitude']):
+                if name in ds.variables:
+                    ds = ds.drop_vars(name)
+                ds = ds.assign_coords({name: (dims, lonlat[i], dict(
+                    standard_name=name,
+                    units='degrees_%s' % ['east', 'north'][i]))})
+        crs_name = self.grid_mapping_variable
+        if crs_name == 'absent':
+            crs_name = 'crs'
+        ds = ds.assign_coords({crs_name: ((), np.int8(0), self.projection.crs.to_cf())})
+        spatial_dims = tuple(self.get_spatial_dims())
+        for var_name in ds.data_vars:
+            if ds[var_name].dims[-2:] == spatial_dims:
+                ds[var_name].attrs['grid_mapping'] = crs_name
+        return ds
+
+    def get_spatial_dims(self):
+        """ Get names of spatial dimensions
+
+        Returns
+        -------
+        dims : tuple(str)
+            names of (y, x) dimensions
+        """
+        if self.lonlat_names[0] in self.variables:
+            lon_dims = self.variables[self.lonlat_names[0]].dimensions
+            if len(lon_dims) == 2:
+                return lon_dims
+        if 'y' in self.dimensions and 'x' in self.dimensions:
+            return 'y', 'x'
+        for var_name in self.variable_names:
+            if self.variables[var_name].ndim >= 2:
+                return self.variables[var_name].dimensions[-2:]
+        raise ValueError('Can not find spatial dimensions in %s' % self.filename)
 
     def get_area_euclidean(self, mapping, **kwargs):
         """
@@ -453,6 +1250,10 @@ class GeoDatasetRead(GeoDatasetBase):
         -------
         area : float
         """
+        if self.is_grid_mapping(mapping):
+            geometry = self.get_grid_geometry(**kwargs)
+            if geometry.is_regular:
+                return geometry.area
         lon, lat = self.get_lonlat_arrays(**kwargs)
         x, y = mapping(lon, lat)
         dy, dx = [np.max([
@@ -461,11 +1262,60 @@ class GeoDatasetRead(GeoDatasetBase):
             ]) for z in [y, x]]
         return np.abs(dx * dy)
 
-    def get_bbox(self, mapping, **kwargs):
-        """ Get bounding box (extent)
+    @cached_property
+    def bbox_cache(self):
+        """ Memoized results of GeoDatasetRead.get_bbox
+        (entries of this dataset in the shared cache 'bboxes')
+
+        Returns
+        -------
+        bbox_cache : geodataset.cache.CacheView
+            keys are (mapping srs, ij_range, perimeter, densify), values are bboxes
+        """
+        return CacheView(_bbox_cache)
+
+    def get_lonlat_perimeter(self, ij_range=(None, None, None, None), densify=0, **kwargs):
+        """ Get longitude and latitude of the boundary pixels only
+
+        Parameters
+        ----------
+        ij_range : tuple with 4 ints
+            start/stop along i and j (y and x) axis
+        densify : int
+            number of points to insert between neighbouring boundary pixels
+        kwargs : dict
+            for GeoDatasetRead.get_lonlat_arrays
+
+        Returns
+        -------
+        lon : numpy.ndarray
+            1D array with longitude of the first row, last row, first column and last column
+        lat : numpy.ndarray
+            1D array with latitude of the first row, last row, first column and last column
+        """
+        lons, lats = [], []
+        for edge_ij_range in get_edge_ij_ranges(ij_range):
+            lon, lat = [np.ravel(a) for a in self.get_lonlat_arrays(
+                ij_range=edge_ij_range, **kwargs)]
+            if densify:
+                lon, lat = densify_lonlat(lon, lat, densify)
+            lons.append(lon)
+            lats.append(lat)
+        return np.concatenate(lons), np.concatenate(lats)
+
+    def get_bbox(self, mapping, perimeter=False, densify=0, **kwargs):
+        """ Get bounding box (extent) of valid (not masked) longitudes and latitudes
+        Results are memoized for each mapping and ij_range.
+
         Parameters
         ----------
         mapping: pyproj mapping
+        perimeter : bool
+            use only the boundary pixels. Faster and exact if the grid is convex in
+            the projection given by mapping (e.g. does not contain the pole)
+        densify : int
+            number of points to insert between neighbouring boundary pixels
+            for curved boundaries (if perimeter is True)
         kwargs : dict
             for GeoDatasetRead.get_lonlat_arrays
 
@@ -474,11 +1324,27 @@ class GeoDatasetRead(GeoDatasetBase):
         bbox : list(float)
             [xmin, xmax, ymin, ymax], where x,y are coordinates specified by mapping
         """
-        lon, lat = self.get_lonlat_arrays(**kwargs)
-        x, y = mapping(lon, lat)
-        return [x.min(), x.max(), y.min(), y.max()]
-
-    def get_xy_dims_from_lonlat(self, lon, lat, accuracy=1e3):
+        ij_range = tuple(kwargs.get('ij_range', (None, None, None, None)))
+        key = (mapping.srs, ij_range, perimeter, densify)
+        bbox = self.bbox_cache.get(key)
+        if bbox is not None:
+            return list(bbox)
+        if self.is_grid_mapping(mapping):
+            geometry = self.get_grid_geometry(**kwargs)
+            if geometry.is_regular:
+                bbox = geometry.bbox
+        if bbox is None:
+            if perimeter:
+                lon, lat = self.get_lonlat_perimeter(densify=densify, **kwargs)
+            else:
+                lon, lat = self.get_lonlat_arrays(**kwargs)
+            valid = ~(np.ma.getmaskarray(lon) | np.ma.getmaskarray(lat))
+            x, y = mapping(np.ma.getdata(lon)[valid], np.ma.getdata(lat)[valid])
+            bbox = [x.min(), x.max(), y.min(), y.max()]
+        self.bbox_cache[key] = bbox
+        return list(bbox)
+
+    def get_xy_dims_from_lonlat(self, lon=None, lat=None, accuracy=1e3):
         """
         Get the x,y vectors for the dimensions if they are not provided in the netcdf file
         Assumes a regular grid in the input projection
@@ -486,7 +1352,8 @@ class GeoDatasetRead(GeoDatasetBase):
         Parameters:
         -----------
         lon : np.ndarray
-            2d longitude array, units = degrees_east
+            2d longitude array, units = degrees_east.
+            If None, x,y vectors are taken from GeoDatasetRead.grid_geometry
         lat : np.ndarray
             2d latitude array, units = degrees_north
         accuracy : float
@@ -501,8 +1368,11 @@ class GeoDatasetRead(GeoDatasetBase):
             y coordinate vector, units = m
         """
         assert(not self.is_lonlat_dim)
-        x = self.projection(lon[0,:], lat[0,:])[0]
-        y = self.projection(lon[:,0], lat[:,0])[1]
+        if lon is None:
+            x, y = self.grid_geometry.x, self.grid_geometry.y
+        else:
+            x = self.projection(lon[0,:], lat[0,:])[0]
+            y = self.projection(lon[:,0], lat[:,0])[1]
         return [np.round(v/accuracy)*accuracy for v in [x, y]]
 
     def get_proj_info_kwargs(self):
@@ -526,7 +1396,8 @@ class GeoDatasetRead(GeoDatasetBase):
         )
         return kwargs
 
-    def interp_to_points(self, var_name, lon, lat, distance=5, fill_value=np.nan, **kwargs):
+    def interp_to_points(self, var_name, lon, lat, distance=5, fill_value=np.nan,
+            block_size=None, order=None, **kwargs):
         """ Interpolate netCDF data onto mesh from NextsimBin object
         
         Parameters
@@ -541,50 +1412,193 @@ class GeoDatasetRead(GeoDatasetBase):
             perform interpolation on elements or nodes?
         fill_value : float
             value for filling out of bound regions
+        block_size : int
+            number of points projected and interpolated at once (all points if None).
+            Temporary arrays are limited to the block size, so that memory used for
+            huge point sets (besides input and output) does not depend on their number.
+        order : str
+            order points of each block along a space-filling curve over the grid
+            ('morton' or 'hilbert') for locality of memory access. Results are returned
+            in the original order.
         ij_range : list(int) or tuple(int)
             for subsetting in space
              eg [i0,i1,j0,j1] grabs lon[i0:i1,j0:j1], lat[i0:i1,j0:j1]
         kwargs : dict
             for GeoDatasetRead.get_variable_array and
-            GeoDatasetRead.get_lonlat_arrays
+            GeoDatasetRead.get_grid_geometry
         
         Returns
         -------
         v_pro : 1D nupy.array
             values from netCDF interpolated on nextsim mesh
         """
-        # get self coordinates
-        nc_lon, nc_lat = self.get_lonlat_arrays(**kwargs)
+        # transform to common coordinate system if needed
+        project = None if self.is_lonlat_dim else self.projection
+        return self._interp_blocks(var_name, lon, lat, project, distance, fill_value,
+            block_size, order, **kwargs)
+
+    def interp_to_xy(self, var_name, x, y, crs=None, distance=5, fill_value=np.nan,
+            block_size=None, order=None, **kwargs):
+        """ Interpolate netCDF data to points with projected coordinates.
+        Coordinates in another CRS are transformed to the dataset CRS in one step
+        (without intermediate longitudes and latitudes), or not at all if the CRSs are equal.
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        x : numpy.ndarray
+            x coordinates of points
+        y : numpy.ndarray
+            y coordinates of points
+        crs : pyproj.CRS, pyproj.Proj, str or int
+            CRS of the coordinates (None for the CRS of the dataset)
+        distance : int
+            extrapolation distance (in pixels) to avoid land contamintation
+        fill_value : float
+            value for filling out of bound regions
+        block_size : int
+            number of points transformed and interpolated at once
+            (see GeoDatasetRead.interp_to_points)
+        order : str
+            order points of each block along a space-filling curve ('morton' or 'hilbert')
+        kwargs : dict
+            for GeoDatasetRead.get_variable_array and
+            GeoDatasetRead.get_grid_geometry
+
+        Returns
+        -------
+        v_pro : 1D nupy.array
+            values interpolated to points
+        """
+        project = transformer = None
+        if crs is not None:
+            transformer = get_transformer(crs, self.get_grid_geometry(**kwargs).crs)
+        if transformer is not None:
+            def project(x, y):
+                with instrumentation.timed(self, 'transform', np.size(x)):
+                    return transformer.transform(x, y)
+        return self._interp_blocks(var_name, x, y, project, distance, fill_value,
+            block_size, order, **kwargs)
+
+    def _interp_blocks(self, var_name, x, y, project, distance, fill_value, block_size,
+            order, **kwargs):
+        """ Interpolate netCDF data to points block by block
+        (see GeoDatasetRead.interp_to_points)
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        x : numpy.ndarray
+            x coordinates (or longitudes) of points
+        y : numpy.ndarray
+            y coordinates (or latitudes) of points
+        project : function or None
+            function transforming x, y to coordinates in the dataset CRS
+        distance : int
+            extrapolation distance (in pixels) to avoid land contamintation
+        fill_value : float
+            value for filling out of bound regions
+        block_size : int or None
+            number of points processed at once
+        order : str or None
+            space-filling curve for ordering points in each block
+        kwargs : dict
+            for GeoDatasetRead.get_variable_array and
+            GeoDatasetRead.get_grid_geometry
+
+        Returns
+        -------
+        v_pro : numpy.ndarray
+            values interpolated to points
+        """
+        geometry = self.get_grid_geometry(**kwargs)
         # get variable
         nc_v = self.get_variable_array(var_name, **kwargs
                 ).astype(float).filled(np.nan)
         if len(nc_v.shape) != 2:
             raise ValueError('Can interpolate only 2D data from netCDF file')
 
-        # transform to common coordinate system if needed
-        if not self.is_lonlat_dim: 
-            nc_x, nc_y = self.get_xy_dims_from_lonlat(nc_lon, nc_lat)
+        # fill nan gaps to avoid land contamination
+        with instrumentation.timed(self, 'fill_nan_gaps', nc_v.size):
+            nc_v = fill_nan_gaps(nc_v, distance)
+        return interp_field(geometry, nc_v, x, y, project=project, fill_value=fill_value,
+            block_size=block_size, order=order, ds=self)
+
+    def interp_to_samples(self, var_name, lon, lat, times, distance=5, fill_value=np.nan,
+            **kwargs):
+        """ Interpolate netCDF data to scattered samples, each with its own time
+        (e.g. buoy positions), bilinearly in space and linearly in time.
+        Samples are grouped by the pair of time steps bracketing them, so that each time
+        step is read only once and at most two time steps are kept in memory.
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable with time dimension
+        lon : numpy.ndarray
+            longitudes of samples
+        lat : numpy.ndarray
+            latitudes of samples
+        times : list or numpy.ndarray
+            times of samples (datetime.datetime or numpy.datetime64)
+        distance : int
+            extrapolation distance (in pixels) to avoid land contamintation
+        fill_value : float
+            value for samples outside the grid or outside the time range of the dataset
+        kwargs : dict
+            for GeoDatasetRead.get_variable_array and
+            GeoDatasetRead.get_grid_geometry (e.g. ij_range)
+
+        Returns
+        -------
+        values : 1D numpy.ndarray
+            interpolated values in the order of samples
+        """
+        lon, lat = np.ravel(lon), np.ravel(lat)
+        geometry = self.get_grid_geometry(**kwargs)
+        if not self.is_lonlat_dim:
             xout, yout = self.projection(lon, lat)
         else:
-            nc_x, nc_y = nc_lon[0], nc_lat[:,0]
             xout, yout = lon, lat
-        
-        # fill nan gaps to avoid land contamination
-        nc_v = fill_nan_gaps(nc_v, distance)
-        # swap Y axis if needed
-        y_step = int(np.sign(np.mean(np.diff(nc_y))))
-        # make interpolator
-        rgi = RegularGridInterpolator((nc_y[::y_step], nc_x), nc_v[::y_step])
-        # interpolate only values within self bbox
-        gpi = ((xout > nc_x.min()) * 
-            (xout < nc_x.max()) *
-            (yout > nc_y.min()) *
-            (yout < nc_y.max()))
-        v_pro = np.full_like(xout, fill_value, dtype=float)
-        v_pro[gpi] = rgi((yout[gpi], xout[gpi]))
-        # replace remaining NaN's (inside the domain, but not filled by fill_nan_gaps)
-        v_pro[np.isnan(v_pro)] = fill_value
-        return v_pro
+        t_grid = get_time_offsets(self.datetimes, self.datetimes[0])
+        t_out = get_time_offsets(times, self.datetimes[0])
+        if t_out.size != lon.size:
+            raise ValueError('Number of times (%d) differs from number of points (%d)'
+                % (t_out.size, lon.size))
+        values = np.full(lon.size, fill_value, dtype=float)
+        gpi = (t_out >= t_grid[0]) * (t_out <= t_grid[-1])
+        # index of the first bracketing time step and weight of the second one
+        i0 = np.clip(np.searchsorted(t_grid, t_out, side='right') - 1, 0, max(t_grid.size - 2, 0))
+        i1 = np.minimum(i0 + 1, t_grid.size - 1)
+        dt_grid = t_grid[i1] - t_grid[i0]
+        wt = np.zeros(lon.size)
+        np.divide(t_out - t_grid[i0], dt_grid, out=wt, where=dt_grid > 0)
+        slabs = {}
+        def get_slab(time_index):
+            if time_index not in slabs:
+                slab = self.get_variable_array(var_name, time_index=int(time_index), **kwargs)
+                with instrumentation.timed(self, 'fill_nan_gaps', slab.size):
+                    slabs[time_index] = fill_nan_gaps(slab.astype(float).filled(np.nan), distance)
+            return slabs[time_index]
+        for time_index in np.unique(i0[gpi]):
+            group = np.flatnonzero(gpi * (i0 == time_index))
+            # keep only the slab shared with the next group
+            for k in list(slabs):
+                if k < time_index:
+                    del slabs[k]
+            with instrumentation.timed(self, 'interpolator_build', group.size):
+                weights = BilinearWeights(geometry, xout[group], yout[group])
+            with instrumentation.timed(self, 'interpolation', group.size):
+                v = np.zeros(group.size)
+                for k, w in [(time_index, 1 - wt[group]), (time_index + 1, wt[group])]:
+                    use = w > 0
+                    if use.any():
+                        v[use] += weights(get_slab(k))[use] * w[use]
+            values[group] = v
+        values[np.isnan(values)] = fill_value
+        return values
 
     def get_var_for_nextsim(self, var_name, nbo, on_elements=True, **kwargs):
         """ Interpolate netCDF data onto mesh from NextsimBin object
@@ -606,7 +1620,7 @@ class GeoDatasetRead(GeoDatasetBase):
              eg [i0,i1,j0,j1] grabs lon[i0:i1,j0:j1], lat[i0:i1,j0:j1]
         kwargs : dict
             for GeoDatasetRead.get_variable_array and
-            GeoDatasetRead.get_lonlat_arrays
+            GeoDatasetRead.get_grid_geometry
         
         Returns
         -------
@@ -621,6 +1635,30 @@ class GeoDatasetRead(GeoDatasetBase):
             t = nbo.mesh_info.indices
             nb_x, nb_y = [i[t].mean(axis=1) for i in [nb_x, nb_y]]
         
-        # transform nextsim coordinates to lon/lat
-        nb_x, nb_y = nbo.mesh_info.projection.pyproj(nb_x, nb_y, inverse=True)
-        return self.interp_to_points(var_name, nb_x, nb_y, **kwargs)
+        # transform nextsim coordinates directly to the dataset CRS
+        return self.interp_to_xy(var_name, nb_x, nb_y, crs=nbo.mesh_info.projection.pyproj,
+            **kwargs)
+
+
+def _get_lonlat_block(cls, filename, block_info=None):
+    """ Read a block of longitude and latitude for GeoDatasetRead.to_xarray
+
+    Parameters
+    ----------
+    cls : type
+        GeoDatasetRead or child class to open the file with
+    filename : str
+        name of input file
+    block_info : dict
+        provided by dask.array.map_blocks
+
+    Returns
+    -------
+    lonlat : numpy.ndarray
+        3D array with stacked longitude and latitude
+    """
+    (_, (i0, i1), (j0, j1)) = block_info[None]['array-location']
+    with NETCDF_LOCK:
+        with cls(filename) as ds:
+            lon, lat = ds.get_lonlat_arrays(ij_range=(i0, i1, j0, j1))
+    return np.stack([np.ma.filled(lon, np.nan), np.ma.filled(lat, np.nan)])
@@ -0,0 +1,137 @@
+from functools import cached_property
+import hashlib
+
+import numpy as np
+import pyproj
+
+
+class GridGeometry:
+    """ Geometry of a grid given by x and y coordinate vectors in a given projection
+
+    Attributes:
+    -----------
+    crs : pyproj.CRS
+        coordinate reference system of x and y
+    x : numpy.ndarray
+        vector of x coordinates of pixel centers
+    y : numpy.ndarray
+        vector of y coordinates of pixel centers
+    x0, dx, nx : float, float, int
+        first x coordinate, mean x spacing and number of columns
+    y0, dy, ny : float, float, int
+        first y coordinate, mean y spacing and number of rows
+    x_step, y_step : int
+        orientation of the grid axes (1 if coordinate increases with index, -1 otherwise)
+    is_regular : bool
+        True if spacing along both axes is constant within tolerance
+    fingerprint : str
+        stable hash of the geometry, can be used as a key for caching
+    """
+
+    def __init__(self, crs, x, y, tolerance=None):
+        """
+        Parameters:
+        -----------
+        crs : pyproj.CRS
+            coordinate reference system of x and y
+        x : numpy.ndarray
+            vector of x coordinates of pixel centers
+        y : numpy.ndarray
+            vector of y coordinates of pixel centers
+        tolerance : float
+            maximum deviation of spacing from its mean for a regular grid.
+            By default it is 1% of the spacing.
+        """
+        self.crs = pyproj.CRS(crs)
+        self.x = np.array(np.ma.getdata(x), dtype=float)
+        self.y = np.array(np.ma.getdata(y), dtype=float)
+        self.tolerance = tolerance
+        self.x0, self.dx, self.nx = self._get_axis_parameters(self.x)
+        self.y0, self.dy, self.ny = self._get_axis_parameters(self.y)
+        self.x_step = -1 if self.dx < 0 else 1
+        self.y_step = -1 if self.dy < 0 else 1
+        self.is_regular = self._is_axis_regular(self.x, self.dx) and self._is_axis_regular(self.y, self.dy)
+
+    def __eq__(self, other):
+        return isinstance(other, GridGeometry) and self.fingerprint == other.fingerprint
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+    def __repr__(self):
+        return ('GridGeometry(x0=%s, dx=%s, nx=%s, y0=%s, dy=%s, ny=%s, is_regular=%s)'
+            % (self.x0, self.dx, self.nx, self.y0, self.dy, self.ny, self.is_regular))
+
+    @staticmethod
+    def _get_axis_parameters(v):
+        """ Get first value, mean step and size of a coordinate vector """
+        if v.size < 2:
+            return v[0] if v.size else np.nan, 0., v.size
+        return v[0], (v[-1] - v[0]) / (v.size - 1), v.size
+
+    def _is_axis_regular(self, v, dv):
+        """ Check if steps of a coordinate vector are constant within tolerance """
+        if v.size < 3:
+            return True
+        tolerance = self.tolerance
+        if tolerance is None:
+            tolerance = 1e-2 * np.abs(dv)
+        return bool(np.all(np.abs(np.diff(v) - dv) <= tolerance))
+
+    @property
+    def shape(self):
+        """ Shape of the grid (ny, nx) """
+        return self.ny, self.nx
+
+    @property
+    def area(self):
+        """ Area of a grid cell (units of crs squared) """
+        return np.abs(self.dx * self.dy)
+
+    @property
+    def bbox(self):
+        """ Extent of pixel centers [xmin, xmax, ymin, ymax] in the grid crs """
+        return [self.x.min(), self.x.max(), self.y.min(), self.y.max()]
+
+    @cached_property
+    def fingerprint(self):
+        """ Stable hash of the CRS and coordinate vectors
+
+        Returns
+        -------
+        fingerprint : str
+        """
+        h = hashlib.sha1(self.crs.to_wkt().encode())
+        for v in [self.x, self.y]:
+            h.update(np.int64(v.size).tobytes())
+            h.update(v.tobytes())
+        return h.hexdigest()
+
+    def subset(self, ij_range=(None, None, None, None)):
+        """ Get geometry of a subset of the grid
+
+        Parameters
+        ----------
+        ij_range : tuple with 4 ints
+            start/stop along i and j (y and x) axis
+
+        Returns
+        -------
+        geometry : GridGeometry
+        """
+        i0, i1, j0, j1 = ij_range
+        if (i0, i1, j0, j1) == (None, None, None, None):
+            return self
+        return GridGeometry(self.crs, self.x[j0:j1], self.y[i0:i1], self.tolerance)
+
+    def get_xy_arrays(self):
+        """ Get 2D arrays with x and y coordinates of pixel centers
+
+        Returns
+        -------
+        x : numpy.ndarray
+            2D array with x coordinates
+        y : numpy.ndarray
+            2D array with y coordinates
+        """
+        return np.meshgrid(self.x, self.y)
@@ -0,0 +1,273 @@
+""" Opt-in counters and timers of file access, projections and interpolation
+
+Instrumentation is enabled by setting the environment variable GEODATASET_STATS
+(to anything but '' or '0') or by calling enable(). If GEODATASET_STATS_FILE is set,
+the global stats are dumped to this JSON file at exit.
+When disabled, instrumented code only checks the module flag ENABLED.
+
+Stats are collected per dataset (GeoDatasetBase.stats) and in a process-global aggregate
+(get_global_stats). Workers of a process pool collect their own aggregates.
+"""
+import atexit
+from collections import defaultdict
+from contextlib import nullcontext
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pyproj
+
+ENABLED = os.getenv('GEODATASET_STATS', '') not in ('', '0')
+
+_NULL_CONTEXT = nullcontext()
+
+
+class Stats:
+    """ Counters and timers of events and of reads per variable
+
+    Attributes:
+    -----------
+    events : dict
+        keys are event names (e.g. 'open', 'projection'), values are dicts with
+        count (number of calls), seconds (total time) and items (e.g. number of points)
+    variables : dict
+        keys are variable names, values are dicts with reads, bytes, chunks and seconds
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Set all counters to zero """
+        self.events = defaultdict(lambda: dict(count=0, seconds=0., items=0))
+        self.variables = defaultdict(lambda: dict(reads=0, bytes=0, chunks=0, seconds=0.))
+
+    def add_event(self, name, seconds=0., items=0, count=1):
+        """ Add one event
+
+        Parameters
+        ----------
+        name : str
+            name of event
+        seconds : float
+            duration
+        items : int
+            number of processed items (points, pixels, etc.)
+        count : int
+            number of calls
+        """
+        with self._lock:
+            event = self.events[name]
+            event['count'] += count
+            event['seconds'] += seconds
+            event['items'] += int(items)
+
+    def add_read(self, var_name, nbytes, chunks, seconds=0.):
+        """ Add one read of a variable
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        nbytes : int
+            size of returned data
+        chunks : int
+            number of netCDF chunks touched by the read
+        seconds : float
+            duration
+        """
+        with self._lock:
+            var = self.variables[var_name]
+            var['reads'] += 1
+            var['bytes'] += int(nbytes)
+            var['chunks'] += int(chunks)
+            var['seconds'] += seconds
+
+    def to_dict(self):
+        """ Get stats as a dict (e.g. for JSON) """
+        with self._lock:
+            return dict(
+                events={k: dict(v) for k, v in sorted(self.events.items())},
+                variables={k: dict(v) for k, v in sorted(self.variables.items())})
+
+    def to_json(self, **kwargs):
+        """ Get stats as a JSON string """
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def __repr__(self):
+        return 'Stats(%s)' % self.to_json()
+
+
+_GLOBAL_STATS = Stats()
+
+
+def enable(enabled=True):
+    """ Enable or disable instrumentation
+
+    Parameters
+    ----------
+    enabled : bool
+    """
+    global ENABLED
+    ENABLED = bool(enabled)
+
+
+def is_enabled():
+    """ Check if instrumentation is enabled """
+    return ENABLED
+
+
+def get_global_stats():
+    """ Get process-global aggregate of stats
+
+    Returns
+    -------
+    stats : Stats
+    """
+    return _GLOBAL_STATS
+
+
+def dump_json(filename=None, **kwargs):
+    """ Dump global stats to JSON
+
+    Parameters
+    ----------
+    filename : str
+        name of output file. If None, the JSON string is returned.
+    kwargs : dict
+        for json.dumps
+
+    Returns
+    -------
+    text : str or None
+    """
+    text = _GLOBAL_STATS.to_json(**kwargs)
+    if filename is None:
+        return text
+    with open(filename, 'w') as f:
+        f.write(text)
+
+
+def _get_stats_list(ds):
+    """ Get stats of a dataset (if not None) and global stats """
+    if ds is None:
+        return [_GLOBAL_STATS]
+    return [ds.stats, _GLOBAL_STATS]
+
+
+def add_event(ds, name, seconds=0., items=0, count=1):
+    """ Add event to stats of a dataset and to global stats (see Stats.add_event)
+
+    Parameters
+    ----------
+    ds : GeoDatasetBase or None
+        dataset (None to add to global stats only)
+    """
+    for stats in _get_stats_list(ds):
+        stats.add_event(name, seconds, items, count)
+
+
+def add_read(ds, var_name, nbytes, chunks, seconds=0.):
+    """ Add read of a variable to stats of a dataset and to global stats (see Stats.add_read) """
+    for stats in _get_stats_list(ds):
+        stats.add_read(var_name, nbytes, chunks, seconds)
+
+
+class _Timer:
+    """ Context manager adding an event with its duration """
+    def __init__(self, ds, name, items):
+        self.ds = ds
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        add_event(self.ds, self.name, time.perf_counter() - self.t0, self.items)
+
+
+def timed(ds, name, items=0):
+    """ Get context manager timing an event (a no-op context if instrumentation is disabled)
+
+    Parameters
+    ----------
+    ds : GeoDatasetBase or None
+        dataset (None to add to global stats only)
+    name : str
+        name of event
+    items : int
+        number of processed items
+
+    Returns
+    -------
+    context : contextmanager
+    """
+    if not ENABLED:
+        return _NULL_CONTEXT
+    return _Timer(ds, name, items)
+
+
+def count_chunks(shape, chunking, key):
+    """ Count netCDF chunks touched by reading var[key]
+
+    Parameters
+    ----------
+    shape : tuple(int)
+        shape of variable
+    chunking : list(int) or str or None
+        output of netCDF4.Variable.chunking ('contiguous' is counted as one chunk)
+    key : tuple
+        ints and slices with step 1
+
+    Returns
+    -------
+    chunks : int
+    """
+    if not isinstance(chunking, (list, tuple)):
+        return 1
+    key = tuple(key) + (slice(None),) * (len(shape) - len(key))
+    chunks = 1
+    for size, chunk, k in zip(shape, chunking, key):
+        if isinstance(k, slice):
+            start, stop, _ = k.indices(size)
+            if stop <= start:
+                return 0
+            chunks *= (stop - 1) // chunk - start // chunk + 1
+    return chunks
+
+
+class InstrumentedProj(pyproj.Proj):
+    """ pyproj.Proj counting calls and transformed points in stats of a dataset """
+    dataset = None
+
+    def __call__(self, longitude, latitude, *args, **kwargs):
+        with timed(self.dataset, 'projection', np.size(longitude)):
+            return super().__call__(longitude, latitude, *args, **kwargs)
+
+
+def instrument_projection(ds, projection):
+    """ Get projection counting calls in stats of a dataset if instrumentation is enabled
+
+    Parameters
+    ----------
+    ds : GeoDatasetBase
+        dataset
+    projection : pyproj.Proj
+
+    Returns
+    -------
+    projection : pyproj.Proj or InstrumentedProj
+    """
+    if not ENABLED:
+        return projection
+    projection = InstrumentedProj(projection.crs)
+    projection.dataset = ds
+    return projection
+
+
+if os.getenv('GEODATASET_STATS_FILE'):
+    atexit.register(lambda: dump_json(os.getenv('GEODATASET_STATS_FILE'), indent=1))
@@ -1,3 +1,9 @@
+import numpy as np
+
+from geodataset import instrumentation
+from geodataset.cache import get_cache
+from geodataset.utils import get_curve_index
+
 
 class Interpolator:
 
@@ -24,3 +30,203 @@ class MeshGridInterpolator(Interpolator):#(Bamg)
     pass
     def __call__(self):
         pass
+
+
+class BilinearWeights:
+    """ Bilinear interpolation from a grid to points with precomputed indices and weights.
+    Gives the same result as scipy.interpolate.RegularGridInterpolator (method='linear'),
+    but the weights can be reused for many fields on the same grid.
+    """
+
+    def __init__(self, geometry, x, y):
+        """
+        Parameters:
+        -----------
+        geometry : GridGeometry
+            geometry of the source grid
+        x : numpy.ndarray
+            x coordinates of points in geometry.crs
+        y : numpy.ndarray
+            y coordinates of points in geometry.crs
+        """
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        self.shape = x.shape
+        self.grid_shape = geometry.shape
+        self.valid = ((x > geometry.x.min()) * (x < geometry.x.max()) *
+            (y > geometry.y.min()) * (y < geometry.y.max()))
+        fi = self._get_fractional_index(geometry.y, y[self.valid])
+        fj = self._get_fractional_index(geometry.x, x[self.valid])
+        i0 = np.clip(np.floor(fi), 0, geometry.ny - 2).astype(np.int64)
+        j0 = np.clip(np.floor(fj), 0, geometry.nx - 2).astype(np.int64)
+        self.wy = fi - i0
+        self.wx = fj - j0
+        self.index = i0 * geometry.nx + j0
+
+    @staticmethod
+    def _get_fractional_index(v, vout):
+        """ Fractional index of vout in monotonic coordinate vector v """
+        index = np.arange(v.size, dtype=float)
+        if v[0] > v[-1]:
+            v, index = v[::-1], index[::-1]
+        return np.interp(vout, v, index)
+
+    @property
+    def nbytes(self):
+        """ Memory used by indices and weights """
+        return self.valid.nbytes + self.index.nbytes + self.wx.nbytes + self.wy.nbytes
+
+    def __call__(self, field, fill_value=np.nan):
+        """ Interpolate a field
+
+        Parameters:
+        -----------
+        field : numpy.ndarray
+            2D array on the source grid
+        fill_value : float
+            value for points outside the grid or with NaN neighbours
+
+        Returns:
+        --------
+        values : numpy.ndarray
+            interpolated values with the shape of points
+        """
+        if field.shape != self.grid_shape:
+            raise ValueError('Field shape %s does not match grid shape %s'
+                % (field.shape, self.grid_shape))
+        f = np.ravel(field)
+        nx = self.grid_shape[1]
+        k = self.index
+        values = np.full(self.shape, fill_value, dtype=float)
+        values[self.valid] = (
+            (f[k] * (1 - self.wx) + f[k + 1] * self.wx) * (1 - self.wy) +
+            (f[k + nx] * (1 - self.wx) + f[k + nx + 1] * self.wx) * self.wy)
+        values[np.isnan(values)] = fill_value
+        return values
+
+
+WEIGHTS_CACHE_SIZE = 8
+# weights computed in this process, see get_bilinear_weights
+_weights_cache = get_cache('interpolation_weights', max_entries=WEIGHTS_CACHE_SIZE)
+
+
+def get_bilinear_weights(geometry, get_xy, key=None):
+    """ Get bilinear weights from cache or compute them
+
+    Parameters:
+    -----------
+    geometry : GridGeometry
+        geometry of the source grid
+    get_xy : function
+        function returning x, y coordinates of points in geometry.crs
+        (called only if the weights are not cached)
+    key : str
+        identifier of the points (e.g. fingerprint of the target grid).
+        If None, the weights are not cached.
+
+    Returns:
+    --------
+    weights : BilinearWeights
+    """
+    if key is None:
+        return BilinearWeights(geometry, *get_xy())
+    cache_key = (geometry.fingerprint, key)
+    weights = _weights_cache.get(cache_key)
+    if weights is None:
+        weights = _weights_cache[cache_key] = BilinearWeights(geometry, *get_xy())
+    return weights
+
+
+def get_curve_order(x, y, bounds, shape, curve):
+    """ Get indices sorting points along a space-filling curve over the grid bounds
+
+    Parameters:
+    -----------
+    x : numpy.ndarray
+        x coordinates of points in the grid CRS
+    y : numpy.ndarray
+        y coordinates of points in the grid CRS
+    bounds : tuple
+        xmin, xmax, ymin, ymax of the grid
+    shape : tuple
+        shape of the grid (the curve has about one cell per grid cell)
+    curve : str
+        'morton' or 'hilbert' (see geodataset.utils.get_curve_index)
+
+    Returns:
+    --------
+    index : numpy.ndarray
+        indices of points in the curve order
+    """
+    bits = max(1, int(np.ceil(np.log2(max(shape)))))
+    n = 2 ** bits - 1
+    i, j = [np.clip(np.nan_to_num((v - v0) / max(v1 - v0, 1e-12) * n), 0, n)
+        for v, v0, v1 in [(y, bounds[2], bounds[3]), (x, bounds[0], bounds[1])]]
+    return np.argsort(get_curve_index(i, j, curve, bits), kind='stable')
+
+
+def interp_field(geometry, field, x, y, project=None, fill_value=np.nan, block_size=None,
+        order=None, key=None, ds=None):
+    """ Interpolate a gap-filled field to points, block by block.
+    This is the interpolation of GeoDatasetRead.interp_to_points and
+    GeoDatasetRead.interp_to_xy, also used by ThreadSafeGeoDatasetRead, SharedField and
+    InterpolationServer, so that they all give the same results.
+
+    Parameters:
+    -----------
+    geometry : GridGeometry
+        geometry of the grid
+    field : numpy.ndarray
+        2D field on the grid (NaN where there is no data, see geodataset.utils.fill_nan_gaps)
+    x : numpy.ndarray
+        x coordinates (or longitudes) of points
+    y : numpy.ndarray
+        y coordinates (or latitudes) of points
+    project : function or None
+        function transforming x, y to coordinates in geometry.crs
+    fill_value : float
+        value for points outside the grid or with NaN neighbours
+    block_size : int
+        number of points projected and interpolated at once (all points if None)
+    order : str
+        order points of each block along a space-filling curve ('morton' or 'hilbert')
+        for locality of memory access. Results are returned in the original order.
+    key : str
+        identifier of the points for caching the weights (see get_bilinear_weights).
+        Used only if all points are processed in one block without ordering.
+    ds : GeoDatasetBase
+        dataset for instrumentation events (None to add to global stats only)
+
+    Returns:
+    --------
+    values : numpy.ndarray
+        values interpolated to points, with the shape of x
+    """
+    if field.ndim != 2:
+        raise ValueError('Can interpolate only 2D data from netCDF file')
+    bounds = geometry.x.min(), geometry.x.max(), geometry.y.min(), geometry.y.max()
+    x, y = np.asarray(x), np.asarray(y)
+    values = np.full(x.shape, fill_value, dtype=float)
+    x, y, v_flat = x.reshape(-1), y.reshape(-1), values.reshape(-1)
+    block_size = block_size or max(1, x.size)
+    if order is not None or x.size > block_size:
+        key = None
+    for start in range(0, x.size, block_size):
+        xout, yout = x[start:start + block_size], y[start:start + block_size]
+        index = None
+        def get_xy():
+            nonlocal index
+            xp, yp = (xout, yout) if project is None else project(xout, yout)
+            xp, yp = np.asarray(xp, dtype=float), np.asarray(yp, dtype=float)
+            if order is not None:
+                index = get_curve_order(xp, yp, bounds, geometry.shape, order)
+                xp, yp = xp[index], yp[index]
+            return xp, yp
+        with instrumentation.timed(ds, 'interpolator_build', xout.size):
+            weights = get_bilinear_weights(geometry, get_xy, key=key)
+        with instrumentation.timed(ds, 'interpolation', np.count_nonzero(weights.valid)):
+            block_values = weights(field, fill_value)
+        if index is None:
+            v_flat[start:start + block_size] = block_values
+        else:
+            v_flat[start:start + block_size][index] = block_values
+    return values
@@ -0,0 +1,151 @@
+import warnings
+
+from netCDF4 import default_fillvals
+import numpy as np
+from scipy.io import netcdf_file
+
+
+# data models which can be read by scipy.io.netcdf_file (CDF5 files cannot)
+NETCDF3_DATA_MODELS = ['NETCDF3_CLASSIC', 'NETCDF3_64BIT_OFFSET']
+
+
+class MemoryMappedVariable:
+    """ Read-only view of an uncompressed netCDF variable mapped into memory.
+
+    Slicing returns masked arrays decoded like netCDF4.Variable does by default
+    (masking of _FillValue, missing_value and valid range, then scale_factor and add_offset),
+    but only for the requested slice. The file is read from the page cache shared by all
+    processes, and only the requested slice is copied, so the returned arrays are
+    writable and independent of the memory map.
+    """
+
+    def __init__(self, raw, nc_var):
+        """
+        Parameters:
+        -----------
+        raw : numpy.ndarray
+            memory mapped array with raw (packed) values
+        nc_var : netCDF4.Variable
+            variable to take dimensions and attributes from
+        """
+        self.raw = raw
+        self.dimensions = nc_var.dimensions
+        self.ncattrs = {att: nc_var.getncattr(att) for att in nc_var.ncattrs()}
+
+    @property
+    def shape(self):
+        return self.raw.shape
+
+    @property
+    def ndim(self):
+        return self.raw.ndim
+
+    def get_mask(self, raw):
+        """ Get mask of invalid values following netCDF4.Variable rules
+
+        Parameters
+        ----------
+        raw : numpy.ndarray
+            raw values
+
+        Returns
+        -------
+        mask : numpy.ndarray(bool) or numpy.ma.nomask
+        """
+        atts = self.ncattrs
+        invalid = []
+        fill_value = atts.get('_FillValue')
+        if fill_value is None and self.raw.dtype.str[1:] not in ['u1', 'i1']:
+            fill_value = default_fillvals[self.raw.dtype.str[1:]]
+        for value in [fill_value] + list(np.ravel(atts.get('missing_value', []))):
+            if value is None:
+                continue
+            if np.isnan(value):
+                invalid.append(np.isnan(raw))
+            else:
+                invalid.append(raw == np.array(value, raw.dtype))
+        valid_min, valid_max = atts.get('valid_range', (None, None))
+        valid_min = atts.get('valid_min', valid_min)
+        valid_max = atts.get('valid_max', valid_max)
+        if valid_min is not None:
+            invalid.append(raw < valid_min)
+        if valid_max is not None:
+            invalid.append(raw > valid_max)
+        if not invalid:
+            return np.ma.nomask
+        return np.logical_or.reduce(invalid)
+
+    def __getitem__(self, key):
+        raw = self.raw[key]
+        mask = self.get_mask(raw)
+        data = raw
+        if 'scale_factor' in self.ncattrs:
+            data = data * self.ncattrs['scale_factor']
+        if 'add_offset' in self.ncattrs:
+            data = data + self.ncattrs['add_offset']
+        if np.shares_memory(data, self.raw):
+            data = np.array(data)
+        return np.ma.masked_array(data, mask=mask, copy=False)
+
+
+def get_memmap_variable(ds, var_name):
+    """ Map a variable into memory if it is stored uncompressed and contiguous
+
+    Variables in netCDF3 classic and 64-bit offset files are mapped using
+    scipy.io.netcdf_file. Contiguous unfiltered variables in netCDF4 files are mapped
+    using the offset from h5py (if it is installed). Other files (e.g. CDF5) and files
+    which cannot be mapped are read normally.
+
+    Parameters
+    ----------
+    ds : netCDF4.Dataset
+        opened dataset
+    var_name : str
+        name of variable
+
+    Returns
+    -------
+    var : MemoryMappedVariable or None
+        None if the variable cannot be mapped
+    """
+    nc_var = ds.variables[var_name]
+    if (not isinstance(nc_var.dtype, np.dtype)
+            or nc_var.dtype.kind not in 'iuf'
+            or '_Unsigned' in nc_var.ncattrs()
+            or nc_var.size == 0):
+        return None
+    try:
+        raw = _map_variable(ds, nc_var, var_name)
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+    if raw is None:
+        return None
+    return MemoryMappedVariable(raw, nc_var)
+
+
+def _map_variable(ds, nc_var, var_name):
+    """ Map raw values of a variable (see get_memmap_variable) or return None """
+    filename = ds.filepath()
+    if ds.data_model in NETCDF3_DATA_MODELS:
+        nc3 = netcdf_file(filename, mmap=True, maskandscale=False)
+        raw = nc3.variables[var_name].data
+        with warnings.catch_warnings():
+            # the memory map stays open while raw is referenced
+            warnings.simplefilter('ignore', RuntimeWarning)
+            nc3.close()
+        return raw
+    if (not ds.data_model.startswith('NETCDF4')
+            or nc_var.chunking() != 'contiguous'
+            or any(nc_var.filters().values())):
+        return None
+    try:
+        import h5py
+    except ImportError:
+        return None
+    with h5py.File(filename, 'r') as h5f:
+        h5var = h5f[nc_var.group().path][var_name]
+        offset = h5var.id.get_offset()
+        dtype = h5var.dtype
+    if offset is None:
+        return None
+    return np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=nc_var.shape)
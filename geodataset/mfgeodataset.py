@@ -0,0 +1,265 @@
+from collections import OrderedDict
+from functools import cached_property
+import inspect
+import types
+
+from netCDF4 import Dataset
+from netcdftime import num2date
+import numpy as np
+import xarray as xr
+
+from geodataset.geodataset import GeoDatasetRead
+
+
+class MFGeoDatasetRead:
+    """ Several netCDF files on the same grid presented as one dataset with a concatenated
+    time axis (e.g. daily files of a product).
+
+    Grid metadata (projection, grid geometry, lon/lat, bbox, etc.) is taken from the first
+    file (the template) and computed once for the whole set. Methods of the GeoDatasetRead
+    class of the files are available and run on the multi-file dataset, so that
+    get_variable_array(var_name, time_index=...) and the methods which call it
+    (interp_to_points, get_var_for_nextsim, ...) read from the file with the given time step.
+    Member files are opened lazily and at most max_open_files are kept open.
+    """
+
+    def __init__(self, filenames, cls=GeoDatasetRead, max_open_files=8):
+        """
+        Parameters:
+        -----------
+        filenames : list(str)
+            names of files in chronological order
+        cls : type
+            GeoDatasetRead or child class to open the files with
+        max_open_files : int
+            maximum number of member files kept open (in addition to the template)
+        """
+        if not filenames:
+            raise ValueError('No files to open')
+        if max_open_files < 1:
+            raise ValueError('max_open_files must be positive')
+        self.filenames = list(filenames)
+        self.cls = cls
+        self.max_open_files = max_open_files
+        self.template = cls(self.filenames[0])
+        self.open_members = OrderedDict()
+
+    def __getattr__(self, name):
+        """ Get attributes of the template. Methods of the template class are bound to the
+        multi-file dataset, other attributes (e.g. cached grid metadata) are read from the
+        template. """
+        if name in ('template', 'cls'):
+            # not set yet (e.g. in __init__ or during unpickling)
+            raise AttributeError(name)
+        try:
+            attr = inspect.getattr_static(self.cls, name)
+        except AttributeError:
+            attr = None
+        if isinstance(attr, types.FunctionType):
+            return types.MethodType(attr, self)
+        return getattr(self.template, name)
+
+    def __getitem__(self, var_name):
+        return self.template[var_name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return '%s(%d files, %s ... %s)' % (type(self).__name__, len(self.filenames),
+            self.filenames[0], self.filenames[-1])
+
+    def close(self):
+        """ Close all open files """
+        while self.open_members:
+            self.open_members.popitem(last=False)[1].close()
+        self.template.close()
+
+    @cached_property
+    def spatial_shape(self):
+        """ Shape of the grid (sizes of spatial dimensions of the template)
+
+        Returns
+        -------
+        shape : tuple(int)
+        """
+        return tuple(self.template.dimensions[d].size for d in self.template.get_spatial_dims())
+
+    def get_member(self, file_index):
+        """ Get an open member file. If too many files are open, the least recently used one
+        is closed.
+
+        Parameters
+        ----------
+        file_index : int
+            index of file in self.filenames
+
+        Returns
+        -------
+        ds : GeoDatasetRead
+            dataset (of class self.cls)
+        """
+        if file_index == 0:
+            return self.template
+        if file_index in self.open_members:
+            self.open_members.move_to_end(file_index)
+            return self.open_members[file_index]
+        ds = self.cls(self.filenames[file_index])
+        shape = tuple(ds.dimensions[d].size for d in self.template.get_spatial_dims()
+            if d in ds.dimensions)
+        if shape != self.spatial_shape:
+            ds.close()
+            raise ValueError('Grid of %s %s differs from grid of %s %s' % (
+                self.filenames[file_index], shape, self.filenames[0], self.spatial_shape))
+        self.open_members[file_index] = ds
+        while len(self.open_members) > self.max_open_files:
+            self.open_members.popitem(last=False)[1].close()
+        return ds
+
+    def read_member_datetimes(self, file_index):
+        """ Read time values of a member file. Only the time variable is read (with a plain
+        netCDF4.Dataset, which is closed afterwards), unless the class computes datetimes
+        in its own way (e.g. from the filename).
+
+        Parameters
+        ----------
+        file_index : int
+            index of file in self.filenames
+
+        Returns
+        -------
+        datetimes : list(datetime.datetime)
+        """
+        if file_index == 0 or file_index in self.open_members or any(
+                inspect.getattr_static(self.cls, name) is not
+                inspect.getattr_static(GeoDatasetRead, name)
+                for name in ['datetimes', 'convert_time_data', 'time_name']):
+            return list(self.get_member(file_index).datetimes)
+        if self.time_name is None:
+            return []
+        with Dataset(self.filenames[file_index]) as ds:
+            var = ds.variables[self.time_name]
+            tdata = np.ma.getdata(var[:]).ravel()
+            if tdata.size == 0:
+                return []
+            return list(num2date(tdata, var.units, calendar=getattr(var, 'calendar', 'standard')))
+
+    @cached_property
+    def member_datetimes(self):
+        """ Time values of each member file (read once, see read_member_datetimes)
+
+        Returns
+        -------
+        member_datetimes : list(list(datetime.datetime))
+        """
+        return [self.read_member_datetimes(i) for i in range(len(self.filenames))]
+
+    @cached_property
+    def datetimes(self):
+        """
+        Returns:
+        --------
+        datetimes : list(datetime.datetime)
+            time values of all files concatenated
+        """
+        return [t for datetimes in self.member_datetimes for t in datetimes]
+
+    @cached_property
+    def time_index_map(self):
+        """ File index and time index within the file for each time step
+
+        Returns
+        -------
+        time_index_map : numpy.ndarray
+            2D array with shape (len(self.datetimes), 2)
+        """
+        sizes = [len(datetimes) for datetimes in self.member_datetimes]
+        file_indices = np.repeat(np.arange(len(sizes)), sizes)
+        starts = np.cumsum([0] + sizes[:-1])
+        local_indices = np.arange(file_indices.size) - starts[file_indices]
+        return np.column_stack([file_indices, local_indices])
+
+    def get_member_time_index(self, var_name, time_index):
+        """ Get member file and time index within the file for a global time index
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        time_index : int
+            index in self.datetimes (negative values count from the end)
+
+        Returns
+        -------
+        ds : GeoDatasetRead
+            member dataset (the template if variable has no time dimension)
+        time_index : int
+            time index within the member file
+        """
+        if self.time_name not in self.template[var_name].dimensions:
+            return self.template, time_index
+        n = len(self.time_index_map)
+        if not -n <= time_index < n:
+            raise IndexError('time_index %d is out of range for %d time steps' % (time_index, n))
+        file_index, local_index = self.time_index_map[time_index]
+        return self.get_member(int(file_index)), int(local_index)
+
+    def get_variable_array(self, var_name, time_index=0, **kwargs):
+        """ Get array with values from a given variable from the file with time_index
+        (see GeoDatasetRead.get_variable_array)
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        time_index: int
+            index of time step in self.datetimes
+        kwargs : dict
+            for GeoDatasetRead.get_variable_array (ij_range)
+
+        Returns
+        -------
+        array : 2D numpy.array
+        """
+        ds, time_index = self.get_member_time_index(var_name, time_index)
+        return ds.get_variable_array(var_name, time_index=time_index, **kwargs)
+
+    def get_variable_array_tiled(self, var_name, time_index=0, **kwargs):
+        """ Get array with values from a given variable from the file with time_index,
+        read in parallel by tiles (see GeoDatasetRead.get_variable_array_tiled)
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        time_index: int
+            index of time step in self.datetimes
+        kwargs : dict
+            for GeoDatasetRead.get_variable_array_tiled
+
+        Returns
+        -------
+        array : 2D numpy.ma.MaskedArray
+        """
+        ds, time_index = self.get_member_time_index(var_name, time_index)
+        return ds.get_variable_array_tiled(var_name, time_index=time_index, **kwargs)
+
+    def to_xarray(self, chunks='auto'):
+        """ Get lazily evaluated dask-backed view of all files concatenated along time
+        (see GeoDatasetRead.to_xarray)
+
+        Parameters
+        ----------
+        chunks : int, str, tuple or dict
+            chunks for xarray.open_dataset (dask is required)
+
+        Returns
+        -------
+        ds : xarray.Dataset
+        """
+        datasets = [self.get_member(i).to_xarray(chunks) for i in range(len(self.filenames))]
+        return xr.concat(datasets, dim=self.time_name, data_vars='minimal',
+            coords='minimal', compat='override')
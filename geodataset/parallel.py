@@ -0,0 +1,276 @@
+import atexit
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import OrderedDict
+import multiprocessing.util
+import os
+import queue
+import threading
+
+import numpy as np
+
+from geodataset.cache import get_cache
+from geodataset.utils import NETCDF_LOCK
+
+# maximum number of datasets kept open by each worker
+MAX_WORKER_DATASETS = 32
+# datasets opened in the current worker process, see get_worker_dataset.
+# They may be in use, so they are not evicted to keep within the cache memory budget.
+_worker_datasets = get_cache('worker_datasets', max_entries=MAX_WORKER_DATASETS,
+    on_evict=lambda ds: ds.close(), evictable=False)
+# datasets opened in the current worker thread
+_thread_datasets = threading.local()
+# process in which close_worker_datasets is registered to run at exit
+_finalizer_pid = None
+
+
+def get_worker_dataset(cls, filename, shared=False):
+    """ Get dataset opened once per worker process (or thread) and kept open
+    for the lifetime of the worker (at most MAX_WORKER_DATASETS are kept, the least
+    recently used one is closed)
+
+    Parameters
+    ----------
+    cls : type
+        GeoDatasetRead or a child class
+    filename : str
+        name of input file
+    shared : bool
+        share datasets between threads of the process. Use it when calls are serialised
+        with NETCDF_LOCK, so that datasets are not left to be closed when threads exit.
+
+    Returns
+    -------
+    ds : GeoDatasetRead
+    """
+    _register_finalizer()
+    key = (cls, filename)
+    if shared or threading.current_thread() is threading.main_thread():
+        ds = _worker_datasets.get(key)
+        if ds is None:
+            ds = _worker_datasets[key] = cls(filename)
+        return ds
+    if not hasattr(_thread_datasets, 'datasets'):
+        _thread_datasets.datasets = OrderedDict()
+    datasets = _thread_datasets.datasets
+    if key in datasets:
+        datasets.move_to_end(key)
+        return datasets[key]
+    datasets[key] = cls(filename)
+    while len(datasets) > MAX_WORKER_DATASETS:
+        datasets.popitem(last=False)[1].close()
+    return datasets[key]
+
+
+def close_worker_datasets():
+    """ Close datasets opened by get_worker_dataset in the current process
+    (shared ones and those of the current thread) """
+    _worker_datasets.clear()
+    datasets = getattr(_thread_datasets, 'datasets', {})
+    while datasets:
+        datasets.popitem()[1].close()
+
+
+def _register_finalizer():
+    """ Close worker datasets when a worker process exits. Worker processes of
+    multiprocessing and concurrent.futures do not run atexit handlers, but they run
+    multiprocessing finalizers.
+    """
+    global _finalizer_pid
+    if _finalizer_pid != os.getpid():
+        _finalizer_pid = os.getpid()
+        multiprocessing.util.Finalize(None, close_worker_datasets, exitpriority=10)
+
+
+atexit.register(close_worker_datasets)
+
+
+def get_tile_ij_ranges(ij_range, shape, chunk_shape, tile_shape):
+    """ Split ij_range into tiles with boundaries aligned to the netCDF chunks
+
+    Parameters
+    ----------
+    ij_range : tuple with 4 ints
+        start/stop along i and j (y and x) axis
+    shape : tuple(int)
+        shape of the variable along (y, x) axes
+    chunk_shape : tuple(int)
+        shape of the netCDF chunks along (y, x) axes
+    tile_shape : tuple(int)
+        approximate shape of tiles. It is rounded up to the multiple of chunk_shape.
+
+    Returns
+    -------
+    tiles : list(tuple)
+        ij_ranges of tiles
+    """
+    bounds = []
+    for start, stop, size, chunk, tile in zip(
+            ij_range[::2], ij_range[1::2], shape, chunk_shape, tile_shape):
+        start, stop, _ = slice(start, stop).indices(size)
+        tile = max(1, int(np.ceil(tile / chunk))) * chunk
+        first = (start // tile + 1) * tile
+        bounds.append([start] + list(range(first, stop, tile)) + [stop])
+    return [(i0, i1, j0, j1)
+        for i0, i1 in zip(bounds[0][:-1], bounds[0][1:])
+        for j0, j1 in zip(bounds[1][:-1], bounds[1][1:])]
+
+
+def _read_tile(cls, filename, var_name, time_index, ij_range):
+    """ Read one tile in a worker process
+
+    Returns
+    -------
+    ij_range : tuple(int)
+    data : numpy.ndarray
+    mask : numpy.ndarray or numpy.ma.nomask
+    """
+    ds = get_worker_dataset(cls, filename)
+    tile = ds.get_variable_array(var_name, time_index=time_index, ij_range=ij_range)
+    return ij_range, np.ma.getdata(tile), np.ma.getmask(tile)
+
+
+def read_variable_tiled(cls, filename, var_name, time_index=0,
+        ij_range=(None, None, None, None), tile_shape=None, executor='process', max_workers=None):
+    """ Read a variable in chunk-aligned tiles in parallel worker processes
+
+    The netCDF4/HDF5 libraries are not thread-safe and hold a lock for the whole read
+    and decompression, so tiles are read only in processes (threads would run one after
+    another). Each worker process opens its own handle to the file (see
+    get_worker_dataset), which is closed when the worker exits.
+
+    Parameters
+    ----------
+    cls : type
+        GeoDatasetRead or a child class to open the file with
+    filename : str
+        name of input file
+    var_name : str
+        name of variable
+    time_index : int
+        from which time layer to read data
+    ij_range : tuple with 4 ints
+        start/stop along i and j (y and x) axis
+    tile_shape : tuple(int)
+        approximate shape of tiles. By default rows are split into about 4 tiles per worker.
+    executor : str or concurrent.futures.ProcessPoolExecutor
+        'process' for a new process pool (shut down after reading) or an existing
+        one (reused workers keep their file handles)
+    max_workers : int
+        number of workers for a new executor (default is number of CPUs)
+
+    Returns
+    -------
+    array : numpy.ma.MaskedArray
+        2D array, same as GeoDatasetRead.get_variable_array
+    """
+    if executor != 'process' and not isinstance(executor, ProcessPoolExecutor):
+        raise ValueError("executor must be 'process' or a ProcessPoolExecutor")
+    with cls(filename) as ds:
+        var = ds[var_name]
+        shape = var.shape[-2:]
+        chunking = var.chunking()
+    if chunking == 'contiguous' or chunking is None:
+        chunk_shape = (1, 1)
+    else:
+        chunk_shape = tuple(chunking[-2:])
+    max_workers = max_workers or os.cpu_count()
+    (i0, i1, _), (j0, j1, _) = [slice(start, stop).indices(size)
+        for start, stop, size in zip(ij_range[::2], ij_range[1::2], shape)]
+    out_shape = (max(0, i1 - i0), max(0, j1 - j0))
+    if tile_shape is None:
+        tile_shape = (int(np.ceil(out_shape[0] / (4 * max_workers))), out_shape[1])
+    tiles = get_tile_ij_ranges((i0, i1, j0, j1), shape, chunk_shape, tile_shape)
+
+    own_executor = executor == 'process'
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    data = mask = None
+    try:
+        futures = [executor.submit(
+            _read_tile, cls, filename, var_name, time_index, tile) for tile in tiles]
+        for future in as_completed(futures):
+            (ti0, ti1, tj0, tj1), tile_data, tile_mask = future.result()
+            if data is None:
+                data = np.empty(out_shape, dtype=tile_data.dtype)
+                mask = np.zeros(out_shape, dtype=bool)
+            sub = (slice(ti0 - i0, ti1 - i0), slice(tj0 - j0, tj1 - j0))
+            data[sub] = tile_data
+            mask[sub] = tile_mask
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+    if data is None:
+        data, mask = np.empty(out_shape), False
+    return np.ma.array(data, mask=mask, copy=False)
+
+
+class _Done:
+    """ End of items in iter_prefetched """
+
+
+class _Error:
+    """ Exception raised in the background thread of iter_prefetched """
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def iter_prefetched(func, items, prefetch=1):
+    """ Iterate over results of func for items, computing the next results in a background
+    thread while the caller processes the current one
+
+    Parameters
+    ----------
+    func : function
+        function of one item (e.g. reading one time step). It should release the GIL
+        (as netCDF4 reads and numpy do) for the overlap to be effective.
+    items : iterable
+        arguments of func
+    prefetch : int
+        maximum number of results computed ahead and kept in memory.
+        If 0, results are computed in the calling thread when needed.
+
+    Yields
+    ------
+    item : object
+        item from items
+    result : object
+        func(item)
+    """
+    if prefetch < 1:
+        for item in items:
+            yield item, func(item)
+        return
+    results = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                results.put((item, func(item)))
+        except BaseException as e:
+            results.put(_Error(e))
+        else:
+            results.put(_Done)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            result = results.get()
+            if result is _Done:
+                return
+            if isinstance(result, _Error):
+                raise result.exception
+            yield result
+    finally:
+        # unblock the producer if the caller stops early
+        stop.set()
+        while thread.is_alive():
+            try:
+                results.get(timeout=0.01)
+            except queue.Empty:
+                pass
+        thread.join()
@@ -0,0 +1,464 @@
+""" Regrid variables from many netCDF files onto a target grid or a neXtSIM mesh
+
+Each source file is interpolated in a worker process and written to a file with the same
+name in the output directory. Progress is saved in a checkpoint file, so a killed run
+resumes with the files that were not completed (or failed). A run with other variables,
+target or time range does not resume from the checkpoint (see --restart).
+
+Example:
+    geodataset-regrid 'data/**/*.nc' -t target.nc -v sic sit -o out --start 2021-01-01 -j 4
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import datetime as dt
+import hashlib
+import json
+import os
+import sys
+import traceback
+
+from netcdftime import date2num
+import numpy as np
+import pyproj
+
+from geodataset.export import export_file
+from geodataset.geodataset import GeoDatasetWrite
+from geodataset.interpolation import get_bilinear_weights
+from geodataset.tools import get_source_files, open_netcdf
+from geodataset.utils import fill_nan_gaps
+
+# target of the current worker process, see _init_worker
+_worker_target = None
+
+
+class RegridTarget:
+    """ Points to interpolate to and description of the output grid
+
+    Attributes:
+    -----------
+    lon : numpy.ndarray
+        longitudes of points
+    lat : numpy.ndarray
+        latitudes of points
+    dims : tuple(str)
+        names of output dimensions (matching the shape of lon, lat)
+    spec : dict
+        spec of the output grid (see GeoDatasetWrite.define_from_spec)
+    fingerprint : str
+        hash of lon, lat used as a key for cached interpolation weights
+    """
+
+    def __init__(self, lon, lat, dims, spec):
+        self.lon = np.array(np.ma.getdata(lon), dtype=float)
+        self.lat = np.array(np.ma.getdata(lat), dtype=float)
+        self.dims = tuple(dims)
+        self.spec = spec
+        h = hashlib.sha1()
+        for a in [self.lon, self.lat]:
+            h.update(np.int64(a.shape).tobytes())
+            h.update(a.tobytes())
+        self.fingerprint = h.hexdigest()
+
+    @classmethod
+    def from_grid_file(cls, filename, lonlat=None):
+        """ Target on the grid of a netCDF file
+
+        Parameters:
+        -----------
+        filename : str
+            name of netCDF file
+        lonlat : str
+            data type to store 2D lon, lat in output files ('f4' or 'f8'), None to omit them
+
+        Returns:
+        --------
+        target : RegridTarget
+        """
+        with open_netcdf(filename) as ds:
+            spec = GeoDatasetWrite.get_grid_spec(ds, lonlat=lonlat)
+            lon, lat = ds.get_lonlat_arrays()
+        if lon.ndim == 1:
+            lon, lat = np.meshgrid(lon, lat)
+        return cls(lon, lat, ('y', 'x'), spec)
+
+    @classmethod
+    def from_mesh_info(cls, mesh_info, on_elements=True):
+        """ Target on nodes or elements of a neXtSIM mesh
+
+        Parameters:
+        -----------
+        mesh_info : object
+            mesh_info of NextsimBin with nodes_x, nodes_y, indices and projection
+        on_elements : bool
+            interpolate to elements (or to nodes)
+
+        Returns:
+        --------
+        target : RegridTarget
+        """
+        x, y = mesh_info.nodes_x, mesh_info.nodes_y
+        if on_elements:
+            x, y = [v[mesh_info.indices].mean(axis=1) for v in [x, y]]
+        projection = pyproj.Proj(mesh_info.projection.pyproj.crs)
+        lon, lat = projection(x, y, inverse=True)
+        dim = 'elements' if on_elements else 'nodes'
+        spec = dict(
+            projection=projection,
+            grid_mapping_variable='crs',
+            dims={dim: x.size},
+            variables={name: dict(data=v, dims=(dim,), dtype=np.float64, atts=dict(
+                standard_name='projection_%s_coordinate' % name, units='m'))
+                for name, v in [('x', x), ('y', y)]},
+        )
+        return cls(lon, lat, (dim,), spec)
+
+    @classmethod
+    def from_nextsim_file(cls, filename, on_elements=True):
+        """ Target on the mesh of a neXtSIM binary file (requires pynextsim)
+
+        Parameters:
+        -----------
+        filename : str
+            name of neXtSIM binary file (e.g. field_20210101T000000Z.bin)
+        on_elements : bool
+            interpolate to elements (or to nodes)
+
+        Returns:
+        --------
+        target : RegridTarget
+        """
+        from pynextsim.nextsim_bin import NextsimBin
+        return cls.from_mesh_info(NextsimBin(filename).mesh_info, on_elements)
+
+
+class Checkpoint:
+    """ Progress of a regridding run kept in a JSON file
+
+    Attributes:
+    -----------
+    done : dict
+        names of completed source files and their output files (None if skipped)
+    failed : dict
+        names of failed source files and tracebacks (failed files are retried on resume)
+    params : dict or None
+        parameters of the run (see get_run_params), None until they are set
+    """
+
+    def __init__(self, filename=None):
+        """
+        Parameters:
+        -----------
+        filename : str
+            name of JSON file. If it exists, the progress is loaded from it.
+            If None, the progress is not saved.
+        """
+        self.filename = filename
+        self.done = {}
+        self.failed = {}
+        self.params = None
+        if filename and os.path.exists(filename):
+            with open(filename) as f:
+                state = json.load(f)
+            self.done = state['done']
+            self.failed = state.get('failed', {})
+            self.params = state.get('params')
+
+    def set_params(self, params):
+        """ Set parameters of the run. Progress saved with other parameters is not valid
+        for this run (outputs would contain other variables, times or grid).
+
+        Parameters:
+        -----------
+        params : dict
+            parameters of the run (see get_run_params)
+
+        Raises:
+        -------
+        ValueError
+            if the progress was saved with other parameters
+        """
+        if self.params is not None and self.params != params:
+            changed = [k for k in sorted(params) if self.params.get(k) != params[k]]
+            raise ValueError('Checkpoint %s was saved with other parameters (%s), use another '
+                'output directory or restart the run' % (self.filename, ', '.join(changed)))
+        self.params = params
+        self.save()
+
+    def mark_done(self, source, output):
+        self.done[source] = output
+        self.failed.pop(source, None)
+        self.save()
+
+    def mark_failed(self, source, error):
+        self.failed[source] = error
+        self.save()
+
+    def save(self):
+        """ Save progress to the JSON file (atomically) """
+        if not self.filename:
+            return
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(dict(params=self.params, done=self.done, failed=self.failed), f,
+                indent=1)
+        os.replace(tmp_filename, self.filename)
+
+
+def get_run_params(target, var_names, start=None, end=None, distance=5, fill_value=np.nan):
+    """ Get parameters of a run which determine the contents of its output files
+    (see regrid_files)
+
+    Returns:
+    --------
+    params : dict
+        JSON-serialisable parameters
+    """
+    return dict(
+        variables=sorted(var_names),
+        target=target.fingerprint,
+        start=None if start is None else start.isoformat(),
+        end=None if end is None else end.isoformat(),
+        distance=distance,
+        fill_value=repr(float(fill_value)),
+    )
+
+
+def get_time_indices(ds, start=None, end=None):
+    """ Get indices of time steps within [start, end)
+
+    Limits of the range are converted to time units of the dataset, so that time values
+    are compared without converting each of them to datetime.
+
+    Parameters:
+    -----------
+    ds : GeoDatasetRead
+        source dataset
+    start : datetime.datetime
+    end : datetime.datetime
+
+    Returns:
+    --------
+    time_indices : list(int)
+        indices of time steps or [None] if dataset has no time
+    """
+    if ds.time_name is None or ds.time_name not in ds.variables:
+        return [None]
+    tvar = ds.variables[ds.time_name]
+    tdata = np.ma.getdata(tvar[:])
+    valid = np.ones(tdata.shape, dtype=bool)
+    calendar = getattr(tvar, 'calendar', 'standard')
+    if start is not None:
+        valid *= tdata >= date2num(start, tvar.units, calendar=calendar)
+    if end is not None:
+        valid *= tdata < date2num(end, tvar.units, calendar=calendar)
+    return [int(i) for i in np.flatnonzero(valid)]
+
+
+def _init_worker(target):
+    """ Keep target in the worker process """
+    global _worker_target
+    _worker_target = target
+
+
+def regrid_file(filename, var_names, output_dir, start=None, end=None, distance=5,
+        fill_value=np.nan, target=None):
+    """ Regrid variables from one file and write them to output_dir
+
+    Parameters:
+    -----------
+    filename : str
+        name of source file
+    var_names : list(str)
+        names of variables to regrid
+    output_dir : str
+        output directory
+    start : datetime.datetime
+        first time to regrid
+    end : datetime.datetime
+        end of time range to regrid (excluded)
+    distance : int
+        extrapolation distance (in pixels) to avoid land contamination
+    fill_value : float
+        value for points outside the source grid
+    target : RegridTarget
+        target (the target of the worker process by default)
+
+    Returns:
+    --------
+    output : str or None
+        name of output file (None if the file has no time steps within the time range)
+    """
+    target = target or _worker_target
+    with open_netcdf(filename) as ds:
+        time_indices = get_time_indices(ds, start, end)
+        if not time_indices:
+            return None
+        geometry = ds.get_grid_geometry()
+        if ds.is_lonlat_dim:
+            get_xy = lambda: (target.lon, target.lat)
+        else:
+            get_xy = lambda: ds.projection(target.lon, target.lat)
+        weights = get_bilinear_weights(geometry, get_xy, key=target.fingerprint)
+        spec = dict(target.spec)
+        variables = dict(target.spec.get('variables', {}))
+        for var_name in var_names:
+            src_var = ds.variables[var_name]
+            atts = {att: src_var.getncattr(att) for att in ['units', 'standard_name', 'long_name']
+                if att in src_var.ncattrs()}
+            dims = target.dims
+            var_time_indices = [0]
+            if ds.time_name in src_var.dimensions:
+                dims = ('time',) + dims
+                var_time_indices = time_indices
+            data = np.empty((len(var_time_indices),) + target.lon.shape, dtype=np.float32)
+            for k, time_index in enumerate(var_time_indices):
+                field = ds.get_variable_array(var_name, time_index=time_index)
+                field = fill_nan_gaps(field.astype(float).filled(np.nan), distance)
+                data[k] = weights(field, fill_value)
+            if dims[0] != 'time':
+                data = data[0]
+            variables[var_name] = dict(data=data, dims=dims, atts=atts)
+        spec['variables'] = variables
+        if time_indices != [None]:
+            tvar = ds.variables[ds.time_name]
+            spec['time'] = dict(data=tvar[time_indices], atts=dict(
+                units=tvar.units, calendar=getattr(tvar, 'calendar', 'standard')))
+    os.makedirs(output_dir, exist_ok=True)
+    output = os.path.join(output_dir, os.path.basename(filename))
+    export_file(output, spec)
+    return output
+
+
+def regrid_files(filenames, target, var_names, output_dir, start=None, end=None,
+        checkpoint=None, max_workers=None, distance=5, fill_value=np.nan):
+    """ Regrid variables from many files in a process pool
+
+    Parameters:
+    -----------
+    filenames : list(str)
+        names of source files (with unique basenames)
+    target : RegridTarget
+        target grid or mesh
+    var_names : list(str)
+        names of variables to regrid
+    output_dir : str
+        output directory
+    start : datetime.datetime
+        first time to regrid
+    end : datetime.datetime
+        end of time range to regrid (excluded)
+    checkpoint : Checkpoint
+        progress of the run. Files already done are skipped. ValueError is raised if
+        the progress was saved with other parameters (see Checkpoint.set_params).
+    max_workers : int
+        number of worker processes (default is number of CPUs). If 1, files are
+        processed in the current process.
+    distance : int
+        extrapolation distance (in pixels) to avoid land contamination
+    fill_value : float
+        value for points outside the source grid
+
+    Returns:
+    --------
+    checkpoint : Checkpoint
+        with completed and failed files
+    """
+    basenames = [os.path.basename(f) for f in filenames]
+    if len(set(basenames)) != len(basenames):
+        raise ValueError('Source files must have unique names')
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = checkpoint or Checkpoint()
+    checkpoint.set_params(get_run_params(target, var_names, start, end, distance, fill_value))
+    todo = [f for f in filenames if f not in checkpoint.done]
+    kwargs = dict(var_names=var_names, output_dir=output_dir, start=start, end=end,
+        distance=distance, fill_value=fill_value)
+    max_workers = max_workers or os.cpu_count()
+    if max_workers == 1:
+        for filename in todo:
+            try:
+                output = regrid_file(filename, target=target, **kwargs)
+            except Exception:
+                checkpoint.mark_failed(filename, traceback.format_exc())
+            else:
+                checkpoint.mark_done(filename, output)
+        return checkpoint
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(target,)) as executor:
+        futures = {executor.submit(regrid_file, filename, **kwargs): filename
+            for filename in todo}
+        try:
+            for future in as_completed(futures):
+                filename = futures[future]
+                try:
+                    output = future.result()
+                except Exception as e:
+                    checkpoint.mark_failed(filename, ''.join(
+                        traceback.format_exception(type(e), e, e.__traceback__)))
+                else:
+                    checkpoint.mark_done(filename, output)
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+    return checkpoint
+
+
+def parse_date(text):
+    """ Parse ISO date for argparse """
+    return dt.datetime.fromisoformat(text)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sources', nargs='+',
+        help='glob patterns of source files or catalog files (@catalog.txt)')
+    target_group = parser.add_mutually_exclusive_group(required=True)
+    target_group.add_argument('-t', '--target', help='netCDF file with target grid')
+    target_group.add_argument('-m', '--mesh', help='neXtSIM binary file with target mesh')
+    parser.add_argument('--nodes', action='store_true',
+        help='interpolate to mesh nodes instead of elements')
+    parser.add_argument('--lonlat', choices=['f4', 'f8'],
+        help='store 2D longitude, latitude of the target grid with this data type')
+    parser.add_argument('-v', '--variables', nargs='+', required=True,
+        help='names of variables to regrid')
+    parser.add_argument('-o', '--output-dir', required=True, help='output directory')
+    parser.add_argument('--start', type=parse_date, help='first time to regrid (ISO format)')
+    parser.add_argument('--end', type=parse_date, help='end of time range (excluded)')
+    parser.add_argument('-j', '--workers', type=int, help='number of worker processes')
+    parser.add_argument('-d', '--distance', type=int, default=5,
+        help='extrapolation distance (pixels) to avoid land contamination')
+    parser.add_argument('-c', '--checkpoint',
+        help='checkpoint file (default: OUTPUT_DIR/regrid_checkpoint.json)')
+    parser.add_argument('--restart', action='store_true',
+        help='discard the progress saved in the checkpoint file')
+    args = parser.parse_args(args)
+
+    if args.target:
+        target = RegridTarget.from_grid_file(args.target, lonlat=args.lonlat)
+    else:
+        target = RegridTarget.from_nextsim_file(args.mesh, on_elements=not args.nodes)
+    filenames = get_source_files(args.sources, exclude=[args.target or args.mesh])
+    os.makedirs(args.output_dir, exist_ok=True)
+    checkpoint_file = args.checkpoint or os.path.join(
+        args.output_dir, 'regrid_checkpoint.json')
+    if args.restart and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    checkpoint = Checkpoint(checkpoint_file)
+    try:
+        checkpoint.set_params(get_run_params(target, args.variables, args.start, args.end,
+            args.distance))
+    except ValueError as e:
+        parser.error(str(e))
+    n_done = len([f for f in filenames if f in checkpoint.done])
+    print('%d source files, %d already done' % (len(filenames), n_done))
+    checkpoint = regrid_files(filenames, target, args.variables, args.output_dir,
+        start=args.start, end=args.end, checkpoint=checkpoint, max_workers=args.workers,
+        distance=args.distance)
+    for filename, error in checkpoint.failed.items():
+        print('FAILED %s:\n%s' % (filename, error), file=sys.stderr)
+    print('%d done, %d failed' % (len([f for f in filenames if f in checkpoint.done]),
+        len(checkpoint.failed)))
+    return 1 if checkpoint.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,381 @@
+""" Resident local interpolation server with warm caches
+
+The server listens on a Unix socket and keeps open datasets, grid geometries, gap-filled
+fields and interpolation weights in memory, so that many small requests from short-lived
+processes (e.g. ensemble members sampling forcing data) only pay for the interpolation.
+
+Requests and responses are a JSON header followed by raw bytes of numpy arrays (no pickle).
+Requests are processed one at a time; clients may keep their connections open.
+
+Usage:
+    geodataset-server /tmp/geodataset.sock
+
+    client = InterpolationClient('/tmp/geodataset.sock')
+    values = client.interp_to_points('ice_conc.nc', 'ice_conc', lon, lat, time_index=3)
+"""
+import argparse
+from collections import OrderedDict
+import datetime as dt
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import traceback
+
+import numpy as np
+
+from geodataset.cache import get_cache, set_cache_budget
+from geodataset.interpolation import interp_field
+from geodataset.tools import open_netcdf
+from geodataset.utils import fill_nan_gaps
+
+_HEADER_SIZE = struct.Struct('!I')
+
+
+class ServerError(Exception):
+    """ Error raised by the server while processing a request """
+
+
+def _recv_exact(sock, size):
+    """ Receive exactly size bytes (or None if the connection is closed) """
+    buf = bytearray(size)
+    view = memoryview(buf)
+    while view:
+        n = sock.recv_into(view)
+        if n == 0:
+            return None
+        view = view[n:]
+    return buf
+
+
+def send_message(sock, header, arrays=()):
+    """ Send JSON header and numpy arrays
+
+    Parameters
+    ----------
+    sock : socket.socket
+    header : dict
+        JSON-serialisable
+    arrays : list(numpy.ndarray)
+    """
+    arrays = [np.ascontiguousarray(a) for a in arrays]
+    header = dict(header, arrays=[dict(dtype=a.dtype.str, shape=a.shape) for a in arrays])
+    header_bytes = json.dumps(header).encode()
+    sock.sendall(_HEADER_SIZE.pack(len(header_bytes)) + header_bytes)
+    for a in arrays:
+        sock.sendall(memoryview(a).cast('B'))
+
+
+def recv_message(sock):
+    """ Receive JSON header and numpy arrays
+
+    Parameters
+    ----------
+    sock : socket.socket
+
+    Returns
+    -------
+    header : dict or None
+        None if the connection is closed
+    arrays : list(numpy.ndarray)
+    """
+    size = _recv_exact(sock, _HEADER_SIZE.size)
+    if size is None:
+        return None, []
+    header = json.loads(_recv_exact(sock, _HEADER_SIZE.unpack(size)[0]))
+    arrays = []
+    for spec in header.pop('arrays'):
+        dtype = np.dtype(spec['dtype'])
+        nbytes = int(np.prod(spec['shape'])) * dtype.itemsize
+        buf = _recv_exact(sock, nbytes) if nbytes else bytearray()
+        arrays.append(np.frombuffer(buf, dtype=dtype).reshape(spec['shape']))
+    return header, arrays
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """ Process requests from one connection until it is closed """
+
+    def handle(self):
+        while True:
+            try:
+                header, arrays = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            if header is None:
+                return
+            try:
+                with self.server.process_lock:
+                    response, out_arrays = self.server.process(header, arrays)
+            except Exception as e:
+                response = dict(error='%s: %s' % (type(e).__name__, e),
+                    traceback=traceback.format_exc())
+                out_arrays = []
+            send_message(self.request, response, out_arrays)
+            if header.get('method') == 'shutdown':
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class InterpolationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ Unix socket server answering interpolation requests from warm caches
+
+    Attributes
+    ----------
+    datasets : OrderedDict
+        open datasets (LRU, at most max_datasets)
+    fields : Cache
+        gap-filled fields (evicted within the memory budget of geodataset.cache)
+    counters : dict
+        numbers of requests and of cache hits and misses
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, max_datasets=16):
+        """
+        Parameters
+        ----------
+        socket_path : str
+            path of the Unix socket (created with permissions 0600)
+        max_datasets : int
+            maximum number of open datasets
+        """
+        if os.path.exists(socket_path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                try:
+                    sock.connect(socket_path)
+                except OSError:
+                    os.remove(socket_path)
+                else:
+                    raise ValueError('Server is already running on %s' % socket_path)
+        self.socket_path = socket_path
+        self.max_datasets = max_datasets
+        self.datasets = OrderedDict()
+        self.fields = get_cache('server_fields')
+        self.counters = dict(requests=0, dataset_hits=0, dataset_misses=0,
+            field_hits=0, field_misses=0)
+        self.process_lock = threading.Lock()
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def server_close(self):
+        super().server_close()
+        while self.datasets:
+            self.datasets.popitem()[1][0].close()
+        self.fields.clear()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def get_dataset(self, filename):
+        """ Get open dataset (reopened if the file was modified)
+
+        Returns
+        -------
+        ds : GeoDatasetRead
+        mtime : float
+            modification time of the file
+        """
+        mtime = os.stat(filename).st_mtime
+        if filename in self.datasets:
+            ds, cached_mtime = self.datasets[filename]
+            if cached_mtime == mtime:
+                self.counters['dataset_hits'] += 1
+                self.datasets.move_to_end(filename)
+                return ds, mtime
+            ds.close()
+            del self.datasets[filename]
+        self.counters['dataset_misses'] += 1
+        ds = open_netcdf(filename)
+        self.datasets[filename] = ds, mtime
+        while len(self.datasets) > self.max_datasets:
+            self.datasets.popitem(last=False)[1][0].close()
+        return ds, mtime
+
+    def get_field(self, ds, mtime, var_name, time_index, ij_range, distance):
+        """ Get gap-filled field from cache or read it
+
+        Returns
+        -------
+        field : numpy.ndarray
+        """
+        key = (ds.filename, mtime, var_name, time_index, tuple(ij_range), distance)
+        field = self.fields.get(key)
+        if field is not None:
+            self.counters['field_hits'] += 1
+            return field
+        self.counters['field_misses'] += 1
+        field = ds.get_variable_array(var_name, time_index=time_index, ij_range=ij_range)
+        field = fill_nan_gaps(field.astype(float).filled(np.nan), distance)
+        self.fields[key] = field
+        return field
+
+    def process(self, header, arrays):
+        """ Process one request
+
+        Parameters
+        ----------
+        header : dict
+            request with 'method' and its parameters
+        arrays : list(numpy.ndarray)
+            arrays of the request
+
+        Returns
+        -------
+        response : dict
+        arrays : list(numpy.ndarray)
+        """
+        self.counters['requests'] += 1
+        method = header.get('method')
+        if method in ('ping', 'shutdown'):
+            return dict(ok=True), []
+        if method == 'stats':
+            return dict(counters=self.counters, datasets=list(self.datasets),
+                fields=len(self.fields)), []
+        if method != 'interp_to_points':
+            raise ValueError('Unknown method: %s' % method)
+        ds, mtime = self.get_dataset(header['filename'])
+        time_index = header.get('time_index', 0)
+        if header.get('time') is not None:
+            time_index = ds.get_nearest_date(dt.datetime.fromisoformat(header['time']))[1]
+        ij_range = header.get('ij_range') or (None, None, None, None)
+        field = self.get_field(ds, mtime, header['var_name'], time_index, ij_range,
+            header.get('distance', 5))
+        lon, lat = [np.asarray(a, dtype=float) for a in arrays]
+        h = hashlib.sha1(lon.tobytes())
+        h.update(lat.tobytes())
+        project = None if ds.is_lonlat_dim else ds.projection
+        fill_value = header.get('fill_value')
+        values = interp_field(ds.get_grid_geometry(ij_range=ij_range), field, lon, lat,
+            project=project, fill_value=np.nan if fill_value is None else fill_value,
+            block_size=header.get('block_size'), order=header.get('order'),
+            key=h.hexdigest(), ds=ds)
+        return dict(time_index=time_index), [values]
+
+
+class InterpolationClient:
+    """ Client of InterpolationServer with a persistent connection """
+
+    def __init__(self, socket_path, timeout=None):
+        """
+        Parameters
+        ----------
+        socket_path : str
+            path of the server socket
+        timeout : float
+            socket timeout in seconds
+        """
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.sock.close()
+
+    def request(self, header, arrays=()):
+        """ Send request and get response
+
+        Returns
+        -------
+        response : dict
+        arrays : list(numpy.ndarray)
+        """
+        send_message(self.sock, header, arrays)
+        response, arrays = recv_message(self.sock)
+        if response is None:
+            raise ConnectionError('Server closed the connection')
+        if 'error' in response:
+            raise ServerError(response['error'])
+        return response, arrays
+
+    def ping(self):
+        return self.request(dict(method='ping'))[0]['ok']
+
+    def stats(self):
+        """ Get counters of requests and cache hits of the server """
+        return self.request(dict(method='stats'))[0]
+
+    def shutdown(self):
+        """ Stop the server """
+        self.request(dict(method='shutdown'))
+
+    def interp_to_points(self, filename, var_name, lon, lat, time_index=0, time=None,
+            distance=5, fill_value=np.nan, ij_range=(None, None, None, None), block_size=None,
+            order=None):
+        """ Interpolate netCDF data to points on the server
+        (same as GeoDatasetRead.interp_to_points)
+
+        Parameters
+        ----------
+        filename : str
+            name of netCDF file (as seen by the server)
+        var_name : str
+            name of variable
+        lon : numpy.ndarray
+            longitudes of points
+        lat : numpy.ndarray
+            latitudes of points
+        time_index : int
+            from which time layer to read data
+        time : datetime.datetime
+            if given, the nearest time layer is used instead of time_index
+        distance : int
+            extrapolation distance (in pixels) to avoid land contamintation
+        fill_value : float
+            value for filling out of bound regions
+        ij_range : tuple with 4 ints
+            start/stop along i and j (y and x) axis
+        block_size : int
+            number of points projected and interpolated at once (all points if None)
+        order : str
+            order points of each block along a space-filling curve ('morton' or 'hilbert')
+
+        Returns
+        -------
+        values : numpy.ndarray
+            values interpolated to points
+        """
+        header = dict(method='interp_to_points', filename=os.path.abspath(filename),
+            var_name=var_name, time_index=int(time_index), distance=distance,
+            fill_value=None if np.isnan(fill_value) else float(fill_value),
+            ij_range=list(ij_range), time=None if time is None else time.isoformat(),
+            block_size=None if block_size is None else int(block_size), order=order)
+        lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+        _, arrays = self.request(header, [lon, lat])
+        return arrays[0]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('socket_path', help='path of the Unix socket')
+    parser.add_argument('--max-datasets', type=int, default=16,
+        help='maximum number of open datasets')
+    parser.add_argument('--cache-budget',
+        help='maximum memory for cached fields and weights (e.g. 4G, '
+            'default is from GEODATASET_CACHE_BUDGET)')
+    args = parser.parse_args(args)
+    if args.cache_budget is not None:
+        set_cache_budget(args.cache_budget)
+    with InterpolationServer(args.socket_path, args.max_datasets) as server:
+        print('Listening on %s' % args.socket_path, flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
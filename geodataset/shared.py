@@ -0,0 +1,237 @@
+from functools import cached_property
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import sys
+import threading
+import weakref
+
+import numpy as np
+import pyproj
+
+from geodataset.interpolation import interp_field
+from geodataset.utils import fill_nan_gaps, transform_points
+
+# serialises attachments which temporarily disable resource_tracker.register
+_attach_lock = threading.Lock()
+
+
+def _attach_segment(name):
+    """ Attach to an existing shared memory segment without tracking it.
+    Before Python 3.13, SharedMemory registers every attachment with the resource_tracker,
+    which then unlinks (or warns about) segments that only the owner process should remove.
+    """
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args: None
+        try:
+            return SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _close_segment(shm):
+    """ Close shared memory when a SharedField is garbage collected """
+    try:
+        shm.close()
+    except BufferError:
+        # views of the field are still in use, the mapping is closed with the last of them
+        pass
+
+
+class SharedField:
+    """ Gap-filled 2D field and its grid geometry in shared memory.
+
+    The field is read and gap-filled once in the parent process. When a SharedField is
+    passed to worker processes (e.g. with ProcessPoolExecutor.submit), only the name of the
+    shared memory segment and the grid geometry are pickled, and workers interpolate from a
+    zero-copy view of the field. Each unpickled copy attaches to the segment, without
+    registering it with the resource_tracker, and closes its attachment when it is garbage
+    collected, closed or used as a context manager. The process which created the field owns
+    the segment and removes it in SharedField.unlink (or when leaving the with block).
+
+    Example:
+        with open_netcdf(filename) as ds, SharedField.from_dataset(ds, 'sic') as field:
+            results = list(executor.map(field.interp_to_points, lons, lats))
+    """
+
+    def __init__(self, array, geometry, is_lonlat_dim=False):
+        """
+        Parameters
+        ----------
+        array : numpy.ndarray
+            2D field on the grid (copied to shared memory)
+        geometry : GridGeometry
+            geometry of the grid
+        is_lonlat_dim : bool
+            grid coordinates are longitude and latitude
+        """
+        array = np.asarray(array)
+        if array.shape != geometry.shape:
+            raise ValueError('Field shape %s does not match grid shape %s'
+                % (array.shape, geometry.shape))
+        self.geometry = geometry
+        self.is_lonlat_dim = is_lonlat_dim
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self.shm = SharedMemory(create=True, size=max(1, array.nbytes))
+        self.owner = True
+        self._finalizer = weakref.finalize(self, _close_segment, self.shm)
+        self.array[...] = array
+
+    @classmethod
+    def from_dataset(cls, ds, var_name, distance=5, **kwargs):
+        """ Read a variable, fill gaps and put it in shared memory
+
+        Parameters
+        ----------
+        ds : GeoDatasetRead
+            source dataset
+        var_name : str
+            name of variable
+        distance : int
+            extrapolation distance (in pixels) to avoid land contamintation
+        kwargs : dict
+            for GeoDatasetRead.get_variable_array and
+            GeoDatasetRead.get_grid_geometry (e.g. time_index, ij_range)
+
+        Returns
+        -------
+        field : SharedField
+        """
+        array = ds.get_variable_array(var_name, **kwargs).astype(float).filled(np.nan)
+        return cls(fill_nan_gaps(array, distance), ds.get_grid_geometry(**kwargs),
+            is_lonlat_dim=ds.is_lonlat_dim)
+
+    def __getstate__(self):
+        return dict(name=self.shm.name, shape=self.shape, dtype=self.dtype.str,
+            geometry=self.geometry, is_lonlat_dim=self.is_lonlat_dim)
+
+    def __setstate__(self, state):
+        self.geometry = state['geometry']
+        self.is_lonlat_dim = state['is_lonlat_dim']
+        self.shape = state['shape']
+        self.dtype = np.dtype(state['dtype'])
+        self.owner = False
+        self.shm = _attach_segment(state['name'])
+        self._finalizer = weakref.finalize(self, _close_segment, self.shm)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+    @property
+    def array(self):
+        """ Zero-copy view of the field
+
+        Returns
+        -------
+        array : numpy.ndarray
+        """
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @cached_property
+    def projection(self):
+        """ Projection of the grid
+
+        Returns
+        -------
+        projection : pyproj.Proj
+        """
+        return pyproj.Proj(self.geometry.crs)
+
+    def close(self):
+        """ Close access to shared memory in this process """
+        self._finalizer.detach()
+        self.shm.close()
+
+    def unlink(self):
+        """ Remove the shared memory segment (call once, in the owner process) """
+        self.shm.unlink()
+
+    def interp_to_points(self, lon, lat, fill_value=np.nan, block_size=None, order=None):
+        """ Interpolate the field to points (same as GeoDatasetRead.interp_to_points)
+
+        Parameters
+        ----------
+        lon : numpy.ndarray
+            longitudes of points
+        lat : numpy.ndarray
+            latitudes of points
+        fill_value : float
+            value for filling out of bound regions
+        block_size : int
+            number of points projected and interpolated at once (all points if None)
+        order : str
+            order points of each block along a space-filling curve ('morton' or 'hilbert')
+
+        Returns
+        -------
+        values : numpy.ndarray
+            values interpolated to points
+        """
+        project = None if self.is_lonlat_dim else self.projection
+        return interp_field(self.geometry, self.array, lon, lat, project=project,
+            fill_value=fill_value, block_size=block_size, order=order)
+
+    def interp_to_xy(self, x, y, crs=None, fill_value=np.nan, block_size=None, order=None):
+        """ Interpolate the field to points with projected coordinates
+        (same as GeoDatasetRead.interp_to_xy)
+
+        Parameters
+        ----------
+        x : numpy.ndarray
+            x coordinates of points
+        y : numpy.ndarray
+            y coordinates of points
+        crs : pyproj.CRS, pyproj.Proj, str or int
+            CRS of the coordinates (None for the CRS of the grid)
+        fill_value : float
+            value for filling out of bound regions
+        block_size : int
+            number of points projected and interpolated at once (all points if None)
+        order : str
+            order points of each block along a space-filling curve ('morton' or 'hilbert')
+
+        Returns
+        -------
+        values : numpy.ndarray
+            values interpolated to points
+        """
+        project = None
+        if crs is not None:
+            def project(x, y):
+                return transform_points(x, y, crs, self.geometry.crs)
+        return interp_field(self.geometry, self.array, x, y, project=project,
+            fill_value=fill_value, block_size=block_size, order=order)
+
+    def get_var_for_nextsim(self, nbo, on_elements=True, fill_value=np.nan):
+        """ Interpolate the field onto mesh from NextsimBin object
+        (same as GeoDatasetRead.get_var_for_nextsim)
+
+        Parameters
+        ----------
+        nbo : NextsimBin
+            nextsim bin object with mesh_info attribute
+        on_elements : bool
+            perform interpolation on elements or nodes?
+        fill_value : float
+            value for filling out of bound regions
+
+        Returns
+        -------
+        values : 1D numpy.ndarray
+            values interpolated on nextsim mesh
+        """
+        nb_x = nbo.mesh_info.nodes_x
+        nb_y = nbo.mesh_info.nodes_y
+        if on_elements:
+            t = nbo.mesh_info.indices
+            nb_x, nb_y = [i[t].mean(axis=1) for i in [nb_x, nb_y]]
+        return self.interp_to_xy(nb_x, nb_y, crs=nbo.mesh_info.projection.pyproj,
+            fill_value=fill_value)
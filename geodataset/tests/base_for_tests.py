@@ -1,6 +1,9 @@
 import os
 import unittest
+
+from netCDF4 import Dataset
 import numpy as np
+import pyproj
 
 class BaseForTests(unittest.TestCase):
     ''' Base class for tests '''
@@ -361,3 +364,60 @@ class BaseForTests(unittest.TestCase):
         for i, it in enumerate(lst):
             if i>0:
                 self.assertTrue(it<lst[i-1])
+
+
+def create_test_file(filename, nt=3, ny=20, nx=30, dx=25e3, lonlat=True,
+        compressed=True, format='NETCDF4'):
+    '''
+    Create a small netCDF file on a polar stereographic grid (EPSG:3411)
+
+    Parameters:
+    -----------
+    filename : str
+        name of output file
+    nt, ny, nx : int
+        size of time, y and x dimensions
+    dx : float
+        grid spacing (m)
+    lonlat : bool
+        write 2D lon, lat variables
+    compressed : bool
+        compress data variable
+    format : str
+        netCDF format
+
+    Returns:
+    --------
+    data : numpy.ndarray
+        values of variable 'sic' with shape (nt, ny, nx) and NaN for missing values
+    '''
+    proj = pyproj.Proj(3411)
+    x = -1.5e6 + dx * np.arange(nx)
+    y = 1e6 - dx * np.arange(ny)
+    x_grd, y_grd = np.meshgrid(x, y)
+    data = (np.sin(x_grd / 3e5) * np.cos(y_grd / 2e5))[None] + np.arange(nt)[:, None, None]
+    data[:, :3, :3] = np.nan
+    with Dataset(filename, 'w', format=format) as ds:
+        ds.createDimension('time', None)
+        ds.createDimension('y', ny)
+        ds.createDimension('x', nx)
+        tvar = ds.createVariable('time', 'f8', ('time',))
+        tvar.setncatts(dict(units='days since 2020-01-01', calendar='standard'))
+        tvar[:] = np.arange(nt)
+        for name, vec in [('x', x), ('y', y)]:
+            var = ds.createVariable(name, 'f8', (name,))
+            var.setncatts(dict(standard_name='projection_%s_coordinate' % name, units='m'))
+            var[:] = vec
+        gm_var = ds.createVariable('crs', 'i1')
+        gm_var.setncatts(proj.crs.to_cf())
+        if lonlat:
+            lon, lat = proj(x_grd, y_grd, inverse=True)
+            for name, std_name, vals in [('lon', 'longitude', lon), ('lat', 'latitude', lat)]:
+                var = ds.createVariable(name, 'f8', ('y', 'x'))
+                var.setncattr('standard_name', std_name)
+                var[:] = vals
+        var = ds.createVariable('sic', 'f4', ('time', 'y', 'x'),
+            zlib=compressed, fill_value=np.float32(-999))
+        var.setncatts(dict(grid_mapping='crs', units='1'))
+        var[:] = np.ma.masked_invalid(data)
+    return data
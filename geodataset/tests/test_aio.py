@@ -0,0 +1,83 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from geodataset import aio
+from geodataset.aio import interp_to_points_async, open_netcdf_async, read_async
+from geodataset.custom_geodataset import NERSCDeformation
+from geodataset.geodataset import GeoDatasetRead
+from geodataset.parallel import close_worker_datasets
+from geodataset.tests.base_for_tests import create_test_file
+
+
+class AioTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'test.nc')
+        self.data = create_test_file(self.filename)
+        self.filename2 = os.path.join(tmpdir.name, 'arctic_2km_deformation_20200101T000000.nc')
+        create_test_file(self.filename2, lonlat=False)
+        self.executor = ThreadPoolExecutor(2)
+        self.addCleanup(self.executor.shutdown)
+        self.addCleanup(aio._detected_classes.clear)
+        self.addCleanup(close_worker_datasets)
+
+    def test_open_netcdf_async(self):
+        async def run():
+            return await asyncio.gather(
+                open_netcdf_async(self.filename, self.executor),
+                open_netcdf_async(self.filename2, self.executor))
+        ds1, ds2 = asyncio.run(run())
+        self.assertIs(ds1.cls, GeoDatasetRead)
+        self.assertIs(ds2.cls, NERSCDeformation)
+        self.assertTrue(ds1.lock)
+
+    def test_read_and_interpolate(self):
+        lon, lat = np.array([-30., -20.]), np.array([75., 80.])
+        async def run():
+            ds = await open_netcdf_async(self.filename, self.executor)
+            return await asyncio.gather(
+                ds.read_async('sic', time_index=1, ij_range=(0, 10, 5, 20)),
+                read_async(self.filename2, 'sic', time_index=2, executor=self.executor),
+                interp_to_points_async(self.filename, 'sic', lon, lat, executor=self.executor),
+                ds.call_async('get_lonlat_arrays', ij_range=(0, 2, 0, 3)))
+        a1, a2, values, lonlat = asyncio.run(run())
+        np.testing.assert_allclose(a1.filled(np.nan), self.data[1, :10, 5:20], rtol=1e-6)
+        np.testing.assert_allclose(a2.filled(np.nan), self.data[2], rtol=1e-6)
+        with GeoDatasetRead(self.filename) as ds:
+            np.testing.assert_array_equal(values, ds.interp_to_points('sic', lon, lat))
+        self.assertEqual(lonlat[0].shape, (2, 3))
+
+    def test_process_pool(self):
+        with ProcessPoolExecutor(1) as executor:
+            a = asyncio.run(read_async(self.filename, 'sic', executor=executor))
+        np.testing.assert_allclose(a.filled(np.nan), self.data[0], rtol=1e-6)
+
+    def test_cancel(self):
+        executor = ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        event = threading.Event()
+        async def run():
+            ds = await open_netcdf_async(self.filename, executor)
+            blocker = asyncio.get_running_loop().run_in_executor(executor, event.wait)
+            task = asyncio.create_task(ds.read_async('sic'))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            event.set()
+            await blocker
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # executor is still usable
+            return await ds.read_async('sic')
+        a = asyncio.run(run())
+        self.assertEqual(a.shape, (20, 30))
+
+
+if __name__ == "__main__":
+    unittest.main()
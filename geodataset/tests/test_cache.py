@@ -0,0 +1,143 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from geodataset import cache
+from geodataset.cache import CacheRegistry, CacheView, get_object_size, parse_size
+
+
+class CacheFunctionsTest(unittest.TestCase):
+    def test_parse_size(self):
+        self.assertEqual(parse_size(1000), 1000)
+        self.assertEqual(parse_size('1000'), 1000)
+        self.assertEqual(parse_size('512M'), 512 * 2**20)
+        self.assertEqual(parse_size('1.5g'), 3 * 2**29)
+        self.assertEqual(parse_size('2GB'), 2 * 2**30)
+
+    def test_get_object_size(self):
+        a = np.zeros(1000)
+        self.assertEqual(get_object_size(a), 8000)
+        self.assertGreater(get_object_size((a, a[:10])), 8080)
+        self.assertGreater(get_object_size(dict(a=a)), 8000)
+        self.assertLess(get_object_size('abc'), 100)
+
+
+class CacheRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = CacheRegistry(budget=8000, min_free_memory=0)
+
+    def test_get_put(self):
+        c = self.registry.get_cache('a')
+        self.assertIs(self.registry.get_cache('a'), c)
+        self.assertIsNone(c.get(1))
+        c[1] = np.zeros(100)
+        self.assertIn(1, c)
+        self.assertEqual(c[1].shape, (100,))
+        with self.assertRaises(KeyError):
+            c[2]
+        self.assertEqual(self.registry.usage(),
+            dict(a=dict(entries=1, nbytes=800, hits=1, misses=2)))
+        c[1] = np.zeros(10)
+        self.assertEqual(c.nbytes, 80)
+        self.assertEqual(c.pop(1).size, 10)
+        self.assertEqual(len(c), 0)
+        self.assertEqual(self.registry.nbytes, 0)
+
+    def test_lru_eviction_across_caches(self):
+        evicted = []
+        c1 = self.registry.get_cache('c1', on_evict=evicted.append)
+        c2 = self.registry.get_cache('c2')
+        c1[1] = np.zeros(400)
+        c2[1] = np.zeros(400)
+        c1.get(1)
+        c2[2] = np.zeros(400)
+        # c2[1] was the least recently used
+        self.assertEqual(c2.keys(), [2])
+        self.assertEqual(c1.keys(), [1])
+        self.assertEqual(evicted, [])
+        c2[3] = np.zeros(400)
+        self.assertEqual(len(evicted), 1)
+        self.assertEqual(len(c1), 0)
+        self.assertLessEqual(self.registry.nbytes, self.registry.budget)
+
+    def test_too_large_value_is_not_cached(self):
+        c = self.registry.get_cache('a')
+        c[1] = np.zeros(1001)
+        self.assertNotIn(1, c)
+
+    def test_max_entries_and_not_evictable(self):
+        closed = []
+        handles = self.registry.get_cache('handles', max_entries=2, on_evict=closed.append,
+            evictable=False)
+        data = self.registry.get_cache('data')
+        for i in range(3):
+            handles[i] = np.zeros(1000)
+        self.assertEqual(handles.keys(), [1, 2])
+        self.assertEqual(len(closed), 1)
+        data[0] = np.zeros(1000)
+        # only evictable values count in the budget
+        self.assertEqual(handles.keys(), [1, 2])
+        self.assertEqual(data.keys(), [0])
+        # datasets that may be in use are only cleared by name
+        self.registry.clear()
+        self.assertEqual(len(data), 0)
+        self.assertEqual(handles.keys(), [1, 2])
+        self.registry.clear('handles')
+        self.assertEqual(len(closed), 3)
+        self.assertEqual(self.registry.nbytes, 0)
+
+    def test_low_memory(self):
+        c = self.registry.get_cache('a')
+        for i in range(4):
+            c[i] = np.zeros(100)
+        self.registry.min_free_memory = 2**20
+        with patch('geodataset.cache.get_available_memory', return_value=2**19):
+            c[4] = np.zeros(100)
+        self.assertNotIn(4, c)
+        self.assertEqual(c.keys(), [2, 3])
+
+    def test_available_memory_ttl(self):
+        self.registry.min_free_memory = 2**20
+        c = self.registry.get_cache('a')
+        with patch('geodataset.cache.get_available_memory', return_value=2**21) as gam:
+            for i in range(4):
+                c[i] = np.zeros(10)
+            self.assertEqual(gam.call_count, 1)
+            self.registry.available_memory_ttl = 0
+            c[4] = np.zeros(10)
+            self.assertEqual(gam.call_count, 2)
+        self.registry.min_free_memory = 0
+        with patch('geodataset.cache.get_available_memory') as gam:
+            c[5] = np.zeros(10)
+        gam.assert_not_called()
+
+    def test_cache_view(self):
+        c = self.registry.get_cache('a')
+        v1, v2 = CacheView(c), CacheView(c)
+        v1['x'] = np.zeros(100)
+        v2['x'] = np.ones(100)
+        self.assertIn('x', v1)
+        self.assertEqual(v1['x'][0], 0)
+        self.assertEqual(v2.get('x')[0], 1)
+        self.assertIsNone(v1.get('y'))
+        self.assertEqual(c.nbytes, 1600)
+        v1.clear()
+        self.assertNotIn('x', v1)
+        self.assertEqual(v2.keys(), ['x'])
+        self.assertEqual(len(c), 1)
+
+    def test_set_cache_budget(self):
+        budget = cache.get_cache_budget()
+        self.addCleanup(cache.set_cache_budget, budget)
+        c = cache.get_cache('test_set_cache_budget')
+        self.addCleanup(cache.clear_caches, 'test_set_cache_budget')
+        c[0] = np.zeros(1000)
+        self.assertEqual(cache.cache_usage()['test_set_cache_budget']['nbytes'], 8000)
+        cache.set_cache_budget('4K')
+        self.assertEqual(cache.get_cache_budget(), 4096)
+        self.assertEqual(len(c), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
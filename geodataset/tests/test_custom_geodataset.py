@@ -3,6 +3,7 @@ import glob
 from mock import patch, call, Mock, MagicMock, DEFAULT
 import os
 import subprocess
+import tempfile
 import unittest
 
 from netCDF4 import Dataset
@@ -61,6 +62,20 @@ class UniBremenAlbedoMPFTest(BaseForTests):
         obj = UniBremenAlbedoMPF()
         self.assertEqual(obj.datetimes, [dto])
 
+    def test_get_bbox(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        filename = os.path.join(tmpdir.name, 'mpd1_20230501.nc')
+        with Dataset(filename, 'w') as ds:
+            ds.createDimension('y', 896)
+            ds.createDimension('x', 608)
+            ds.createVariable('mpf', 'f4', ('y', 'x'))
+        with UniBremenAlbedoMPF(filename) as ds:
+            self.assertFalse(ds.is_lonlat_dim)
+            self.assertIsNone(ds.xy_coordinate_names)
+            bbox = ds.get_bbox(ds.projection)
+        np.testing.assert_allclose(bbox, [-3843750, 3743750, -5343750, 5843750], atol=1)
+
 
 class NERSCProductBaseTest(BaseForTests):
 
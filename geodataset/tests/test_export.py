@@ -0,0 +1,97 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from netCDF4 import Dataset
+import numpy as np
+
+from geodataset.export import export_file, export_files
+
+
+def produce_data(spec):
+    """ Fill data of all variables with the time value """
+    t = spec['time']['data'][0]
+    for var_spec in spec['variables'].values():
+        var_spec['data'] = np.full((1, 20, 30), t, dtype=np.float32)
+    return spec
+
+
+def produce_error(spec):
+    raise ValueError('no data')
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+
+    def get_spec(self, t):
+        return dict(
+            grid_mapping_variable='crs',
+            time=dict(data=[t], atts=dict(units='days since 2020-01-01')),
+            xy=dict(x=np.arange(30) * 1e3, y=np.arange(20) * 1e3),
+            variables=dict(sic=dict(dims=('time', 'y', 'x'), atts={})),
+        )
+
+    def get_jobs(self, n, producer=produce_data):
+        return [(os.path.join(self.tmpdir, 'out_%02d.nc' % t), self.get_spec(t), producer)
+            for t in range(n)]
+
+    def test_export_file(self):
+        filename = os.path.join(self.tmpdir, 'out.nc')
+        export_file(filename, self.get_spec(3), produce_data, format='NETCDF4_CLASSIC')
+        self.assertEqual(os.listdir(self.tmpdir), ['out.nc'])
+        with Dataset(filename) as ds:
+            self.assertEqual(ds.data_model, 'NETCDF4_CLASSIC')
+            np.testing.assert_array_equal(ds['sic'][:], 3)
+
+    def test_export_file_error(self):
+        filename = os.path.join(self.tmpdir, 'out.nc')
+        spec = self.get_spec(3)
+        spec['variables']['sic']['data'] = np.zeros((2, 2))
+        with self.assertRaises(ValueError):
+            export_file(filename, spec)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_export_files(self):
+        jobs = self.get_jobs(5)
+        jobs[2] = jobs[2][:2] + (produce_error,)
+        for executor in ['process', 'thread']:
+            with self.subTest(executor=executor):
+                report = export_files(iter(jobs), executor=executor, max_workers=2)
+                self.assertEqual(sorted(report['written']),
+                    [job[0] for job in jobs if job[2] is produce_data])
+                self.assertEqual([f[0] for f in report['failed']], [jobs[2][0]])
+                self.assertIn('ValueError: no data', report['failed'][0][1])
+                self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                    ['out_00.nc', 'out_01.nc', 'out_03.nc', 'out_04.nc'])
+                with Dataset(jobs[4][0]) as ds:
+                    np.testing.assert_array_equal(ds['sic'][:], 4)
+
+    def test_export_files_max_in_flight(self):
+        active = []
+        max_active = []
+        lock = threading.Lock()
+        def producer(spec):
+            with lock:
+                active.append(1)
+                max_active.append(len(active))
+            spec = produce_data(spec)
+            with lock:
+                active.pop()
+            return spec
+        pulled = []
+        def jobs():
+            for job in self.get_jobs(6, producer):
+                pulled.append(job[0])
+                yield job
+        report = export_files(jobs(), executor='thread', max_workers=3, max_in_flight=1)
+        self.assertEqual(len(report['written']), 6)
+        self.assertEqual(max(max_active), 1)
+        self.assertEqual(report['written'], pulled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,8 @@ import glob
 from mock import patch, call, Mock, MagicMock, DEFAULT
 import os
 import subprocess
+import tempfile
+from types import SimpleNamespace
 import unittest
 
 from netCDF4 import Dataset
@@ -10,9 +12,12 @@ import numpy as np
 import pyproj
 from pyproj.exceptions import CRSError
 
+from geodataset.cache import clear_caches
 from geodataset.geodataset import GeoDatasetBase, GeoDatasetWrite, GeoDatasetRead
+from geodataset.grid_geometry import GridGeometry
 from geodataset.utils import InvalidDatasetError
-from geodataset.tests.base_for_tests import BaseForTests
+from geodataset.custom_geodataset import NERSCDeformation
+from geodataset.tests.base_for_tests import BaseForTests, create_test_file
 
 
 class GeodatasetTestBase(BaseForTests):
@@ -49,6 +54,25 @@ class GeoDatasetBaseTest(GeodatasetTestBase):
         self.assertTrue(np.all(dtimes==dto))
         self.assertIsInstance(dtimes, np.ndarray)
 
+    @patch.multiple(GeoDatasetBase, __init__=MagicMock(return_value=None), variables=DEFAULT)
+    @patch('geodataset.geodataset.vars')
+    def test_convert_time_data_calendars(self, mock_vars, **kwargs):
+        tdata = np.array([[1, 2], [366, 0]])
+        nc = GeoDatasetBase()
+        nc.time_name = 'time_name'
+        nc.variables = dict(time_name='ncvar')
+        for calendar, expected in [
+                ('standard', [(2000, 2, 29), (2000, 3, 1), (2001, 2, 28), (2000, 2, 28)]),
+                ('noleap', [(2000, 3, 1), (2000, 3, 2), (2001, 3, 1), (2000, 2, 28)]),
+                ('360_day', [(2000, 2, 29), (2000, 2, 30), (2001, 3, 4), (2000, 2, 28)]),
+                ]:
+            with self.subTest(calendar=calendar):
+                mock_vars.return_value = dict(units='days since 2000-02-28', calendar=calendar)
+                dtimes = nc.convert_time_data(tdata)
+                self.assertEqual(dtimes.shape, (2, 2))
+                self.assertEqual([(t.year, t.month, t.day) for t in dtimes.flat], expected)
+                self.assertEqual(nc.convert_time_data(np.zeros((0,))).shape, (0,))
+
 
 class GeoDatasetWriteTest(GeodatasetTestBase):
     @patch.multiple(GeoDatasetWrite, __init__=MagicMock(return_value=None), dimensions=DEFAULT)
@@ -251,6 +275,278 @@ class GeoDatasetWriteTest(GeodatasetTestBase):
                 ]
         self.assert_mock_has_calls(kwargs['createVariable'], req_calls)
 
+    @patch.multiple(GeoDatasetWrite,
+            __init__=MagicMock(return_value=None),
+            dimensions=DEFAULT,
+            )
+    def test_get_variable_kwargs(self, **kwargs):
+        nc = GeoDatasetWrite()
+        nc.dimensions = dict(
+            time=MagicMock(**{'isunlimited.return_value': True}),
+            y=MagicMock(**{'isunlimited.return_value': False, '__len__.return_value': 2000}),
+            x=MagicMock(**{'isunlimited.return_value': False, '__len__.return_value': 10}),
+            )
+        dims = ('time', 'y', 'x')
+        self.assertEqual(nc.get_variable_kwargs(dims), dict(zlib=True))
+        self.assertEqual(nc.get_variable_kwargs(dims, 'map-access'), dict(
+            zlib=True, complevel=4, shuffle=True, chunksizes=[1, 1024, 10]))
+        self.assertEqual(nc.get_variable_kwargs(dims, 'timeseries-access'), dict(
+            zlib=True, complevel=4, shuffle=True, chunksizes=[256, 32, 10]))
+        # time dimension with fixed size
+        nc.dimensions['time'] = MagicMock(
+            **{'isunlimited.return_value': False, '__len__.return_value': 5})
+        self.assertEqual(nc.get_variable_kwargs(dims, 'timeseries-access')['chunksizes'],
+            [5, 32, 10])
+        nc.write_profile = dict(complevel=2, least_significant_digit=3)
+        self.assertEqual(nc.get_variable_kwargs(dims), dict(zlib=True, complevel=2))
+        self.assertEqual(nc.get_variable_kwargs(dims, is_data=True), dict(
+            zlib=True, complevel=2, least_significant_digit=3))
+
+
+class GeoDatasetWriteFileTest(GeodatasetTestBase):
+    """ Tests writing small files """
+    def setUp(self):
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        self.x = np.arange(40) * 1e3
+        self.y = np.arange(30) * 1e3
+        self.data = np.random.uniform(size=(5, 30, 40)).astype(np.float32)
+
+    def write_file(self, filename, **kwargs):
+        with GeoDatasetWrite(filename, 'w') as nc:
+            nc.grid_mapping_variable = 'crs'
+            nc.set_time_variable(np.arange(5), dict(units='days since 2020-01-01'))
+            nc.set_xy_dims(self.x, self.y)
+            nc.set_projection_variable()
+            nc.set_variable('sic', self.data, ('time', 'y', 'x'), {}, **kwargs)
+
+    def test_set_variable_profile(self):
+        filename = os.path.join(self.tmpdir, 'profile.nc')
+        self.write_file(filename, profile='timeseries-access', least_significant_digit=2)
+        with Dataset(filename) as ds:
+            self.assertEqual(ds['sic'].chunking(), [256, 30, 32])
+            self.assertEqual(ds['sic'].filters()['complevel'], 4)
+            self.assertTrue(ds['sic'].filters()['shuffle'])
+            np.testing.assert_allclose(ds['sic'][:], self.data, atol=1e-2)
+
+    def test_write_profile(self):
+        filename = os.path.join(self.tmpdir, 'profile.nc')
+        GeoDatasetWrite.write_profile = 'map-access'
+        self.addCleanup(setattr, GeoDatasetWrite, 'write_profile', None)
+        self.write_file(filename)
+        with Dataset(filename) as ds:
+            self.assertEqual(ds['sic'].chunking(), [1, 30, 40])
+            np.testing.assert_array_equal(ds['sic'][:], self.data)
+
+    def test_set_variable_pack(self):
+        filename = os.path.join(self.tmpdir, 'packed.nc')
+        self.data[0, 0, :3] = np.nan
+        self.write_file(filename, pack=dict(valid_range=(0, 1), precision=1e-4))
+        with Dataset(filename) as ds:
+            var = ds['sic']
+            self.assertEqual(var.dtype, np.int16)
+            self.assertEqual(var._FillValue, -32768)
+            self.assertAlmostEqual(var.scale_factor, 1e-4)
+            self.assertAlmostEqual(var.add_offset, .5)
+            self.assertEqual(var.grid_mapping, 'crs')
+            sic = var[:]
+        self.assertTrue(np.all(sic.mask[0, 0, :3]))
+        self.assertEqual(sic.mask.sum(), 3)
+        np.testing.assert_allclose(sic.filled(np.nan), self.data, atol=1e-4)
+
+    def test_set_variable_pack_valid_limits(self):
+        filename = os.path.join(self.tmpdir, 'packed.nc')
+        data = np.arange(5.)
+        with GeoDatasetWrite(filename, 'w') as nc:
+            nc.grid_mapping_variable = 'crs'
+            nc.createDimension('n', 5)
+            nc.set_variable('a', data, ('n',), dict(valid_min=0., valid_max=4.), pack=True)
+            nc.set_variable('b', data, ('n',), dict(valid_range=[1., 3.]), pack=True)
+        with Dataset(filename) as ds:
+            self.assertEqual(ds['a'].valid_min.dtype, np.int16)
+            a = ds['a'][:]
+            b = ds['b'][:]
+        self.assertFalse(np.ma.is_masked(a))
+        np.testing.assert_allclose(a, data, atol=1e-3)
+        np.testing.assert_array_equal(b.mask, [True, False, False, False, True])
+        np.testing.assert_allclose(b[1:4], data[1:4], atol=1e-3)
+
+    def test_append_time_steps(self):
+        filename = os.path.join(self.tmpdir, 'append.nc')
+        time_atts = dict(units='days since 2020-01-01')
+        with GeoDatasetWrite(filename, 'w') as nc:
+            nc.grid_mapping_variable = 'crs'
+            nc.set_time_variable(None, time_atts)
+            nc.set_time_bnds_variable(time_atts, None)
+            nc.set_xy_dims(self.x, self.y)
+            nc.set_variable('sic', None, ('time', 'y', 'x'), {})
+            nc.set_variable('sit', None, ('time', 'y', 'x'), {},
+                pack=dict(valid_range=(0, 1), precision=1e-4))
+            self.assertEqual(nc.n_time_steps, 0)
+            for i in range(2):
+                time_index = nc.append_time_steps(i, dict(sic=self.data[i], sit=self.data[i]),
+                    time_bnds_data=[i, i + 1])
+                self.assertEqual(time_index, i)
+        with GeoDatasetWrite(filename, 'a') as nc:
+            self.assertEqual(nc.n_time_steps, 2)
+            time_index = nc.append_time_steps(np.arange(2, 5),
+                dict(sic=self.data[2:], sit=self.data[2:]),
+                time_bnds_data=np.stack([np.arange(2, 5), np.arange(3, 6)], axis=1), sync=True)
+            self.assertEqual(time_index, 2)
+            self.assertEqual(nc.n_time_steps, 5)
+        with Dataset(filename) as ds:
+            np.testing.assert_array_equal(ds['time'][:], np.arange(5))
+            np.testing.assert_array_equal(ds['time_bnds'][:, 1], np.arange(1, 6))
+            np.testing.assert_array_equal(ds['sic'][:], self.data)
+            self.assertEqual(ds['sit'].dtype, np.int16)
+            np.testing.assert_allclose(ds['sit'][:], self.data, atol=1e-4)
+
+    def test_n_time_steps_interrupted(self):
+        filename = os.path.join(self.tmpdir, 'append.nc')
+        with GeoDatasetWrite(filename, 'w') as nc:
+            nc.grid_mapping_variable = 'crs'
+            nc.set_time_variable(None, dict(units='days since 2020-01-01'))
+            nc.set_xy_dims(self.x, self.y)
+            nc.set_variable('sic', None, ('time', 'y', 'x'), {})
+            nc.append_time_steps(0, dict(sic=self.data[0]))
+            # data is written but time is not
+            nc['sic'][1] = self.data[1]
+        with GeoDatasetWrite(filename, 'a') as nc:
+            self.assertEqual(nc.n_time_steps, 1)
+            self.assertEqual(nc.append_time_steps(1, dict(sic=self.data[1])), 1)
+
+    def get_spec(self):
+        return dict(
+            grid_mapping_variable='crs',
+            time=dict(data=np.arange(5), atts=dict(units='days since 2020-01-01')),
+            time_bnds=np.stack([np.arange(5), np.arange(1, 6)], axis=1),
+            xy=dict(x=self.x, y=self.y),
+            lonlat=dict(lon=np.zeros((30, 40)), lat=np.ones((30, 40))),
+            variables=dict(
+                sic=dict(data=self.data, dims=('time', 'y', 'x'), atts=dict(units='1')),
+                sit=dict(data=lambda: self.data * 2, dims=('time', 'y', 'x'), atts={},
+                    profile='map-access'),
+                sst=dict(data=self.data + 270, dims=('time', 'y', 'x'), atts={},
+                    pack=dict(precision=1e-3)),
+            ),
+        )
+
+    def test_define_from_spec(self):
+        filename = os.path.join(self.tmpdir, 'spec.nc')
+        with GeoDatasetWrite(filename, 'w') as nc:
+            writes = nc.define_from_spec(self.get_spec())
+            self.assertEqual([w[0] for w in writes],
+                ['time', 'time_bnds', 'x', 'y', 'longitude', 'latitude', 'sic', 'sit', 'sst'])
+            self.assertEqual(len(nc.dimensions['time']), 0)
+            self.assertTrue(nc['x'][:].mask.all())
+            self.assertEqual(nc['sst'].dtype, np.int16)
+            self.assertEqual(nc['sit'].chunking(), [1, 30, 40])
+
+    def test_set_from_spec(self):
+        filename = os.path.join(self.tmpdir, 'spec.nc')
+        with GeoDatasetWrite(filename, 'w') as nc:
+            nc.set_from_spec(self.get_spec())
+        with Dataset(filename) as ds:
+            self.assertEqual(ds['crs'].grid_mapping_name, 'polar_stereographic')
+            np.testing.assert_array_equal(ds['time'][:], np.arange(5))
+            np.testing.assert_array_equal(ds['time_bnds'][:, 1], np.arange(1, 6))
+            np.testing.assert_array_equal(ds['x'][:], self.x)
+            np.testing.assert_array_equal(ds['latitude'][:], 1)
+            self.assertEqual(ds['sic'].units, '1')
+            self.assertEqual(ds['sic'].grid_mapping, 'crs')
+            np.testing.assert_array_equal(ds['sic'][:], self.data)
+            np.testing.assert_array_equal(ds['sit'][:], self.data * 2)
+            np.testing.assert_allclose(ds['sst'][:], self.data + 270, atol=1e-3)
+
+    def test_set_from_spec_fixed_time_dim(self):
+        spec = dict(
+            grid_mapping_variable='crs',
+            xy=dict(x=self.x, y=self.y),
+            dims=dict(time=5),
+            variables=dict(sic=dict(data=self.data, dims=('time', 'y', 'x'), atts={},
+                profile='timeseries-access')),
+        )
+        filename = os.path.join(self.tmpdir, 'spec.nc')
+        with GeoDatasetWrite(filename, 'w') as nc:
+            nc.set_from_spec(spec)
+        with Dataset(filename) as ds:
+            self.assertEqual(ds['sic'].chunking()[0], 5)
+            np.testing.assert_array_equal(ds['sic'][:], self.data)
+
+    def test_set_from_spec_packed_function(self):
+        spec = self.get_spec()
+        spec['variables']['sit']['pack'] = dict(precision=1e-3)
+        filename = os.path.join(self.tmpdir, 'spec.nc')
+        with GeoDatasetWrite(filename, 'w') as nc:
+            with self.assertRaises(ValueError):
+                nc.define_from_spec(spec)
+            self.assertNotIn('time', nc.variables)
+        spec['variables']['sit']['pack']['valid_range'] = (0, 2)
+        with GeoDatasetWrite(filename, 'w') as nc:
+            nc.set_from_spec(spec)
+        with Dataset(filename) as ds:
+            self.assertEqual(ds['sit'].dtype, np.int16)
+            np.testing.assert_allclose(ds['sit'][:], self.data * 2, atol=1e-3)
+
+    def test_set_grid_from(self):
+        src_filename = os.path.join(self.tmpdir, 'src.nc')
+        create_test_file(src_filename)
+        filename = os.path.join(self.tmpdir, 'clone.nc')
+        with GeoDatasetRead(src_filename) as src, GeoDatasetWrite(filename, 'w') as nc:
+            nc.set_grid_from(src, lonlat='f4', ij_range=(2, 12, 5, 25))
+            nc.set_variable('sic', src['sic'][0, 2:12, 5:25], ('y', 'x'), {})
+            src_lon, src_lat = src.get_lonlat_arrays(ij_range=(2, 12, 5, 25))
+            src_geometry = src.get_grid_geometry(ij_range=(2, 12, 5, 25))
+            src_crs_atts = src['crs'].ncattrs()
+        with GeoDatasetRead(filename) as ds:
+            self.assertEqual(ds.grid_mapping_variable, 'crs')
+            self.assertEqual(ds['crs'].ncattrs(), src_crs_atts)
+            self.assertEqual(ds['longitude'].dtype, np.float32)
+            np.testing.assert_allclose(ds['latitude'][:], src_lat, rtol=1e-6)
+            self.assertEqual(ds.get_grid_geometry(), src_geometry)
+            self.assertEqual(ds['sic'].grid_mapping, 'crs')
+
+    def test_set_grid_from_copies_xy(self):
+        src_filename = os.path.join(self.tmpdir, 'src.nc')
+        create_test_file(src_filename, ny=8, nx=10, dx=62500)
+        x = -3781250 + 62500 * np.arange(10)
+        with Dataset(src_filename, 'r+') as ds:
+            ds['x'][:] = x
+            ds['x'].long_name = 'x coordinate of projection'
+        filename = os.path.join(self.tmpdir, 'clone.nc')
+        with GeoDatasetRead(src_filename) as src, GeoDatasetWrite(filename, 'w') as nc:
+            nc.set_grid_from(src, ij_range=(1, 5, 2, 6))
+        with Dataset(src_filename) as src, Dataset(filename) as ds:
+            np.testing.assert_array_equal(ds['x'][:], x[2:6])
+            np.testing.assert_array_equal(ds['y'][:], src['y'][1:5])
+            for name in ['x', 'y']:
+                self.assertEqual(ds[name].__dict__, src[name].__dict__)
+
+    def test_set_grid_from_geometry(self):
+        filename = os.path.join(self.tmpdir, 'clone.nc')
+        geometry = GridGeometry(pyproj.CRS(3411), self.x, self.y)
+        with GeoDatasetWrite(filename, 'w') as nc:
+            nc.set_grid_from(geometry)
+        with Dataset(filename) as ds:
+            self.assertNotIn('longitude', ds.variables)
+            np.testing.assert_array_equal(ds['x'][:], self.x)
+            self.assertEqual(pyproj.CRS.from_cf(ds['crs'].__dict__), geometry.crs)
+
+    def test_get_grid_spec_lonlat(self):
+        geometry = GridGeometry(pyproj.CRS(4326), np.arange(4.), np.arange(60., 63.))
+        spec = GeoDatasetWrite.get_grid_spec(geometry, lonlat='f8')
+        self.assertEqual(spec['lonlat']['lon'].shape, (3, 4))
+        np.testing.assert_allclose(spec['lonlat']['lat'][:, 0], [60, 61, 62])
+
+    def test_set_variable_pack_no_data(self):
+        with GeoDatasetWrite(os.path.join(self.tmpdir, 'packed.nc'), 'w') as nc:
+            nc.grid_mapping_variable = 'crs'
+            nc.set_xy_dims(self.x, self.y)
+            with self.assertRaises(ValueError):
+                nc.set_variable('sit', None, ('y', 'x'), {}, pack=dict(precision=1e-4))
+
 
 class GeoDatasetReadTest(GeodatasetTestBase):
     def test_init(self):
@@ -432,6 +728,8 @@ class GeoDatasetReadTest(GeodatasetTestBase):
             __init__=MagicMock(return_value=None),
             __exit__=MagicMock(return_value=None),
             get_lonlat_arrays=DEFAULT,
+            projection=pyproj.Proj(4326),
+            is_lonlat_dim=False,
             )
     def test_get_area_euclidean(self, **kwargs):
         p = pyproj.Proj(3411)
@@ -447,6 +745,8 @@ class GeoDatasetReadTest(GeodatasetTestBase):
             __init__=MagicMock(return_value=None),
             __exit__=MagicMock(return_value=None),
             get_lonlat_arrays=DEFAULT,
+            projection=pyproj.Proj(4326),
+            is_lonlat_dim=False,
             )
     def test_get_bbox(self, **kwargs):
         p = pyproj.Proj(3411)
@@ -461,6 +761,72 @@ class GeoDatasetReadTest(GeodatasetTestBase):
             -8418368.037664523, -7832478.150085783],
             1)
 
+    @patch.multiple(GeoDatasetRead,
+            __init__=MagicMock(return_value=None),
+            __exit__=MagicMock(return_value=None),
+            get_lonlat_arrays=DEFAULT,
+            projection=pyproj.Proj(4326),
+            is_lonlat_dim=False,
+            )
+    def test_get_bbox_masked(self, **kwargs):
+        p = pyproj.Proj(3411)
+        mask = [[0, 0, 0], [0, 0, 0], [0, 0, 1]]
+        lon = np.ma.array([[1, 2, 3], [1, 2, 3], [1, 2, -999]], mask=mask)
+        lat = np.ma.array([[1, 1, 1], [2, 2, 2], [3, 3, -999]], mask=lon.mask)
+        GeoDatasetRead.get_lonlat_arrays.return_value = lon, lat
+        with GeoDatasetRead() as ds:
+            bbox = ds.get_bbox(p)
+        x, y = p(lon.compressed(), lat.compressed())
+        np.testing.assert_almost_equal(bbox, [x.min(), x.max(), y.min(), y.max()])
+
+    @patch.multiple(GeoDatasetRead,
+            __init__=MagicMock(return_value=None),
+            __exit__=MagicMock(return_value=None),
+            get_lonlat_arrays=DEFAULT,
+            projection=pyproj.Proj(4326),
+            is_lonlat_dim=False,
+            )
+    def test_get_bbox_perimeter(self, **kwargs):
+        p = pyproj.Proj(3411)
+        lon, lat = np.meshgrid(np.linspace(1, 3, 5), np.linspace(1, 3, 4))
+        def mock_get_lonlat_arrays(ij_range=(None, None, None, None)):
+            i0, i1, j0, j1 = ij_range
+            return lon[i0:i1, j0:j1], lat[i0:i1, j0:j1]
+        GeoDatasetRead.get_lonlat_arrays.side_effect = mock_get_lonlat_arrays
+
+        with GeoDatasetRead() as ds:
+            for ijr in [(None, None, None, None), (1, 3, 1, -1)]:
+                bbox_full = ds.get_bbox(p, ij_range=ijr)
+                bbox_perimeter = ds.get_bbox(p, perimeter=True, ij_range=ijr)
+                np.testing.assert_almost_equal(bbox_full, bbox_perimeter, 1)
+            bbox_densify = ds.get_bbox(p, perimeter=True, densify=3)
+        np.testing.assert_almost_equal(bbox_densify, ds.get_bbox(p), 1)
+
+    @patch.multiple(GeoDatasetRead,
+            __init__=MagicMock(return_value=None),
+            __exit__=MagicMock(return_value=None),
+            get_lonlat_arrays=DEFAULT,
+            projection=pyproj.Proj(4326),
+            is_lonlat_dim=False,
+            )
+    def test_get_bbox_cache(self, **kwargs):
+        p = pyproj.Proj(3411)
+        GeoDatasetRead.get_lonlat_arrays.return_value = (
+            np.array([[1,2,3],[1,2,3],[1,2,3]]),
+            np.array([[1,1,1],[2,2,2],[3,3,3]]))
+
+        with GeoDatasetRead() as ds:
+            bbox1 = ds.get_bbox(p)
+            bbox2 = ds.get_bbox(p)
+            ds.get_bbox(p, ij_range=(0, 2, 0, 2))
+            self.assertEqual(len(ds.bbox_cache), 2)
+            # entries are in the shared cache and cleared with it
+            clear_caches('bboxes')
+            self.assertEqual(len(ds.bbox_cache), 0)
+            ds.get_bbox(p)
+        self.assertEqual(bbox1, bbox2)
+        self.assertEqual(GeoDatasetRead.get_lonlat_arrays.call_count, 3)
+
     @patch.multiple(GeoDatasetRead,
             __init__=MagicMock(return_value=None),
             __exit__=MagicMock(return_value=None),
@@ -499,10 +865,7 @@ class GeoDatasetReadTest(GeodatasetTestBase):
             __init__=MagicMock(return_value=None),
             __exit__=MagicMock(return_value=None),
             projection=pyproj.Proj(3411),
-            get_lonlat_arrays=MagicMock(return_value=(
-                np.array([[0,1],[0,1]]),
-                np.array([[1,1],[0,0]]),
-            )),
+            get_lonlat_arrays=DEFAULT,
             get_variable_array=MagicMock(
                 return_value=np.ma.array([[1,2],[3,4]])),
             is_lonlat_dim=False,
@@ -510,6 +873,9 @@ class GeoDatasetReadTest(GeodatasetTestBase):
     @patch('geodataset.geodataset.fill_nan_gaps')
     def test_get_var_for_nextsim(self, mock_fng, **kwargs):
         mock_fng.return_value = np.array([[1,2],[3,4]])
+        x = np.round(pyproj.Proj(3411)([0, 1], [1, 1])[0], -3)
+        y = np.round(pyproj.Proj(3411)([0, 0], [1, 0])[1], -3)
+        geometry = GridGeometry(pyproj.CRS(3411), x, y)
 
         nbo = MagicMock()
         nbo.mesh_info.nodes_x = np.array([8569000.1, 8569000.2, 8569000.3])
@@ -517,15 +883,189 @@ class GeoDatasetReadTest(GeodatasetTestBase):
         nbo.mesh_info.indices = np.array([[0,1,2],])
         nbo.mesh_info.projection.pyproj = pyproj.Proj(3411)
 
-        kw = dict(time_index=1, ij_range='ijr')
+        kw = dict(time_index=1, ij_range=(0, 2, 0, 2))
         with GeoDatasetRead() as ds:
+            ds.grid_geometry = geometry
             v_pro = ds.get_var_for_nextsim('var_name', nbo, 10, **kw)
 
         self.assertAlmostEqual(v_pro[0], 1.00000402, 1)
-        ds.get_lonlat_arrays.assert_called_once_with(**kw)
+        ds.get_lonlat_arrays.assert_not_called()
         ds.get_variable_array.assert_called_once_with('var_name', **kw)
         mock_fng.assert_called_once()
 
+    @patch.multiple(GeoDatasetRead,
+            __init__=MagicMock(return_value=None),
+            __exit__=MagicMock(return_value=None),
+            get_lonlat_arrays=DEFAULT,
+            projection=pyproj.Proj(3411),
+            is_lonlat_dim=False,
+            xy_coordinate_names=None,
+            )
+    def test_grid_geometry(self, **kwargs):
+        x, y = np.meshgrid(np.arange(5) * 1e4 + 1e5, -np.arange(4) * 2e4 - 1e5)
+        lon, lat = pyproj.Proj(3411)(x, y, inverse=True)
+        def mock_get_lonlat_arrays(ij_range=(None, None, None, None)):
+            i0, i1, j0, j1 = ij_range
+            return lon[i0:i1, j0:j1], lat[i0:i1, j0:j1]
+        GeoDatasetRead.get_lonlat_arrays.side_effect = mock_get_lonlat_arrays
+
+        with GeoDatasetRead() as ds:
+            geometry = ds.grid_geometry
+            self.assertIs(geometry, ds.grid_geometry)
+            self.assertEqual(GeoDatasetRead.get_lonlat_arrays.call_count, 2)
+            np.testing.assert_almost_equal(geometry.x, x[0], 3)
+            np.testing.assert_almost_equal(geometry.y, y[:, 0], 3)
+            self.assertEqual(geometry.shape, (4, 5))
+            self.assertEqual(geometry.y_step, -1)
+            self.assertTrue(geometry.is_regular)
+            x_dims, y_dims = ds.get_xy_dims_from_lonlat()
+            np.testing.assert_almost_equal(x_dims, x[0])
+            self.assertEqual(GeoDatasetRead.get_lonlat_arrays.call_count, 2)
+            # without coordinate variables bbox is computed from longitude and latitude
+            self.assertFalse(ds.is_grid_mapping(pyproj.Proj(3411)))
+            np.testing.assert_almost_equal(
+                ds.get_bbox(pyproj.Proj(3411), ij_range=(1, 3, 1, 3)),
+                [1.1e5, 1.2e5, -1.4e5, -1.2e5], 3)
+
+
+class GeoDatasetReadFileTest(GeodatasetTestBase):
+    """ Tests with small generated files """
+    def setUp(self):
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        self.filename = os.path.join(self.tmpdir, 'test.nc')
+        self.data = create_test_file(self.filename)
+
+    def test_grid_geometry_from_xy_variables(self):
+        filename = os.path.join(self.tmpdir, 'test_xy.nc')
+        create_test_file(filename, ny=8, nx=10, dx=62500)
+        x0, y0 = -3781250, 5781250
+        with Dataset(filename, 'r+') as ds:
+            ds['x'][:] = x0 + 62500 * np.arange(10)
+            ds['y'][:] = y0 - 62500 * np.arange(8)
+            lon, lat = pyproj.Proj(3411)(*np.meshgrid(ds['x'][:], ds['y'][:]), inverse=True)
+            ds['lon'][:] = lon
+            ds['lat'][:] = lat
+        p = pyproj.Proj(3411)
+        with GeoDatasetRead(filename) as ds:
+            self.assertEqual(ds.xy_coordinate_names, ('x', 'y'))
+            geometry = ds.grid_geometry
+            np.testing.assert_array_equal(geometry.x, x0 + 62500 * np.arange(10))
+            np.testing.assert_array_equal(np.diff(geometry.x), 62500)
+            self.assertEqual(ds.get_bbox(p), [x0, x0 + 62500 * 9, y0 - 62500 * 7, y0])
+            self.assertEqual(ds.get_bbox(p, ij_range=(1, 3, 2, 4)),
+                [x0 + 125000, x0 + 187500, y0 - 125000, y0 - 62500])
+            self.assertEqual(ds.get_area_euclidean(p), 62500**2)
+        # e.g. TOPAZ files have x, y in units of 100 km
+        with Dataset(filename, 'r+') as ds:
+            for name in ['x', 'y']:
+                ds[name][:] = ds[name][:] / 1e5
+                ds[name].units = '100 km'
+        with GeoDatasetRead(filename) as ds:
+            np.testing.assert_allclose(ds.grid_geometry.x, x0 + 62500 * np.arange(10))
+
+    def test_interp_to_samples(self):
+        rng = np.random.default_rng(1)
+        with GeoDatasetRead(self.filename) as ds:
+            lon, lat = ds.get_lonlat_arrays()
+            lon, lat = lon[5:15, 5:25].ravel(), lat[5:15, 5:25].ravel()
+            # data is linear in time (+1 per day)
+            expected = ds.interp_to_points('sic', lon, lat, time_index=0)
+            hours = rng.uniform(0, 48, lon.size)
+            hours[:3] = [0, 48, 49]
+            times = [dt.datetime(2020, 1, 1) + dt.timedelta(hours=h) for h in hours]
+            with patch.object(GeoDatasetRead, 'get_variable_array', autospec=True,
+                    side_effect=GeoDatasetRead.get_variable_array) as gva:
+                values = ds.interp_to_samples('sic', lon, lat, times)
+            self.assertEqual(sorted(c.kwargs['time_index'] for c in gva.mock_calls), [0, 1, 2])
+            with self.assertRaises(ValueError):
+                ds.interp_to_samples('sic', lon, lat, times[1:])
+        expected += hours / 24
+        expected[2] = np.nan
+        np.testing.assert_allclose(values, expected, atol=1e-6)
+
+    def test_interp_to_xy(self):
+        proj = pyproj.Proj(3413)
+        with GeoDatasetRead(self.filename) as ds:
+            lon, lat = ds.get_lonlat_arrays()
+            lon, lat = lon[2:18, 3:27].ravel(), lat[2:18, 3:27].ravel()
+            expected = ds.interp_to_points('sic', lon, lat, time_index=1)
+            x, y = ds.projection(lon, lat)
+            np.testing.assert_allclose(ds.interp_to_xy('sic', x, y, time_index=1), expected)
+            x, y = proj(lon, lat)
+            np.testing.assert_allclose(
+                ds.interp_to_xy('sic', x, y, crs=proj, time_index=1), expected)
+            nbo = SimpleNamespace(mesh_info=SimpleNamespace(nodes_x=x, nodes_y=y,
+                projection=SimpleNamespace(pyproj=proj)))
+            np.testing.assert_allclose(ds.get_var_for_nextsim(
+                'sic', nbo, on_elements=False, time_index=1), expected)
+
+    def test_interp_to_points_blocks(self):
+        rng = np.random.default_rng(2)
+        with GeoDatasetRead(self.filename) as ds:
+            lon, lat = ds.get_lonlat_arrays()
+            lon = rng.uniform(lon.min() - 1, lon.max() + 1, (20, 17))
+            lat = rng.uniform(lat.min() - 1, lat.max() + 1, (20, 17))
+            expected = ds.interp_to_points('sic', lon, lat, fill_value=-1)
+            self.assertEqual(expected.shape, (20, 17))
+            for block_size, order in [(7, None), (64, 'morton'), (1000, 'hilbert')]:
+                with patch('pyproj.Proj.__call__', autospec=True,
+                        side_effect=pyproj.Proj.__call__) as proj_call:
+                    values = ds.interp_to_points('sic', lon, lat, fill_value=-1,
+                        block_size=block_size, order=order)
+                np.testing.assert_allclose(values, expected)
+                self.assertLessEqual(max(c.args[1].size for c in proj_call.mock_calls),
+                    block_size)
+            x, y = pyproj.Proj(3413)(lon, lat)
+            np.testing.assert_allclose(ds.interp_to_xy('sic', x, y, crs=3413, fill_value=-1,
+                block_size=50, order='hilbert'), expected)
+
+    def test_to_xarray_1(self):
+        """ test with lon, lat in file """
+        with GeoDatasetRead(self.filename) as ds:
+            xds = ds.to_xarray(chunks={'time': 1, 'y': 10, 'x': 15})
+            lon, lat = ds.get_lonlat_arrays()
+        self.assertEqual(xds.sic.data.chunksize, (1, 10, 15))
+        self.assertIn('lon', xds.coords)
+        self.assertEqual(xds.sic.attrs['grid_mapping'], 'crs')
+        self.assertEqual(pyproj.CRS.from_cf(xds.crs.attrs), pyproj.CRS(3411))
+        np.testing.assert_allclose(xds.sic.values, self.data, rtol=1e-6)
+        np.testing.assert_allclose(xds.lon.values, lon)
+
+    def test_to_xarray_lonlat_and_grid_mapping(self):
+        """ test with a child class wrapping get_lonlat_arrays and with time_bnds """
+        class WrappedLonLat(GeoDatasetRead):
+            def get_lonlat_arrays(self, **kwargs):
+                return super().get_lonlat_arrays(**kwargs)
+
+        with Dataset(self.filename, 'r+') as ds:
+            ds.createDimension('nv', 2)
+            ds.createVariable('time_bnds', 'f8', ('time', 'nv'))[:] = np.zeros((3, 2))
+        with WrappedLonLat(self.filename) as ds, ds.to_xarray(chunks=None) as xds:
+            self.assertEqual(xds.sic.attrs['grid_mapping'], 'crs')
+            self.assertNotIn('grid_mapping', xds.time_bnds.attrs)
+        self.assertIn('lon', xds.coords)
+        self.assertNotIn('longitude', xds.coords)
+
+    def test_to_xarray_2(self):
+        """ test with lon, lat computed by a custom class """
+        filename = os.path.join(self.tmpdir, 'arctic_2km_deformation_20200101T000000.nc')
+        create_test_file(filename, lonlat=False)
+        with NERSCDeformation(filename) as ds:
+            xds = ds.to_xarray(chunks={'y': 7, 'x': 16})
+            lon, lat = ds.get_lonlat_arrays()
+        self.assertEqual(xds.longitude.data.chunks, ((7, 7, 6), (16, 14)))
+        np.testing.assert_allclose(xds.longitude.values, lon)
+        np.testing.assert_allclose(xds.latitude.values, lat)
+        # without chunks
+        with NERSCDeformation(filename) as ds:
+            xds = ds.to_xarray(chunks=None)
+        self.assertEqual(xds.longitude.data.chunks, ((20,), (30,)))
+        np.testing.assert_allclose(xds.latitude.values, lat)
+        np.testing.assert_allclose(xds.sic.values[0], self.data[0], rtol=1e-6)
+
 
 if __name__ == "__main__":
     unittest.main()
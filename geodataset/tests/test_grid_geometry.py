@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+import pyproj
+
+from geodataset.grid_geometry import GridGeometry
+
+
+class GridGeometryTest(unittest.TestCase):
+    def test_init(self):
+        g = GridGeometry(3411, np.arange(5) * 10. + 5, np.arange(3) * -20.)
+        self.assertEqual((g.x0, g.dx, g.nx), (5., 10., 5))
+        self.assertEqual((g.y0, g.dy, g.ny), (0., -20., 3))
+        self.assertEqual((g.x_step, g.y_step), (1, -1))
+        self.assertEqual(g.shape, (3, 5))
+        self.assertEqual(g.area, 200.)
+        self.assertEqual(g.bbox, [5., 45., -40., 0.])
+        self.assertTrue(g.is_regular)
+        self.assertIsInstance(g.crs, pyproj.CRS)
+
+    def test_is_regular(self):
+        g = GridGeometry(3411, np.array([0., 1., 3., 4.]), np.arange(3))
+        self.assertFalse(g.is_regular)
+        g = GridGeometry(3411, np.array([0., 1., 3., 4.]), np.arange(3), tolerance=1)
+        self.assertTrue(g.is_regular)
+
+    def test_fingerprint(self):
+        g1 = GridGeometry(3411, np.arange(5), np.arange(3))
+        g2 = GridGeometry(pyproj.CRS(3411), np.arange(5.), np.arange(3.))
+        g3 = GridGeometry(3413, np.arange(5), np.arange(3))
+        g4 = GridGeometry(3411, np.arange(3), np.arange(5))
+        self.assertEqual(g1.fingerprint, g2.fingerprint)
+        self.assertEqual(g1, g2)
+        self.assertNotEqual(g1.fingerprint, g3.fingerprint)
+        self.assertNotEqual(g1.fingerprint, g4.fingerprint)
+
+    def test_subset(self):
+        g = GridGeometry(3411, np.arange(5), np.arange(3))
+        self.assertIs(g.subset(), g)
+        s = g.subset((1, 3, 2, None))
+        np.testing.assert_array_equal(s.x, [2, 3, 4])
+        np.testing.assert_array_equal(s.y, [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
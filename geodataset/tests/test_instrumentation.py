@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from geodataset import instrumentation
+from geodataset.instrumentation import InstrumentedProj, Stats, count_chunks
+from geodataset.tools import custom_read_classes, open_netcdf
+from geodataset.tests.base_for_tests import create_test_file
+
+
+class InstrumentationTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'test.nc')
+        create_test_file(self.filename, ny=40, nx=50)
+        self.addCleanup(instrumentation.enable, instrumentation.ENABLED)
+        instrumentation.get_global_stats().reset()
+        self.addCleanup(instrumentation.get_global_stats().reset)
+
+    def test_count_chunks(self):
+        self.assertEqual(count_chunks((3, 40, 50), 'contiguous', (0, slice(None))), 1)
+        self.assertEqual(count_chunks((3, 40, 50), [1, 20, 20], (0,)), 6)
+        self.assertEqual(count_chunks((3, 40, 50), [1, 20, 20], (1, slice(19, 21), slice(5, 15))), 2)
+        self.assertEqual(count_chunks((3, 40, 50), [1, 20, 20], (1, slice(5, 5))), 0)
+
+    def test_stats(self):
+        stats = Stats()
+        stats.add_event('projection', 0.5, 10)
+        stats.add_event('projection', 0.25, 5)
+        stats.add_read('sic', 100, 2)
+        d = json.loads(stats.to_json())
+        self.assertEqual(d['events']['projection'], dict(count=2, seconds=.75, items=15))
+        self.assertEqual(d['variables']['sic'], dict(reads=1, bytes=100, chunks=2, seconds=0.))
+
+    def test_disabled(self):
+        instrumentation.enable(False)
+        with open_netcdf(self.filename) as ds:
+            ds.get_variable_array('sic')
+            ds.interp_to_points('sic', np.array([-30.]), np.array([75.]))
+            self.assertNotIsInstance(ds.projection, InstrumentedProj)
+            self.assertEqual(ds.stats.to_dict(), dict(events={}, variables={}))
+        self.assertEqual(instrumentation.get_global_stats().to_dict(), dict(events={}, variables={}))
+
+    def test_enabled(self):
+        instrumentation.enable()
+        with open_netcdf(self.filename) as ds:
+            a = ds.get_variable_array('sic', time_index=1, ij_range=(0, 10, 0, 10))
+            ds.interp_to_points('sic', np.array([-30., -20.]), np.array([75., 80.]))
+            stats = ds.stats.to_dict()
+        self.assertEqual(stats['events']['open']['count'], 1)
+        # grid geometry is read from x, y variables, only the points are projected
+        self.assertEqual(stats['events']['projection']['items'], 2)
+        for name in ['fill_nan_gaps', 'interpolator_build', 'interpolation']:
+            self.assertEqual(stats['events'][name]['count'], 1)
+        self.assertEqual(stats['variables']['sic']['reads'], 2)
+        self.assertEqual(stats['variables']['sic']['bytes'], a.data.nbytes + 40 * 50 * a.itemsize)
+        d = json.loads(instrumentation.dump_json())
+        # the file is opened by each class in open_netcdf
+        self.assertEqual(d['events']['open']['count'], len(custom_read_classes))
+        self.assertEqual(d['events']['detect.GeoDatasetRead']['count'], 1)
+        self.assertEqual(d['events']['detect.Etopo']['count'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pyproj
+
+from geodataset import interpolation
+from geodataset.interpolation import BilinearWeights, get_bilinear_weights
+from geodataset.server import InterpolationServer
+from geodataset.shared import SharedField
+from geodataset.threadsafe import ThreadSafeGeoDatasetRead
+from geodataset.tools import open_netcdf
+from geodataset.utils import fill_nan_gaps
+from geodataset.tests.base_for_tests import create_test_file
+
+
+class BilinearWeightsTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'test.nc')
+        self.data = create_test_file(self.filename)
+        rng = np.random.default_rng(0)
+        # points in and around the grid
+        x = rng.uniform(-1.6e6, -0.7e6, 200)
+        y = rng.uniform(0.5e6, 1.1e6, 200)
+        self.lon, self.lat = pyproj.Proj(3411)(x, y, inverse=True)
+
+    def test_same_as_interp_to_points(self):
+        with open_netcdf(self.filename) as ds:
+            expected = ds.interp_to_points('sic', self.lon, self.lat, time_index=1)
+            x, y = ds.projection(self.lon, self.lat)
+            weights = BilinearWeights(ds.get_grid_geometry(), x, y)
+            field = ds.get_variable_array('sic', time_index=1).astype(float).filled(np.nan)
+        field = fill_nan_gaps(field, 5)
+        values = weights(field)
+        valid = np.isfinite(expected)
+        self.assertTrue(valid.any())
+        np.testing.assert_array_equal(np.isfinite(values), valid)
+        np.testing.assert_allclose(values[valid], expected[valid])
+        with self.assertRaises(ValueError):
+            weights(field[1:])
+
+    def test_get_bilinear_weights_cached(self):
+        self.addCleanup(interpolation._weights_cache.clear)
+        calls = []
+        def get_xy():
+            calls.append(1)
+            return self.lon, self.lat
+        with open_netcdf(self.filename) as ds:
+            geometry = ds.get_grid_geometry()
+        w1 = get_bilinear_weights(geometry, get_xy, key='points')
+        w2 = get_bilinear_weights(geometry, get_xy, key='points')
+        self.assertIs(w1, w2)
+        self.assertEqual(len(calls), 1)
+        self.assertIsNot(get_bilinear_weights(geometry, get_xy), w1)
+        self.assertEqual(len(calls), 2)
+
+    def test_all_paths_same_as_interp_to_points(self):
+        options = [dict(), dict(block_size=37), dict(block_size=50, order='hilbert'),
+            dict(order='morton')]
+        server = InterpolationServer(os.path.join(os.path.dirname(self.filename), 'sock'))
+        self.addCleanup(server.server_close)
+        with open_netcdf(self.filename) as ds, SharedField.from_dataset(
+                ds, 'sic', time_index=1) as field, ThreadSafeGeoDatasetRead(
+                self.filename) as tds:
+            for kw in options:
+                expected = ds.interp_to_points('sic', self.lon, self.lat, time_index=1,
+                    fill_value=-1, **kw)
+                self.assertTrue((expected != -1).any())
+                results = [
+                    tds.interp_to_points('sic', self.lon, self.lat, time_index=1,
+                        fill_value=-1, **kw),
+                    field.interp_to_points(self.lon, self.lat, fill_value=-1, **kw),
+                    server.process(dict(method='interp_to_points', filename=self.filename,
+                        var_name='sic', time_index=1, fill_value=-1, **kw),
+                        [self.lon, self.lat])[1][0],
+                ]
+                for values in results:
+                    np.testing.assert_array_equal(values, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+from netCDF4 import Dataset
+import numpy as np
+
+from geodataset.geodataset import GeoDatasetRead
+from geodataset.memmap import MemoryMappedVariable, get_memmap_variable
+from geodataset.tests.base_for_tests import create_test_file
+
+
+class MemmapTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+
+    def create_file(self, format, compressed=False):
+        filename = os.path.join(self.tmpdir, '%s_%s.nc' % (format, compressed))
+        create_test_file(filename, format=format, compressed=compressed)
+        with Dataset(filename, 'a') as ds:
+            var = ds.createVariable('packed', 'i2', ('y', 'x'), fill_value=np.int16(-32767))
+            var.setncatts(dict(scale_factor=np.float32(0.01), add_offset=np.float32(10),
+                valid_min=np.int16(-100), missing_value=np.int16(-200)))
+            var.set_auto_maskandscale(False)
+            raw = np.arange(var.size, dtype='i2').reshape(var.shape) - 150
+            raw[0, :3] = [-32767, -200, -101]
+            var[:] = raw
+        return filename
+
+    def assert_reads_equal(self, filename, var_names):
+        kwargs = dict(
+            sic=dict(time_index=1, ij_range=(2, 10, None, -3)),
+            packed=dict(ij_range=(None, 5, 1, 20)),
+            lon=dict(),
+        )
+        with GeoDatasetRead(filename) as ds:
+            for var_name in var_names:
+                kw = kwargs[var_name]
+                ds.use_memmap = False
+                a0 = ds.get_variable_array(var_name, **kw)
+                ds.use_memmap = True
+                a = ds.get_variable_array(var_name, **kw)
+                self.assertIsInstance(ds.get_memmap_variable(var_name), MemoryMappedVariable)
+                np.testing.assert_array_equal(np.ma.getmaskarray(a), np.ma.getmaskarray(a0))
+                np.testing.assert_allclose(a.filled(np.nan), a0.filled(np.nan), rtol=1e-6)
+
+    def test_netcdf3(self):
+        filename = self.create_file('NETCDF3_CLASSIC')
+        self.assert_reads_equal(filename, ['sic', 'packed', 'lon'])
+        with GeoDatasetRead(filename) as ds:
+            ds.use_memmap = True
+            lon0 = ds.get_variable_array('lon')
+            lon = ds.get_variable_array('lon')
+            # returned arrays are writable copies
+            lon[lon > 0] = 0
+            np.testing.assert_array_equal(ds.get_variable_array('lon'), lon0)
+            # mapped variables are registered in the shared cache until the file is closed
+            memmap_variables = ds.memmap_variables
+            self.assertEqual(memmap_variables.keys(), ['lon'])
+        self.assertEqual(len(memmap_variables), 0)
+
+    def test_netcdf3_64bit_data(self):
+        filename = self.create_file('NETCDF3_64BIT_DATA')
+        with GeoDatasetRead(filename) as ds:
+            self.assertIsNone(get_memmap_variable(ds, 'lon'))
+            ds.use_memmap = True
+            a = ds.get_variable_array('sic', time_index=1)
+            ds.use_memmap = False
+            np.testing.assert_array_equal(a, ds.get_variable_array('sic', time_index=1))
+
+    def test_netcdf4_contiguous(self):
+        try:
+            import h5py
+        except ImportError:
+            self.skipTest('h5py is not installed')
+        filename = self.create_file('NETCDF4')
+        self.assert_reads_equal(filename, ['packed', 'lon'])
+        with GeoDatasetRead(filename) as ds:
+            # variables with unlimited dimension are chunked
+            self.assertIsNone(get_memmap_variable(ds, 'sic'))
+
+    def test_netcdf4_compressed(self):
+        filename = self.create_file('NETCDF4', compressed=True)
+        with GeoDatasetRead(filename) as ds:
+            self.assertIsNone(get_memmap_variable(ds, 'sic'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import datetime as dt
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from netCDF4 import Dataset
+import numpy as np
+
+from geodataset.geodataset import GeoDatasetRead
+from geodataset.mfgeodataset import MFGeoDatasetRead
+from geodataset.tools import open_mfnetcdf
+from geodataset.tests.base_for_tests import create_test_file
+
+
+class DatetimesFromFile(GeoDatasetRead):
+    @property
+    def datetimes(self):
+        return list(self.convert_time_data(self.variables['time'][:]))
+
+
+class MFGeoDatasetReadTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        self.filenames = []
+        self.data = []
+        for day in range(1, 5):
+            filename = os.path.join(self.tmpdir, 'test_202001%02d.nc' % day)
+            self.data.append(create_test_file(filename, nt=2) + day * 10)
+            with Dataset(filename, 'r+') as ds:
+                ds['time'].units = 'days since 2020-01-%02d' % day
+                ds['time'][:] = [0, .5]
+                ds['sic'][:] = np.ma.masked_invalid(self.data[-1])
+            self.filenames.append(filename)
+        self.data = np.concatenate(self.data)
+
+    def test_datetimes(self):
+        with MFGeoDatasetRead(self.filenames) as ds:
+            self.assertEqual(len(ds.datetimes), 8)
+            self.assertEqual(ds.datetimes[3], dt.datetime(2020, 1, 2, 12))
+            np.testing.assert_array_equal(ds.time_index_map[5], [2, 1])
+            self.assertEqual(ds.get_nearest_date(dt.datetime(2020, 1, 4, 20)),
+                (dt.datetime(2020, 1, 4, 12), 7))
+
+    def test_datetimes_without_opening_members(self):
+        with MFGeoDatasetRead(self.filenames, max_open_files=2) as ds:
+            with patch.object(ds, 'get_member', wraps=ds.get_member) as get_member:
+                datetimes = ds.datetimes
+            self.assertEqual(ds.open_members, {})
+            get_member.assert_called_once_with(0)
+        with MFGeoDatasetRead(self.filenames, cls=DatetimesFromFile) as ds:
+            self.assertEqual(ds.datetimes, datetimes)
+            self.assertEqual(sorted(ds.open_members), [1, 2, 3])
+
+    def test_get_variable_array(self):
+        with MFGeoDatasetRead(self.filenames, max_open_files=2) as ds:
+            for time_index in [0, 3, 6, 7, 2, -1]:
+                a = ds.get_variable_array('sic', time_index=time_index, ij_range=(5, 10, 0, 20))
+                np.testing.assert_allclose(a, self.data[time_index, 5:10, :20])
+                self.assertLessEqual(len(ds.open_members), 2)
+            self.assertEqual(sorted(ds.open_members), [1, 3])
+            with self.assertRaises(IndexError):
+                ds.get_variable_array('sic', time_index=8)
+            lon = ds.get_variable_array('lon')
+            self.assertEqual(lon.shape, (20, 30))
+        self.assertEqual(ds.open_members, {})
+
+    def test_grid_metadata_from_template(self):
+        with MFGeoDatasetRead(self.filenames) as ds, GeoDatasetRead(self.filenames[0]) as ds0:
+            self.assertIs(ds.grid_geometry, ds.template.grid_geometry)
+            self.assertEqual(ds.get_grid_geometry(), ds0.get_grid_geometry())
+            self.assertEqual(ds.projection.crs, ds0.projection.crs)
+            self.assertEqual(ds['sic'].shape, (2, 20, 30))
+            lon, lat = ds.get_lonlat_arrays()
+            np.testing.assert_array_equal(lon, ds0.get_lonlat_arrays()[0])
+            v0 = ds0.interp_to_points('sic', lon[5:7, 5], lat[5:7, 5], time_index=1)
+            v = ds.interp_to_points('sic', lon[5:7, 5], lat[5:7, 5], time_index=7)
+            np.testing.assert_allclose(v, v0 + 30)
+
+    def test_interp_to_samples(self):
+        with MFGeoDatasetRead(self.filenames) as ds:
+            lon, lat = ds.get_lonlat_arrays()
+            lon, lat = lon[10, 10:12], lat[10, 10:12]
+            v0 = ds.interp_to_points('sic', lon, lat, time_index=1)
+            # halfway between the 2nd time step of the 1st file and the 1st one of the 2nd
+            values = ds.interp_to_samples('sic', lon, lat, [dt.datetime(2020, 1, 1, 18)] * 2)
+        # second file is 10 larger, minus 1 from time step index
+        np.testing.assert_allclose(values, v0 + 4.5)
+
+    def test_different_grid(self):
+        create_test_file(self.filenames[2], nx=31)
+        with MFGeoDatasetRead(self.filenames) as ds:
+            with self.assertRaises(ValueError):
+                ds.get_variable_array('sic', time_index=4)
+
+    def test_open_mfnetcdf(self):
+        catalog = os.path.join(self.tmpdir, 'catalog.txt')
+        with open(catalog, 'w') as f:
+            f.write('\n'.join(self.filenames[:2]))
+        with open_mfnetcdf(os.path.join(self.tmpdir, 'test_*.nc')) as ds:
+            self.assertEqual(ds.filenames, self.filenames)
+            self.assertIs(ds.cls, GeoDatasetRead)
+        with open_mfnetcdf(['@' + catalog]) as ds:
+            self.assertEqual(len(ds.datetimes), 4)
+        with self.assertRaises(ValueError):
+            open_mfnetcdf(os.path.join(self.tmpdir, 'missing_*.nc'))
+
+
+if __name__ == "__main__":
+    unittest.main()
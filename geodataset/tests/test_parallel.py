@@ -0,0 +1,126 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from geodataset.geodataset import GeoDatasetRead
+from geodataset import parallel
+from geodataset.parallel import (
+    close_worker_datasets, get_tile_ij_ranges, get_worker_dataset, iter_prefetched, read_variable_tiled)
+from geodataset.tests.base_for_tests import create_test_file
+
+
+class ClosingDataset(GeoDatasetRead):
+    """ Writes the name of the file to CLOSED_FILENAME when it is closed """
+    def close(self):
+        with open(os.environ['CLOSED_FILENAME'], 'w') as f:
+            f.write(self.filename)
+        super().close()
+
+
+def _open_worker_dataset(filename, closed_filename):
+    os.environ['CLOSED_FILENAME'] = closed_filename
+    get_worker_dataset(ClosingDataset, filename)
+
+
+class ParallelTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'test.nc')
+        create_test_file(self.filename, ny=40, nx=50)
+        self.addCleanup(close_worker_datasets)
+
+    def test_get_tile_ij_ranges(self):
+        tiles = get_tile_ij_ranges((3, 20, None, None), (20, 10), (4, 10), (5, 10))
+        self.assertEqual(tiles, [(3, 8, 0, 10), (8, 16, 0, 10), (16, 20, 0, 10)])
+        a = np.zeros((20, 10))
+        for i0, i1, j0, j1 in get_tile_ij_ranges((2, -3, 1, 9), (20, 10), (3, 3), (4, 4)):
+            a[i0:i1, j0:j1] += 1
+        self.assertTrue(np.all(a[2:-3, 1:9] == 1))
+        self.assertEqual(a.sum(), 15 * 8)
+
+    def test_read_variable_tiled(self):
+        ij_range = (3, 37, 5, -2)
+        with GeoDatasetRead(self.filename) as ds:
+            a0 = ds.get_variable_array('sic', time_index=2, ij_range=ij_range)
+        a = read_variable_tiled(GeoDatasetRead, self.filename, 'sic', time_index=2,
+            ij_range=ij_range, tile_shape=(7, 20), max_workers=2)
+        np.testing.assert_array_equal(a.mask, a0.mask)
+        np.testing.assert_array_equal(a.filled(np.nan), a0.filled(np.nan))
+        # threads would only run one after another under NETCDF_LOCK
+        with ThreadPoolExecutor(2) as executor, self.assertRaises(ValueError):
+            read_variable_tiled(GeoDatasetRead, self.filename, 'sic', executor=executor)
+
+    def test_get_variable_array_tiled(self):
+        with GeoDatasetRead(self.filename) as ds, ProcessPoolExecutor(2) as executor:
+            a = ds.get_variable_array_tiled('sic', time_index=1, executor=executor)
+            a0 = ds.get_variable_array('sic', time_index=1)
+        np.testing.assert_array_equal(a.filled(np.nan), a0.filled(np.nan))
+
+    def test_worker_datasets_are_closed(self):
+        closed_filename = self.filename.replace('test.nc', 'closed.txt')
+        with ProcessPoolExecutor(1) as executor:
+            executor.submit(_open_worker_dataset, self.filename, closed_filename).result()
+            self.assertFalse(os.path.exists(closed_filename))
+        with open(closed_filename) as f:
+            self.assertEqual(f.read(), self.filename)
+
+    def test_get_worker_dataset(self):
+        filename2 = self.filename.replace('test.nc', 'test2.nc')
+        create_test_file(filename2)
+        def get_datasets():
+            with patch.object(parallel, 'MAX_WORKER_DATASETS', 1):
+                ds1 = get_worker_dataset(GeoDatasetRead, self.filename)
+                same = ds1 is get_worker_dataset(GeoDatasetRead, self.filename)
+                ds2 = get_worker_dataset(GeoDatasetRead, filename2)
+            return same, ds1.isopen(), list(parallel._thread_datasets.datasets.values())
+        with ThreadPoolExecutor(1) as executor:
+            same, ds1_open, datasets = executor.submit(get_datasets).result()
+        self.assertTrue(same)
+        self.assertFalse(ds1_open)
+        self.assertEqual([ds.filename for ds in datasets], [filename2])
+        datasets[0].close()
+
+    def test_iter_prefetched(self):
+        calls = []
+        def func(item):
+            calls.append(threading.current_thread() is threading.main_thread())
+            if item == 'error':
+                raise ValueError(item)
+            return item * 2
+        self.assertEqual(list(iter_prefetched(func, range(5), prefetch=0)),
+            [(i, i * 2) for i in range(5)])
+        self.assertTrue(all(calls))
+        calls.clear()
+        self.assertEqual(list(iter_prefetched(func, range(5), prefetch=2)),
+            [(i, i * 2) for i in range(5)])
+        self.assertFalse(any(calls))
+        # reading ahead is bounded and stops when the caller stops
+        calls.clear()
+        for item, result in iter_prefetched(func, range(100), prefetch=2):
+            time.sleep(0.05)
+            break
+        self.assertLessEqual(len(calls), 4)
+        with self.assertRaises(ValueError):
+            list(iter_prefetched(func, [1, 'error', 3], prefetch=1))
+
+    def test_iter_time_steps(self):
+        with GeoDatasetRead(self.filename) as ds:
+            steps = list(ds.iter_time_steps(['sic', 'lon'], ij_range=(5, 10, 5, 20), prefetch=2))
+            self.assertEqual([time_index for time_index, _ in steps], [0, 1, 2])
+            for time_index, arrays in steps:
+                a0 = ds.get_variable_array('sic', time_index=time_index, ij_range=(5, 10, 5, 20))
+                np.testing.assert_array_equal(arrays['sic'], a0)
+                self.assertEqual(arrays['lon'].shape, (5, 15))
+            steps = list(ds.iter_time_steps('sic', time_indices=[2, 0], prefetch=0))
+            self.assertEqual([time_index for time_index, _ in steps], [2, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
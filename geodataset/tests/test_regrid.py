@@ -0,0 +1,130 @@
+import datetime as dt
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+import unittest
+from unittest.mock import patch
+
+from netCDF4 import Dataset
+import numpy as np
+import pyproj
+
+from geodataset.regrid import (Checkpoint, RegridTarget, get_source_files, main,
+    regrid_file, regrid_files)
+from geodataset.tools import open_netcdf
+from geodataset.tests.base_for_tests import create_test_file
+
+
+class RegridTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        self.output_dir = os.path.join(self.tmpdir, 'out')
+        os.makedirs(os.path.join(self.tmpdir, 'src', 'sub'))
+        self.sources = [os.path.join(self.tmpdir, 'src', name) for name in [
+            'a.nc', 'b.nc', os.path.join('sub', 'c.nc')]]
+        for filename in self.sources:
+            create_test_file(filename, nt=4)
+        self.target_file = os.path.join(self.tmpdir, 'target.nc')
+        create_test_file(self.target_file, nt=1, ny=8, nx=10, dx=50e3)
+
+    def test_get_source_files(self):
+        catalog = os.path.join(self.tmpdir, 'catalog.txt')
+        with open(catalog, 'w') as f:
+            f.write('# files\n%s\n\n%s\n' % (self.sources[1], self.sources[0]))
+        self.assertEqual(get_source_files([os.path.join(self.tmpdir, 'src', '**', '*.nc')]),
+            self.sources)
+        self.assertEqual(get_source_files(['@' + catalog]), self.sources[1::-1])
+        self.assertEqual(get_source_files([os.path.join(self.tmpdir, '*.nc')],
+            exclude=[self.target_file]), [])
+
+    def test_regrid_file(self):
+        target = RegridTarget.from_grid_file(self.target_file)
+        output = regrid_file(self.sources[0], ['sic'], self.output_dir,
+            start=dt.datetime(2020, 1, 2), end=dt.datetime(2020, 1, 4), target=target)
+        self.assertEqual(output, os.path.join(self.output_dir, 'a.nc'))
+        with open_netcdf(self.sources[0]) as ds:
+            expected = ds.interp_to_points('sic', target.lon, target.lat, time_index=2)
+        with Dataset(output) as ds:
+            np.testing.assert_array_equal(ds['time'][:], [1, 2])
+            self.assertEqual(ds['sic'].dimensions, ('time', 'y', 'x'))
+            self.assertEqual(ds['sic'].units, '1')
+            np.testing.assert_allclose(ds['sic'][1].filled(np.nan), expected, rtol=1e-6)
+            self.assertTrue(np.isfinite(expected).any())
+            self.assertEqual(ds['crs'].grid_mapping_name, 'polar_stereographic')
+        self.assertIsNone(regrid_file(self.sources[0], ['sic'], self.output_dir,
+            start=dt.datetime(2021, 1, 1), target=target))
+
+    def test_regrid_file_mesh(self):
+        proj = pyproj.Proj(3413)
+        nodes_x, nodes_y = [v.ravel() for v in np.meshgrid(
+            np.linspace(-1.5e6, -1e6, 5), np.linspace(0.6e6, 1e6, 4))]
+        mesh_info = SimpleNamespace(nodes_x=nodes_x, nodes_y=nodes_y,
+            indices=np.array([[0, 1, 5], [6, 7, 12]]),
+            projection=SimpleNamespace(pyproj=proj))
+        target = RegridTarget.from_mesh_info(mesh_info)
+        output = regrid_file(self.sources[0], ['sic'], self.output_dir, target=target)
+        with Dataset(output) as ds:
+            self.assertEqual(ds['sic'].shape, (4, 2))
+            self.assertEqual(ds['sic'].dimensions, ('time', 'elements'))
+            np.testing.assert_allclose(ds['x'][:], nodes_x[mesh_info.indices].mean(axis=1))
+        target = RegridTarget.from_mesh_info(mesh_info, on_elements=False)
+        self.assertEqual(target.dims, ('nodes',))
+        self.assertEqual(target.lon.shape, (20,))
+
+    def test_regrid_files_resume(self):
+        target = RegridTarget.from_grid_file(self.target_file)
+        checkpoint_file = os.path.join(self.tmpdir, 'checkpoint.json')
+        checkpoint = Checkpoint(checkpoint_file)
+        checkpoint.mark_done(self.sources[0], 'done before')
+        bad_file = os.path.join(self.tmpdir, 'src', 'bad.nc')
+        checkpoint = regrid_files(self.sources + [bad_file], target, ['sic'], self.output_dir,
+            checkpoint=checkpoint, max_workers=1)
+        self.assertEqual(sorted(os.listdir(self.output_dir)), ['b.nc', 'c.nc'])
+        self.assertEqual(list(checkpoint.failed), [bad_file])
+        with open(checkpoint_file) as f:
+            state = json.load(f)
+        self.assertEqual(state['done'][self.sources[0]], 'done before')
+        self.assertEqual(state['done'][self.sources[2]], os.path.join(self.output_dir, 'c.nc'))
+        # failed files are kept in the checkpoint and retried on resume
+        self.assertIn('Traceback', Checkpoint(checkpoint_file).failed[bad_file])
+        create_test_file(bad_file, nt=4)
+        checkpoint = regrid_files(self.sources + [bad_file], target, ['sic'], self.output_dir,
+            checkpoint=Checkpoint(checkpoint_file), max_workers=1)
+        self.assertEqual(checkpoint.failed, {})
+        self.assertIn(bad_file, checkpoint.done)
+        # progress of a run with other parameters is not reused
+        for kwargs in [dict(var_names=['sic', 'sit']), dict(start=dt.datetime(2020, 1, 2))]:
+            kwargs = dict(dict(var_names=['sic']), **kwargs)
+            with self.assertRaises(ValueError):
+                regrid_files(self.sources, target, output_dir=self.output_dir,
+                    checkpoint=Checkpoint(checkpoint_file), max_workers=1, **kwargs)
+        other_target = RegridTarget(target.lon + 1, target.lat, target.dims, target.spec)
+        with self.assertRaises(ValueError):
+            regrid_files(self.sources, other_target, ['sic'], self.output_dir,
+                checkpoint=Checkpoint(checkpoint_file), max_workers=1)
+        with self.assertRaises(ValueError):
+            regrid_files(self.sources + [self.target_file, self.target_file], target, ['sic'],
+                self.output_dir)
+
+    def test_main(self):
+        status = main([os.path.join(self.tmpdir, 'src', '**', '*.nc'), '-t', self.target_file,
+            '-v', 'sic', '-o', self.output_dir, '--end', '2020-01-02', '-j', '2'])
+        self.assertEqual(status, 0)
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+            ['a.nc', 'b.nc', 'c.nc', 'regrid_checkpoint.json'])
+        with Dataset(os.path.join(self.output_dir, 'c.nc')) as ds:
+            self.assertEqual(ds['sic'].shape, (1, 8, 10))
+        args = [os.path.join(self.tmpdir, 'src', '**', '*.nc'), '-t', self.target_file,
+            '-v', 'sic', '-o', self.output_dir, '--end', '2020-01-03', '-j', '1']
+        with self.assertRaises(SystemExit), patch('sys.stderr'):
+            main(args)
+        self.assertEqual(main(args + ['--restart']), 0)
+        with Dataset(os.path.join(self.output_dir, 'c.nc')) as ds:
+            self.assertEqual(ds['sic'].shape, (2, 8, 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
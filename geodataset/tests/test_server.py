@@ -0,0 +1,90 @@
+import datetime as dt
+import os
+import socket
+import stat
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+import pyproj
+
+from geodataset.geodataset import GeoDatasetRead
+from geodataset.server import (InterpolationClient, InterpolationServer, ServerError,
+    recv_message, send_message)
+from geodataset.tests.base_for_tests import create_test_file
+
+
+class MessageTest(unittest.TestCase):
+    def test_send_recv_message(self):
+        arrays = [np.arange(6, dtype=np.float32).reshape(2, 3), np.array([], dtype=int)]
+        s1, s2 = socket.socketpair()
+        with s1, s2:
+            send_message(s1, dict(a=1, b=[None, 'x']), arrays)
+            header, out = recv_message(s2)
+            s1.close()
+            self.assertEqual(recv_message(s2), (None, []))
+        self.assertEqual(header, dict(a=1, b=[None, 'x']))
+        for a, b in zip(arrays, out):
+            self.assertEqual(a.dtype, b.dtype)
+            np.testing.assert_array_equal(a, b)
+
+
+class InterpolationServerTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'test.nc')
+        create_test_file(self.filename, nt=5, ny=60, nx=80, dx=10e3)
+        rng = np.random.default_rng(0)
+        x = rng.uniform(-1.55e6, -0.7e6, 100)
+        y = rng.uniform(0.4e6, 1.05e6, 100)
+        self.lon, self.lat = pyproj.Proj(3411)(x, y, inverse=True)
+        self.socket_path = os.path.join(tmpdir.name, 'server.sock')
+        self.server = InterpolationServer(self.socket_path)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.shutdown)
+
+    def test_interp_to_points(self):
+        with GeoDatasetRead(self.filename) as ds:
+            expected = [ds.interp_to_points('sic', self.lon, self.lat, time_index=i)
+                for i in range(3)]
+            time = ds.datetimes[2] + dt.timedelta(hours=1)
+        with InterpolationClient(self.socket_path) as client:
+            self.assertTrue(client.ping())
+            for i in range(3):
+                values = client.interp_to_points(self.filename, 'sic', self.lon, self.lat,
+                    time_index=i)
+                np.testing.assert_allclose(values, expected[i])
+            values = client.interp_to_points(self.filename, 'sic', self.lon, self.lat,
+                time=time)
+            np.testing.assert_allclose(values, expected[2])
+            stats = client.stats()
+        self.assertEqual(stats['counters']['dataset_misses'], 1)
+        self.assertEqual(stats['counters']['dataset_hits'], 3)
+        self.assertEqual(stats['counters']['field_misses'], 3)
+        self.assertEqual(stats['counters']['field_hits'], 1)
+        self.assertEqual(stats['datasets'], [self.filename])
+
+    def test_fill_value_and_errors(self):
+        with InterpolationClient(self.socket_path) as client:
+            values = client.interp_to_points(self.filename, 'sic', [0.], [0.], fill_value=-1)
+            np.testing.assert_array_equal(values, [-1])
+            with self.assertRaises(ServerError):
+                client.interp_to_points(self.filename, 'missing', self.lon, self.lat)
+            with self.assertRaises(ServerError):
+                client.request(dict(method='unknown'))
+            # connection is still usable after errors
+            self.assertTrue(client.ping())
+
+    def test_socket(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o600)
+        with self.assertRaises(ValueError):
+            InterpolationServer(self.socket_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+from concurrent.futures import ProcessPoolExecutor
+import gc
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+import os
+import pickle
+import tempfile
+from types import SimpleNamespace
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pyproj
+
+from geodataset.geodataset import GeoDatasetRead
+from geodataset.shared import SharedField
+from geodataset.tests.base_for_tests import create_test_file
+
+
+def interp_in_worker(field, lon, lat):
+    return os.getpid(), field.interp_to_points(lon, lat)
+
+
+class SharedFieldTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'test.nc')
+        create_test_file(self.filename, ny=100, nx=150, dx=5e3)
+        rng = np.random.default_rng(0)
+        x = rng.uniform(-1.55e6, -0.7e6, 400)
+        y = rng.uniform(0.45e6, 1.05e6, 400)
+        self.lon, self.lat = pyproj.Proj(3411)(x, y, inverse=True)
+
+    def test_from_dataset(self):
+        with GeoDatasetRead(self.filename) as ds:
+            expected = ds.interp_to_points('sic', self.lon, self.lat, time_index=2)
+            with SharedField.from_dataset(ds, 'sic', time_index=2) as field:
+                np.testing.assert_allclose(field.interp_to_points(self.lon, self.lat), expected)
+                self.assertLess(len(pickle.dumps(field)), field.array.nbytes / 10)
+                name = field.shm.name
+        with self.assertRaises(FileNotFoundError):
+            SharedMemory(name=name)
+
+    def test_workers(self):
+        with GeoDatasetRead(self.filename) as ds:
+            expected = ds.interp_to_points('sic', self.lon, self.lat, ij_range=(10, 90, 20, 140))
+            field = SharedField.from_dataset(ds, 'sic', ij_range=(10, 90, 20, 140))
+        with field, ProcessPoolExecutor(2) as executor:
+            results = list(executor.map(interp_in_worker, [field] * 4,
+                np.split(self.lon, 4), np.split(self.lat, 4)))
+        self.assertNotIn(os.getpid(), [pid for pid, _ in results])
+        np.testing.assert_allclose(np.concatenate([v for _, v in results]), expected)
+
+    def test_attachment_closed_and_not_tracked(self):
+        with GeoDatasetRead(self.filename) as ds:
+            field = SharedField.from_dataset(ds, 'sic')
+        with field:
+            with patch('multiprocessing.resource_tracker.register') as register:
+                copy = pickle.loads(pickle.dumps(field))
+            register.assert_not_called()
+            self.assertFalse(copy.owner)
+            np.testing.assert_array_equal(copy.array, field.array)
+            shm = copy.shm
+            del copy
+            gc.collect()
+            self.assertIsNone(shm.buf)
+            with pickle.loads(pickle.dumps(field)) as copy:
+                pass
+            self.assertIsNone(copy.shm.buf)
+            # closing attachments does not remove the segment
+            SharedMemory(name=field.shm.name).close()
+
+    def test_spawn_workers(self):
+        with GeoDatasetRead(self.filename) as ds:
+            expected = ds.interp_to_points('sic', self.lon, self.lat)
+            field = SharedField.from_dataset(ds, 'sic')
+        with field:
+            with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context('spawn')
+                    ) as executor:
+                results = list(executor.map(interp_in_worker, [field] * 4,
+                    np.split(self.lon, 4), np.split(self.lat, 4)))
+            np.testing.assert_allclose(np.concatenate([v for _, v in results]), expected)
+            # segment is still available after workers exit
+            SharedMemory(name=field.shm.name).close()
+
+    def test_get_var_for_nextsim(self):
+        proj = pyproj.Proj(3413)
+        nodes_x, nodes_y = proj(self.lon, self.lat)
+        nbo = SimpleNamespace(mesh_info=SimpleNamespace(nodes_x=nodes_x, nodes_y=nodes_y,
+            indices=np.arange(399).reshape(133, 3), projection=SimpleNamespace(pyproj=proj)))
+        with GeoDatasetRead(self.filename) as ds:
+            expected = ds.get_var_for_nextsim('sic', nbo)
+            with SharedField.from_dataset(ds, 'sic') as field:
+                np.testing.assert_allclose(field.get_var_for_nextsim(nbo), expected)
+
+    def test_shape_mismatch(self):
+        with GeoDatasetRead(self.filename) as ds:
+            with self.assertRaises(ValueError):
+                SharedField(np.zeros((3, 3)), ds.get_grid_geometry())
+
+
+if __name__ == "__main__":
+    unittest.main()
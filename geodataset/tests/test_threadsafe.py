@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pyproj
+
+from geodataset.geodataset import GeoDatasetRead
+from geodataset.threadsafe import ThreadSafeGeoDatasetRead
+from geodataset.tests.base_for_tests import create_test_file
+
+
+class ThreadSafeGeoDatasetReadTest(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'test.nc')
+        create_test_file(self.filename, nt=5, ny=60, nx=80, dx=10e3)
+        rng = np.random.default_rng(0)
+        x = rng.uniform(-1.55e6, -0.7e6, 1000)
+        y = rng.uniform(0.4e6, 1.05e6, 1000)
+        self.lon, self.lat = pyproj.Proj(3411)(x, y, inverse=True)
+
+    def test_same_as_geodataset(self):
+        with GeoDatasetRead(self.filename) as ds0, ThreadSafeGeoDatasetRead(self.filename) as ds:
+            np.testing.assert_allclose(
+                ds.interp_to_points('sic', self.lon, self.lat, time_index=2),
+                ds0.interp_to_points('sic', self.lon, self.lat, time_index=2))
+            self.assertEqual(ds.get_grid_geometry(ij_range=(0, 10, 0, 20)),
+                ds0.get_grid_geometry(ij_range=(0, 10, 0, 20)))
+            self.assertEqual(ds.variable_names, ds0.variable_names)
+            self.assertIs(type(ds.ds), GeoDatasetRead)
+
+    def test_stress(self):
+        """ many threads interpolating and reading concurrently give the same results as
+        sequential calls """
+        requests = [(i % 5, slice((i * 37) % 900, (i * 37) % 900 + 100)) for i in range(200)]
+        with GeoDatasetRead(self.filename) as ds0:
+            expected = [ds0.interp_to_points('sic', self.lon[s], self.lat[s], time_index=t)
+                for t, s in requests]
+            expected_arrays = [ds0.get_variable_array('sic', time_index=t).filled(np.nan)
+                for t in range(5)]
+        ds = ThreadSafeGeoDatasetRead(self.filename)
+        def interpolate(request):
+            t, s = request
+            array = ds.get_variable_array('sic', time_index=t).filled(np.nan)
+            values = ds.interp_to_points('sic', self.lon[s], self.lat[s], time_index=t)
+            return array, values
+        with ds, ThreadPoolExecutor(16) as executor:
+            results = list(executor.map(interpolate, requests))
+        for (t, _), (array, values), v0 in zip(requests, results, expected):
+            np.testing.assert_array_equal(array, expected_arrays[t])
+            np.testing.assert_allclose(values, v0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,12 @@
 import glob
 import os
 import unittest
+from mock import patch, MagicMock
 
+import numpy as np
 import pyproj
 
-from geodataset.tools import open_netcdf
+from geodataset.tools import open_netcdf, get_bboxes
 from geodataset.tests.base_for_tests import BaseForTests
 from geodataset.custom_geodataset import UniBremenAlbedoMPF
 
@@ -54,6 +56,26 @@ class ToolsTests(BaseForTests):
                     self.assertIsInstance(ds.grid_mapping_variable, str)
                     self.assertIsInstance(ds.projection, pyproj.Proj)
 
+    @patch('geodataset.tools.open_netcdf')
+    def test_get_bboxes(self, mock_open_netcdf):
+        p = pyproj.Proj(3411)
+        datasets = []
+        for bbox in [[1., 2., 3., 4.], [5., 6., 7., 8.]]:
+            ds = MagicMock()
+            ds.__enter__.return_value = ds
+            ds.get_bbox.return_value = bbox
+            datasets.append(ds)
+        mock_open_netcdf.side_effect = datasets + datasets
+
+        bboxes = get_bboxes(['f1', 'f2'], p)
+        np.testing.assert_array_equal(bboxes, [[1, 2, 3, 4], [5, 6, 7, 8]])
+        # all pixels are used by default, like in GeoDatasetRead.get_bbox
+        datasets[0].get_bbox.assert_called_once_with(p, perimeter=False, densify=0)
+        get_bboxes(['f1', 'f2'], p, perimeter=True, densify=2, ij_range=(0, 5, 0, 5))
+        datasets[1].get_bbox.assert_called_with(p, perimeter=True, densify=2,
+            ij_range=(0, 5, 0, 5))
+        self.assertEqual(get_bboxes([], p).shape, (0, 4))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,8 +1,22 @@
+import datetime as dt
 import unittest
 
 import numpy as np
+import pyproj
 
-from geodataset.utils import fill_nan_gaps
+from geodataset.utils import (
+    densify_lonlat,
+    fill_nan_gaps,
+    get_curve_index,
+    get_edge_ij_ranges,
+    get_length_factor,
+    get_packing_parameters,
+    get_time_offsets,
+    get_transformer,
+    get_valid_range,
+    pack_array,
+    transform_points,
+)
 
 
 class TestsUtils(unittest.TestCase):
@@ -14,6 +28,89 @@ class TestsUtils(unittest.TestCase):
             np.array([[5,5,3],[7,5,6],[7,8,9]], float)
         )
 
+    def test_get_edge_ij_ranges(self):
+        a = np.arange(30).reshape(5, 6)
+        for ij_range in [(None, None, None, None), (1, 4, 2, 5), (-3, -1, -4, -1)]:
+            i0, i1, j0, j1 = ij_range
+            sub = a[i0:i1, j0:j1]
+            edges = [a[e[0]:e[1], e[2]:e[3]] for e in get_edge_ij_ranges(ij_range)]
+            np.testing.assert_array_equal(edges[0], sub[:1])
+            np.testing.assert_array_equal(edges[1], sub[-1:])
+            np.testing.assert_array_equal(edges[2], sub[:, :1])
+            np.testing.assert_array_equal(edges[3], sub[:, -1:])
+
+    def test_densify_lonlat(self):
+        lon, lat = densify_lonlat(np.array([178., -178.]), np.array([0., 4.]), 3)
+        np.testing.assert_array_almost_equal(lon, [178, 179, 180, 181, 182])
+        np.testing.assert_array_almost_equal(lat, [0, 1, 2, 3, 4])
+
+    def test_get_packing_parameters(self):
+        data = np.ma.array([[0., np.nan, 1.], [.5, 100., .25]], mask=[[0, 0, 0], [0, 1, 0]])
+        scale, offset, fill = get_packing_parameters(data)
+        self.assertEqual(offset, .5)
+        self.assertAlmostEqual(scale, 1 / 65534)
+        self.assertEqual(fill, -32768)
+        scale, offset, fill = get_packing_parameters(valid_range=(0, 10), precision=0.01)
+        self.assertEqual((scale, offset), (0.01, 5))
+        with self.assertRaises(ValueError):
+            get_packing_parameters(valid_range=(0, 1000), precision=0.01)
+
+    def test_get_valid_range(self):
+        data = np.ma.array([[0., np.nan, 1.], [.5, 100., -.25]], mask=[[0, 0, 0], [0, 1, 0]])
+        self.assertEqual(get_valid_range(data), (-.25, 1.))
+        self.assertEqual(get_valid_range(np.full(3, np.nan)), (0., 0.))
+
+    def test_pack_array(self):
+        data = np.random.uniform(-3, 5, size=(7, 5, 3))
+        data[2, 1, 1] = np.nan
+        scale, offset, fill = get_packing_parameters(data)
+        packed = pack_array(data, scale, offset, fill, block_size=10)
+        self.assertEqual(packed.dtype, np.int16)
+        self.assertEqual(packed[2, 1, 1], fill)
+        unpacked = packed * scale + offset
+        unpacked[packed == fill] = np.nan
+        np.testing.assert_allclose(unpacked, data, atol=scale / 2 + 1e-12)
+
+    def test_get_time_offsets(self):
+        t0 = dt.datetime(2020, 1, 1)
+        times = [dt.datetime(2020, 1, 2, 12), dt.datetime(2019, 12, 31)]
+        np.testing.assert_array_equal(get_time_offsets(times, t0), [129600, -86400])
+        np.testing.assert_array_equal(
+            get_time_offsets(np.array(times, dtype='datetime64[s]'), t0), [129600, -86400])
+
+    def test_get_length_factor(self):
+        self.assertEqual(get_length_factor('m'), 1)
+        self.assertEqual(get_length_factor('km'), 1e3)
+        self.assertEqual(get_length_factor('100 km'), 1e5)
+        self.assertEqual(get_length_factor('Meters'), 1)
+        self.assertIsNone(get_length_factor('degrees_east'))
+        self.assertIsNone(get_length_factor('1'))
+
+    def test_transform_points(self):
+        x, y = np.array([1e5, -2e5]), np.array([3e5, 4e5])
+        self.assertIsNone(get_transformer(pyproj.Proj(3411), 3411))
+        self.assertIs(transform_points(x, y, 3411, pyproj.CRS(3411))[0], x)
+        transformer = get_transformer(3413, 3411)
+        self.assertIs(get_transformer(3413, 3411), transformer)
+        lon, lat = pyproj.Proj(3413)(x, y, inverse=True)
+        np.testing.assert_allclose(transform_points(x, y, 3413, 3411),
+            pyproj.Proj(3411)(lon, lat))
+        np.testing.assert_allclose(transform_points(x, y, 3413, 4326), (lon, lat))
+
+    def test_get_curve_index(self):
+        i, j = [a.ravel() for a in np.meshgrid(np.arange(8), np.arange(8), indexing='ij')]
+        np.testing.assert_array_equal(
+            get_curve_index([0, 0, 1, 1], [0, 1, 0, 1], 'morton', bits=1), [0, 1, 2, 3])
+        for curve in ['morton', 'hilbert']:
+            index = get_curve_index(i, j, curve, bits=3)
+            self.assertEqual(index.dtype, np.uint64)
+            np.testing.assert_array_equal(np.sort(index), np.arange(64))
+        # consecutive cells along the Hilbert curve are neighbours
+        order = np.argsort(get_curve_index(i, j, 'hilbert', bits=3))
+        np.testing.assert_array_equal(np.abs(np.diff(i[order])) + np.abs(np.diff(j[order])), 1)
+        with self.assertRaises(ValueError):
+            get_curve_index(i, j, 'peano')
+
 
 if __name__ == "__main__":
     unittest.main()
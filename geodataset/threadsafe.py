@@ -0,0 +1,253 @@
+import threading
+
+import numpy as np
+import pyproj
+
+from geodataset.interpolation import interp_field
+from geodataset.tools import open_netcdf
+from geodataset.utils import NETCDF_LOCK, fill_nan_gaps, transform_points
+
+
+class ThreadSafeGeoDatasetRead:
+    """ Read facade of a netCDF file for multi-threaded services
+
+    Calls to netCDF4/HDF5 (which are not thread-safe) are serialised with a lock, while
+    gap filling, projections and interpolation run concurrently outside the lock.
+    Metadata (grid geometry, time, projection) is computed once, by the first thread
+    which needs it. Each thread uses its own pyproj.Proj.
+
+    Example:
+        ds = ThreadSafeGeoDatasetRead('ice_conc.nc')
+        # in many threads
+        values = ds.interp_to_points('ice_conc', lon, lat, time_index=3)
+    """
+
+    def __init__(self, filename, cls=None, lock=NETCDF_LOCK):
+        """
+        Parameters
+        ----------
+        filename : str
+            name of netCDF file
+        cls : type
+            GeoDatasetRead or a child class to open the file with
+            (detected by open_netcdf by default)
+        lock : lock
+            lock for netCDF calls (shared with xarray and geodataset.parallel by default)
+        """
+        self.lock = lock
+        with self.lock:
+            self.ds = open_netcdf(filename) if cls is None else cls(filename)
+        self.filename = filename
+        self._metadata = {}
+        self._metadata_lock = threading.Lock()
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return '%s(%s, %s)' % (type(self).__name__, self.filename, type(self.ds).__name__)
+
+    def close(self):
+        with self.lock:
+            self.ds.close()
+
+    def _get_metadata(self, name):
+        """ Get attribute of the dataset computed once under the lock """
+        if name not in self._metadata:
+            with self._metadata_lock:
+                if name not in self._metadata:
+                    with self.lock:
+                        self._metadata[name] = getattr(self.ds, name)
+        return self._metadata[name]
+
+    @property
+    def grid_geometry(self):
+        """ Geometry of the dataset grid (see GeoDatasetRead.grid_geometry) """
+        return self._get_metadata('grid_geometry')
+
+    @property
+    def is_lonlat_dim(self):
+        """ True if lon, lat are dimensions (see GeoDatasetRead.is_lonlat_dim) """
+        return self._get_metadata('is_lonlat_dim')
+
+    @property
+    def datetimes(self):
+        """ Time values of the dataset (see GeoDatasetRead.datetimes) """
+        return self._get_metadata('datetimes')
+
+    @property
+    def variable_names(self):
+        """ Names of data variables (see GeoDatasetRead.variable_names) """
+        return self._get_metadata('variable_names')
+
+    @property
+    def projection(self):
+        """ Projection of the dataset for the current thread
+
+        Returns
+        -------
+        projection : pyproj.Proj
+        """
+        if not hasattr(self._local, 'projection'):
+            self._local.projection = pyproj.Proj(self.grid_geometry.crs)
+        return self._local.projection
+
+    def get_grid_geometry(self, ij_range=(None, None, None, None), **kwargs):
+        """ Get geometry of the dataset grid or of its subset
+        (see GeoDatasetRead.get_grid_geometry)
+        """
+        return self.grid_geometry.subset(ij_range)
+
+    def get_nearest_date(self, pivot):
+        """ Get date from the Dataset closest to the input date
+        (see GeoDatasetRead.get_nearest_date)
+        """
+        dto = min(self.datetimes, key=lambda x: abs(x - pivot))
+        return dto, self.datetimes.index(dto)
+
+    def get_variable_array(self, var_name, time_index=0, ij_range=(None, None, None, None),
+            **kwargs):
+        """ Get array with values from a given variable (see GeoDatasetRead.get_variable_array)
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        time_index: int
+            from which time layer to read data
+        ij_range : tuple with 4 ints
+            start/stop along i and j (y and x) axis
+        kwargs : dict
+            dummy
+
+        Returns
+        -------
+        array : 2D numpy.array
+        """
+        with self.lock:
+            return self.ds.get_variable_array(var_name, time_index=time_index,
+                ij_range=ij_range)
+
+    def get_lonlat_arrays(self, ij_range=(None, None, None, None), **kwargs):
+        """ Get longitude, latitude arrays (see GeoDatasetRead.get_lonlat_arrays) """
+        with self.lock:
+            return self.ds.get_lonlat_arrays(ij_range=ij_range, **kwargs)
+
+    def interp_to_points(self, var_name, lon, lat, distance=5, fill_value=np.nan,
+            block_size=None, order=None, **kwargs):
+        """ Interpolate netCDF data to points (see GeoDatasetRead.interp_to_points).
+        Only reading of the variable holds the lock.
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        lon : numpy.ndarray
+            longitudes of points
+        lat : numpy.ndarray
+            latitudes of points
+        distance : int
+            extrapolation distance (in pixels) to avoid land contamintation
+        fill_value : float
+            value for filling out of bound regions
+        block_size : int
+            number of points projected and interpolated at once (all points if None)
+        order : str
+            order points of each block along a space-filling curve ('morton' or 'hilbert')
+        kwargs : dict
+            for GeoDatasetRead.get_variable_array and
+            GeoDatasetRead.get_grid_geometry (time_index, ij_range)
+
+        Returns
+        -------
+        values : numpy.ndarray
+            values interpolated to points
+        """
+        project = None if self.is_lonlat_dim else self.projection
+        return self._interp_blocks(var_name, lon, lat, project, distance, fill_value,
+            block_size, order, **kwargs)
+
+    def interp_to_xy(self, var_name, x, y, crs=None, distance=5, fill_value=np.nan,
+            block_size=None, order=None, **kwargs):
+        """ Interpolate netCDF data to points with projected coordinates
+        (see GeoDatasetRead.interp_to_xy). Only reading of the variable holds the lock.
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        x : numpy.ndarray
+            x coordinates of points
+        y : numpy.ndarray
+            y coordinates of points
+        crs : pyproj.CRS, pyproj.Proj, str or int
+            CRS of the coordinates (None for the CRS of the dataset)
+        distance : int
+            extrapolation distance (in pixels) to avoid land contamintation
+        fill_value : float
+            value for filling out of bound regions
+        block_size : int
+            number of points projected and interpolated at once (all points if None)
+        order : str
+            order points of each block along a space-filling curve ('morton' or 'hilbert')
+        kwargs : dict
+            for GeoDatasetRead.get_variable_array and
+            GeoDatasetRead.get_grid_geometry (time_index, ij_range)
+
+        Returns
+        -------
+        values : numpy.ndarray
+            values interpolated to points
+        """
+        project = None
+        if crs is not None:
+            dst_crs = self.get_grid_geometry(**kwargs).crs
+            def project(x, y):
+                return transform_points(x, y, crs, dst_crs)
+        return self._interp_blocks(var_name, x, y, project, distance, fill_value,
+            block_size, order, **kwargs)
+
+    def _interp_blocks(self, var_name, x, y, project, distance, fill_value, block_size,
+            order, **kwargs):
+        """ Read variable under the lock, fill gaps and interpolate to points outside it
+        (see GeoDatasetRead._interp_blocks and geodataset.interpolation.interp_field)
+        """
+        geometry = self.get_grid_geometry(**kwargs)
+        nc_v = self.get_variable_array(var_name, **kwargs).astype(float).filled(np.nan)
+        if len(nc_v.shape) != 2:
+            raise ValueError('Can interpolate only 2D data from netCDF file')
+        nc_v = fill_nan_gaps(nc_v, distance)
+        return interp_field(geometry, nc_v, x, y, project=project, fill_value=fill_value,
+            block_size=block_size, order=order)
+
+    def get_var_for_nextsim(self, var_name, nbo, on_elements=True, **kwargs):
+        """ Interpolate netCDF data onto mesh from NextsimBin object
+        (see GeoDatasetRead.get_var_for_nextsim)
+
+        Parameters
+        ----------
+        var_name : str
+            name of variable
+        nbo : NextsimBin
+            nextsim bin object with mesh_info attribute
+        on_elements : bool
+            perform interpolation on elements or nodes?
+        kwargs : dict
+            for ThreadSafeGeoDatasetRead.interp_to_xy
+
+        Returns
+        -------
+        v_pro : 1D numpy.array
+            values from netCDF interpolated on nextsim mesh
+        """
+        nb_x = nbo.mesh_info.nodes_x
+        nb_y = nbo.mesh_info.nodes_y
+        if on_elements:
+            t = nbo.mesh_info.indices
+            nb_x, nb_y = [i[t].mean(axis=1) for i in [nb_x, nb_y]]
+        return self.interp_to_xy(var_name, nb_x, nb_y, crs=nbo.mesh_info.projection.pyproj,
+            **kwargs)
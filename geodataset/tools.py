@@ -1,4 +1,11 @@
+import glob
+import os
+
+import numpy as np
+
+from geodataset import instrumentation
 from geodataset.geodataset import GeoDatasetRead
+from geodataset.mfgeodataset import MFGeoDatasetRead
 from geodataset.utils import InvalidDatasetError
 from geodataset.custom_geodataset import (
     CmemsMetIceChart,
@@ -40,10 +47,95 @@ def open_netcdf(file_address):
     """
     for class_ in custom_read_classes:
         try:
-            obj = class_(file_address)
+            with instrumentation.timed(None, 'detect.%s' % class_.__name__):
+                obj = class_(file_address)
         except InvalidDatasetError:
             continue # skip to the next class in the list
         return obj # return object when try was successful
 
     # raise error when none of classes suited
     raise ValueError("Can not find proper geodataset-based class for this file: " + file_address)
+
+
+def get_source_files(sources, exclude=()):
+    """ Get list of source files from glob patterns and catalog files
+
+    Parameters
+    ----------
+    sources : list(str)
+        glob patterns (recursive '**' is supported) or names of catalog files starting
+        with '@' (text files with one file name per line)
+    exclude : list(str)
+        files to exclude (e.g. the target file)
+
+    Returns
+    -------
+    filenames : list(str)
+        unique file names in the order of sources (sorted within each pattern)
+    """
+    filenames = []
+    for source in sources:
+        if source.startswith('@'):
+            with open(source[1:]) as f:
+                filenames.extend(line.strip() for line in f
+                    if line.strip() and not line.startswith('#'))
+        else:
+            filenames.extend(sorted(glob.glob(source, recursive=True)))
+    exclude = {os.path.abspath(e) for e in exclude}
+    return list(dict.fromkeys(f for f in filenames if os.path.abspath(f) not in exclude))
+
+
+def open_mfnetcdf(file_addresses, max_open_files=8):
+    """ Open several NetCDF files on the same grid as one dataset with concatenated time axis.
+    The class of the files is detected from the first file.
+
+    Parameters
+    ----------
+    file_addresses : list(str) or str
+        names of files, glob patterns or catalog files (see get_source_files).
+        A string is treated as a single pattern.
+    max_open_files : int
+        maximum number of files kept open
+
+    Returns
+    -------
+    ds : MFGeoDatasetRead
+        multi-file dataset with the API of GeoDataset or custom children
+    """
+    if isinstance(file_addresses, str):
+        file_addresses = [file_addresses]
+    filenames = get_source_files(file_addresses)
+    if not filenames:
+        raise ValueError('No files found: %s' % file_addresses)
+    with open_netcdf(filenames[0]) as ds:
+        cls = type(ds)
+    return MFGeoDatasetRead(filenames, cls=cls, max_open_files=max_open_files)
+
+
+def get_bboxes(file_addresses, mapping, perimeter=False, densify=0, **kwargs):
+    """ Get bounding boxes of many files (see GeoDatasetRead.get_bbox).
+    Files are processed one at a time, so memory use does not grow with the number of files.
+
+    Parameters
+    ----------
+    file_addresses : list(str)
+        names of input files
+    mapping : pyproj mapping
+    perimeter : bool
+        use only the boundary pixels (see GeoDatasetRead.get_bbox). Faster, but wrong for
+        grids containing the pole or lon/lat grids in a polar mapping.
+    densify : int
+        number of points to insert between neighbouring boundary pixels (if perimeter is True)
+    kwargs : dict
+        for GeoDatasetRead.get_lonlat_arrays
+
+    Returns
+    -------
+    bboxes : numpy.ndarray
+        array with shape (len(file_addresses), 4), each row is [xmin, xmax, ymin, ymax]
+    """
+    bboxes = []
+    for file_address in file_addresses:
+        with open_netcdf(file_address) as ds:
+            bboxes.append(ds.get_bbox(mapping, perimeter=perimeter, densify=densify, **kwargs))
+    return np.array(bboxes, dtype=float).reshape(-1, 4)
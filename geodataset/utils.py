@@ -1,5 +1,17 @@
+import threading
+
 import numpy as np
+import pyproj
 from scipy.ndimage import distance_transform_edt
+from xarray.backends.locks import HDF5_LOCK, NETCDFC_LOCK, combine_locks
+
+from geodataset.cache import get_cache
+
+# lock for netCDF4/HDF5 calls from several threads (shared with xarray)
+NETCDF_LOCK = combine_locks([HDF5_LOCK, NETCDFC_LOCK])
+
+# transformers between CRSs, see get_transformer
+_transformers = get_cache('crs_transformers', max_entries=32)
 
 class InvalidDatasetError(Exception): pass
 
@@ -32,3 +44,342 @@ def fill_nan_gaps(array, distance=5):
     array = np.array(array)
     array[gpi] = array[r, c]
     return array
+
+def get_edge_ij_ranges(ij_range=(None, None, None, None)):
+    """
+    Get ij_ranges of the first row, last row, first column and last column
+    of a subset given by ij_range
+
+    Parameters
+    ----------
+    ij_range : tuple with 4 ints
+        start/stop along i and j (y and x) axis
+
+    Returns
+    -------
+    edge_ij_ranges : list(tuple)
+        four ij_ranges for the edges of the subset
+    """
+    def first(start):
+        if start is None:
+            return None, 1
+        return start, (start + 1 if start != -1 else None)
+
+    def last(stop):
+        if stop is None:
+            return -1, None
+        return stop - 1, stop
+
+    i0, i1, j0, j1 = ij_range
+    return [
+        (*first(i0), j0, j1),
+        (*last(i1), j0, j1),
+        (i0, i1, *first(j0)),
+        (i0, i1, *last(j1)),
+    ]
+
+def densify_lonlat(lon, lat, densify):
+    """
+    Insert points between neighbouring points of a line in lon/lat coordinates.
+    Longitude is unwrapped to avoid crossing the globe at the dateline.
+
+    Parameters
+    ----------
+    lon : 1D numpy.array
+        longitude of the line points
+    lat : 1D numpy.array
+        latitude of the line points
+    densify : int
+        number of points to insert between each pair of neighbouring points
+
+    Returns
+    -------
+    lon : 1D numpy.array
+        longitude of the densified line
+    lat : 1D numpy.array
+        latitude of the densified line
+    """
+    lon = np.rad2deg(np.unwrap(np.deg2rad(np.ma.getdata(lon).astype(float))))
+    lat = np.ma.getdata(lat).astype(float)
+    if lon.size < 2:
+        return lon, lat
+    n = densify + 1
+    old_pos = np.arange(lon.size)
+    new_pos = np.linspace(0, lon.size - 1, (lon.size - 1) * n + 1)
+    return np.interp(new_pos, old_pos, lon), np.interp(new_pos, old_pos, lat)
+
+def iter_blocks(array, block_size=2**20):
+    """
+    Iterate over blocks of an array along the first axis
+
+    Parameters
+    ----------
+    array : numpy.ndarray
+        input array
+    block_size : int
+        approximate number of elements in each block
+
+    Yields
+    ------
+    block_slice : slice
+        slice of the block along the first axis
+    """
+    if array.ndim == 0:
+        yield Ellipsis
+        return
+    step = max(1, block_size // max(1, int(np.prod(array.shape[1:]))))
+    for i in range(0, array.shape[0], step):
+        yield slice(i, i + step)
+
+def get_valid_range(data):
+    """
+    Get minimum and maximum of valid (not masked and finite) values
+
+    Parameters
+    ----------
+    data : numpy.ndarray or numpy.ma.MaskedArray
+        input data
+
+    Returns
+    -------
+    valid_range : tuple(float)
+        minimum and maximum ((0, 0) if there are no valid values)
+    """
+    vmin, vmax = np.inf, -np.inf
+    for block_slice in iter_blocks(data):
+        block = np.ma.masked_invalid(data[block_slice])
+        if block.count():
+            vmin = min(vmin, float(block.min()))
+            vmax = max(vmax, float(block.max()))
+    if vmin > vmax:
+        vmin = vmax = 0.
+    return vmin, vmax
+
+def get_packing_parameters(data=None, valid_range=None, precision=None, dtype=np.int16):
+    """
+    Get scale_factor, add_offset and _FillValue to pack floating point data into integers
+
+    Parameters
+    ----------
+    data : numpy.ndarray or numpy.ma.MaskedArray
+        data to pack (used to find the range of values if valid_range is not given)
+    valid_range : tuple(float)
+        minimum and maximum of the data
+    precision : float
+        required precision (used as scale_factor).
+        By default the full range of the integer type is used.
+    dtype : type
+        integer type of packed data
+
+    Returns
+    -------
+    scale_factor : float
+    add_offset : float
+    fill_value : int
+        minimum of the integer type, it is excluded from valid packed values
+    """
+    info = np.iinfo(dtype)
+    if valid_range is None:
+        valid_range = get_valid_range(data)
+    vmin, vmax = [float(v) for v in valid_range]
+    nsteps = float(info.max) - float(info.min) - 1
+    add_offset = .5 * (vmin + vmax)
+    if precision is None:
+        scale_factor = (vmax - vmin) / nsteps if vmax > vmin else 1.
+    else:
+        scale_factor = float(precision)
+        if (vmax - vmin) / scale_factor > nsteps:
+            raise ValueError('Range [%s, %s] cannot be packed into %s with precision %s'
+                % (vmin, vmax, np.dtype(dtype).name, precision))
+    return scale_factor, add_offset, info.min
+
+def pack_array(data, scale_factor, add_offset, fill_value, dtype=np.int16, block_size=2**20):
+    """
+    Pack floating point data into integers: packed = round((data - add_offset) / scale_factor)
+    Processing is done in blocks to avoid full-size temporary arrays.
+
+    Parameters
+    ----------
+    data : numpy.ndarray or numpy.ma.MaskedArray
+        data to pack. NaN and masked values are set to fill_value
+    scale_factor : float
+    add_offset : float
+    fill_value : int
+    dtype : type
+        integer type of packed data
+    block_size : int
+        approximate number of elements processed at once
+
+    Returns
+    -------
+    packed : numpy.ndarray
+    """
+    info = np.iinfo(dtype)
+    packed = np.empty(np.shape(data), dtype=dtype)
+    for block_slice in iter_blocks(packed, block_size):
+        block = data[block_slice]
+        values = np.array(np.ma.getdata(block), dtype=float)
+        invalid = np.isnan(values) | np.ma.getmaskarray(block)
+        values -= add_offset
+        values /= scale_factor
+        np.rint(values, out=values)
+        np.clip(values, info.min + 1, info.max, out=values)
+        values[invalid] = fill_value
+        packed[block_slice] = values
+    return packed
+
+def get_time_offsets(times, t0):
+    """
+    Get time offsets in seconds from a reference time
+
+    Parameters
+    ----------
+    times : list or numpy.ndarray
+        datetime.datetime, numpy.datetime64 or cftime objects
+    t0 : datetime.datetime or cftime object
+        reference time
+
+    Returns
+    -------
+    offsets : numpy.ndarray
+        1D array with seconds since t0
+    """
+    try:
+        times = np.array(times, dtype='datetime64[us]').ravel()
+        t0 = np.datetime64(t0, 'us')
+    except (TypeError, ValueError):
+        # e.g. cftime objects in non-standard calendars
+        return np.array([(t - t0).total_seconds() for t in np.ravel(times)], dtype=float)
+    return (times - t0).astype(float) / 1e6
+
+def get_length_factor(units):
+    """
+    Get length of a unit in metres
+
+    Parameters
+    ----------
+    units : str
+        e.g. 'm', 'km', 'meters' or '100 km'
+
+    Returns
+    -------
+    factor : float or None
+        None if units are not units of length
+    """
+    parts = str(units).strip().split()
+    multiplier = 1.
+    if len(parts) == 2:
+        try:
+            multiplier = float(parts[0])
+        except ValueError:
+            return None
+        parts = parts[1:]
+    if len(parts) != 1:
+        return None
+    factors = dict(m=1., meter=1., meters=1., metre=1., metres=1., km=1e3, kilometers=1e3,
+        kilometres=1e3)
+    if parts[0].lower() not in factors:
+        return None
+    return multiplier * factors[parts[0].lower()]
+
+def get_transformer(src_crs, dst_crs):
+    """
+    Get transformer of coordinates between two CRSs (cached for each pair of CRSs and thread,
+    as pyproj objects should not be shared between threads)
+
+    Parameters
+    ----------
+    src_crs : pyproj.CRS, pyproj.Proj, str or int
+        source coordinate reference system
+    dst_crs : pyproj.CRS, pyproj.Proj, str or int
+        destination coordinate reference system
+
+    Returns
+    -------
+    transformer : pyproj.Transformer or None
+        transformer with x, y (lon, lat) axis order, None if the CRSs are equal
+    """
+    src_crs, dst_crs = [c.crs if isinstance(c, pyproj.Proj) else pyproj.CRS(c)
+        for c in (src_crs, dst_crs)]
+    key = (src_crs.to_wkt(), dst_crs.to_wkt(), threading.get_ident())
+    transformer = _transformers.get(key, False)
+    if transformer is not False:
+        return transformer
+    transformer = None
+    if src_crs != dst_crs:
+        transformer = pyproj.Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+    _transformers[key] = transformer
+    return transformer
+
+def transform_points(x, y, src_crs, dst_crs):
+    """
+    Transform coordinates of points between two CRSs in one step
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        x coordinates (or longitudes) in src_crs
+    y : numpy.ndarray
+        y coordinates (or latitudes) in src_crs
+    src_crs : pyproj.CRS, pyproj.Proj, str or int
+        source coordinate reference system
+    dst_crs : pyproj.CRS, pyproj.Proj, str or int
+        destination coordinate reference system
+
+    Returns
+    -------
+    x : numpy.ndarray
+        x coordinates (or longitudes) in dst_crs (input arrays if the CRSs are equal)
+    y : numpy.ndarray
+        y coordinates (or latitudes) in dst_crs
+    """
+    transformer = get_transformer(src_crs, dst_crs)
+    if transformer is None:
+        return x, y
+    return transformer.transform(x, y)
+
+def get_curve_index(i, j, curve='morton', bits=16):
+    """
+    Get index of points along a space-filling curve, for ordering points so that
+    neighbours on the curve are close in space
+
+    Parameters
+    ----------
+    i : numpy.ndarray
+        integer coordinates of points along the first axis, in [0, 2**bits)
+    j : numpy.ndarray
+        integer coordinates of points along the second axis, in [0, 2**bits)
+    curve : str
+        'morton' (Z-order) or 'hilbert'
+    bits : int
+        number of bits of coordinates (at most 32)
+
+    Returns
+    -------
+    index : numpy.ndarray(uint64)
+        index along the curve
+    """
+    i = np.asarray(i).astype(np.uint64)
+    j = np.asarray(j).astype(np.uint64)
+    index = np.zeros(np.broadcast(i, j).shape, dtype=np.uint64)
+    if curve == 'morton':
+        for b in range(bits):
+            b = np.uint64(b)
+            index |= ((i >> b) & np.uint64(1)) << (np.uint64(2) * b + np.uint64(1))
+            index |= ((j >> b) & np.uint64(1)) << (np.uint64(2) * b)
+        return index
+    if curve != 'hilbert':
+        raise ValueError('Unknown curve: %s' % curve)
+    s = np.uint64(1 << (bits - 1))
+    while s > 0:
+        ri = (i & s) > 0
+        rj = (j & s) > 0
+        index += s * s * ((np.uint64(3) * ri) ^ rj)
+        # rotate the quadrant (only the lower bits are used in the next steps)
+        mask = s - np.uint64(1)
+        reflect = ri & ~rj
+        i = np.where(reflect, ~i, i) & mask
+        j = np.where(reflect, ~j, j) & mask
+        i, j = np.where(rj, i, j), np.where(rj, j, i)
+        s >>= np.uint64(1)
+    return index
@@ -16,6 +16,12 @@ setuptools.setup(
     test_suite='geodataset.tests',
     license='GPLv3',
     packages=setuptools.find_packages(),
+    entry_points={
+        'console_scripts': [
+            'geodataset-regrid=geodataset.regrid:main',
+            'geodataset-server=geodataset.server:main',
+        ],
+    },
     classifiers=[
         'Programming Language :: Python :: 3',
         'License :: OSI Approved :: GNU General Public License v3 (GPLv3)',
@@ -27,6 +33,7 @@ setuptools.setup(
     ],
     install_requires=[
         "cartopy",
+        "dask",
         "netCDF4",
         "netcdftime",
         "numpy",